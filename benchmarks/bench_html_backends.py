@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+HTML Parser Backend Benchmark
+Compares the BeautifulSoup backends, with and without scoped (SoupStrainer)
+parsing, on the saved pages in benchmarks/corpus.
+
+Usage:
+    python benchmarks/bench_html_backends.py [--iterations N] [page.html ...]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Benchmarks must not launch Chrome
+os.environ.setdefault('CHROME_PROVISION_AT_BOOT', '0')
+
+from server.soup import available_backends, make_soup, TAB_PAGE_STRAINER, SEARCH_PAGE_STRAINER  # noqa: E402
+
+CORPUS_DIR = os.path.join(ROOT, 'benchmarks', 'corpus')
+
+
+def strainer_for(path):
+    """Search result pages are scoped to scripts and links, everything else to tab content"""
+    return SEARCH_PAGE_STRAINER if 'search' in os.path.basename(path) else TAB_PAGE_STRAINER
+
+
+def time_parse(markup, backend, only, iterations):
+    """Best-of-N wall time for one parse, in milliseconds"""
+    best = float('inf')
+    for _ in range(iterations):
+        start = time.perf_counter()
+        make_soup(markup, only=only, backend=backend)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pages', nargs='*', help='HTML pages to parse (default: every page in benchmarks/corpus)')
+    parser.add_argument('--iterations', type=int, default=20, help='parses per measurement (best is reported)')
+    args = parser.parse_args()
+
+    pages = args.pages or sorted(glob.glob(os.path.join(CORPUS_DIR, '*.html')))
+    if not pages:
+        print(f"No pages found in {CORPUS_DIR}")
+        return 1
+
+    backends = available_backends()
+    print(f"Backends: {', '.join(backends)} | best of {args.iterations} parses\n")
+    print(f"{'page':<28} {'backend':<12} {'full (ms)':>10} {'scoped (ms)':>12} {'speedup':>8}")
+
+    for path in pages:
+        with open(path, encoding='utf-8') as f:
+            markup = f.read()
+        name = os.path.basename(path)
+        timings = {
+            backend: (time_parse(markup, backend, None, args.iterations),
+                      time_parse(markup, backend, strainer_for(path), args.iterations))
+            for backend in backends
+        }
+        reference = timings.get('html.parser', timings[backends[0]])[0]
+        for backend, (full, scoped) in timings.items():
+            print(f"{name:<28} {backend:<12} {full:>10.2f} {scoped:>12.2f} {reference / scoped:>7.1f}x")
+
+    print("\nspeedup: scoped parse compared to a full html.parser parse of the same page")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Parse Pipeline Benchmark
+Times the tab parse pipeline and full Flask round trips on the saved pages in
+benchmarks/corpus, without touching the network or Chrome. Reports ops/sec
+and peak traced memory per benchmark and compares them against a stored
+baseline, so regressions show up before they reach production.
+
+Usage:
+    python benchmarks/bench_pipeline.py                   # run and compare against the baseline
+    python benchmarks/bench_pipeline.py --save-baseline   # record this machine's numbers as the baseline
+    python benchmarks/bench_pipeline.py --check           # exit 1 if anything regressed
+    python benchmarks/bench_pipeline.py -k parse          # only benchmarks whose name contains "parse"
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Benchmarks must not launch Chrome or share the on-disk cache, index or tab store
+os.environ.setdefault('CHROME_PROVISION_AT_BOOT', '0')
+os.environ['TAB_CACHE_PATH'] = ''
+os.environ['TAB_INDEX_PATH'] = ''
+os.environ['TAB_STORE_PATH'] = ''
+
+from server import app  # noqa: E402
+from server import parser as tab_page_parser  # noqa: E402
+from server.cache import tab_cache  # noqa: E402
+from server.fetchers import needs_render  # noqa: E402
+from server.lexer import is_chord_line  # noqa: E402
+from server.soup import make_soup, TAB_PAGE_STRAINER  # noqa: E402
+from server.tab_parser import _combined_lines  # noqa: E402
+from server.upstream import upstream  # noqa: E402
+
+CORPUS_DIR = os.path.join(ROOT, 'benchmarks', 'corpus')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Pages holding a tab, and the kind of UG url each one stands in for
+TAB_PAGES = {
+    'legacy_pre_chords.html': 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-100001',
+    'modern_dom_tab.html': 'https://tabs.ultimate-guitar.com/tab/traditional/it-is-well-chords-100002',
+    'js_store_chords.html': 'https://tabs.ultimate-guitar.com/tab/traditional/it-is-well-chords-700001',
+    'js_store_tab.html': 'https://tabs.ultimate-guitar.com/tab/ludwig-van-beethoven/ode-to-joy-tabs-700002',
+}
+SEARCH_PAGE = 'search_results.html'
+
+
+def load_corpus():
+    """Every saved page, keyed by file name"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.html'))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+class FakeResponse(object):
+    """Just enough of a requests.Response for the pipeline"""
+
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode('utf-8')
+        self.status_code = 200
+
+
+def serve_corpus(pages):
+    """Answers upstream GETs with corpus pages: tab urls by their page, everything else with search results"""
+    by_url = {url: pages[name] for name, url in TAB_PAGES.items()}
+
+    def get(url, timeout=None, **kwargs):
+        return FakeResponse(by_url.get(url, pages[SEARCH_PAGE]))
+    return get
+
+
+def build_benchmarks(pages):
+    """(name, fn, ops per call) for every benchmark"""
+    benchmarks = []
+    tab_pages = {name: pages[name] for name in TAB_PAGES}
+
+    for name, markup in tab_pages.items():
+        url = TAB_PAGES[name]
+        benchmarks.append((f'html_tab_to_json_dict[{name}]',
+                           lambda markup=markup, url=url: tab_page_parser.html_tab_to_json_dict(markup, url), 1))
+
+    # The uncached heuristic, over every line of every tab in the corpus
+    lines = []
+    for name, markup in tab_pages.items():
+        tab = tab_page_parser.html_tab_to_json_dict(markup)['tab']
+        lines.extend(line.get('lyric', '') for line in tab['lines'] if 'lyric' in line)
+        lines.extend(' '.join(chord['note'] for chord in line['chords']) for line in tab['lines'] if 'chords' in line)
+    heuristic = is_chord_line.__wrapped__
+    benchmarks.append(('is_chord_line[corpus lines]', lambda: [heuristic(line) for line in lines], len(lines)))
+
+    for name in ('legacy_pre_chords.html', 'modern_dom_tab.html'):
+        soup = make_soup(pages[name], only=TAB_PAGE_STRAINER)
+        benchmarks.append((f'_tab_info_from_soup[{name}]', lambda soup=soup: tab_page_parser._tab_info_from_soup(soup), 1))
+
+    for name, markup in tab_pages.items():
+        tab_lines = tab_page_parser.html_tab_to_json_dict(markup)['tab']['lines']
+        benchmarks.append((f'_combined_lines[{name}]', lambda tab_lines=tab_lines: _combined_lines(tab_lines), 1))
+
+    all_pages = list(pages.values())
+    benchmarks.append(('needs_render[all pages]', lambda: [needs_render(markup) for markup in all_pages], len(all_pages)))
+
+    client = app.test_client()
+    tab_url = TAB_PAGES['js_store_chords.html']
+    legacy_url = TAB_PAGES['legacy_pre_chords.html']
+
+    def cold(path):
+        def request():
+            tab_cache.clear()
+            response = client.get(path)
+            assert response.status_code == 200, response.get_data(as_text=True)[:200]
+        return request
+
+    def warm(path):
+        def request():
+            response = client.get(path)
+            assert response.status_code == 200, response.get_data(as_text=True)[:200]
+        return request
+
+    benchmarks.extend([
+        ('GET /tab [js-store, cold]', cold(f'/tab?url={tab_url}'), 1),
+        ('GET /tab [legacy, cold]', cold(f'/tab?url={legacy_url}'), 1),
+        ('GET /tab [cached]', warm(f'/tab?url={tab_url}'), 1),
+        ('GET /tab/v1 [js-store, cold]', cold(f'/tab/v1?url={tab_url}'), 1),
+        ('GET /tab/combined [js-store, cold]', cold(f'/tab/combined?url={tab_url}'), 1),
+        ('GET /search', warm('/search?song=amazing%20grace&artist=chris%20tomlin'), 1),
+    ])
+    return benchmarks
+
+
+def measure(fn, ops, seconds, rounds):
+    """Best ops/sec over `rounds` rounds of about `seconds` each, and the peak memory of one call in KiB"""
+    fn()  # Warm up caches, learned selectors and lazy imports
+    best = 0.0
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            fn()
+            calls += 1
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+        best = max(best, calls * ops / (now - start))
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1024
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f).get('benchmarks', {})
+
+
+def compare(result, baseline, tolerance):
+    """Change against the baseline as text, and whether it is a regression"""
+    if baseline is None:
+        return 'new', False
+    speed = result['ops_per_sec'] / baseline['ops_per_sec'] - 1 if baseline['ops_per_sec'] else 0.0
+    memory = result['peak_kib'] / baseline['peak_kib'] - 1 if baseline['peak_kib'] else 0.0
+    regressed = speed < -tolerance or memory > tolerance
+    return f"{speed:+.0%} ops, {memory:+.0%} mem{'  REGRESSION' if regressed else ''}", regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-k', dest='pattern', default='', help='only run benchmarks whose name contains this')
+    parser.add_argument('--seconds', type=float, default=0.5, help='length of one timing round')
+    parser.add_argument('--rounds', type=int, default=5, help='timing rounds per benchmark (best is reported)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file to compare against or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown or memory growth, as a fraction, reported as a regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if any benchmark regressed')
+    args = parser.parse_args()
+
+    pages = load_corpus()
+    missing = [name for name in list(TAB_PAGES) + [SEARCH_PAGE] if name not in pages]
+    if missing:
+        print(f"Missing corpus pages in {CORPUS_DIR}: {', '.join(missing)}")
+        return 1
+
+    # No network: the pipeline's upstream client answers from the corpus
+    upstream.get = serve_corpus(pages)
+
+    baseline = load_baseline(args.baseline)
+    results = {}
+    regressions = 0
+    print(f"{'benchmark':<44} {'ops/sec':>12} {'peak KiB':>10}  vs baseline")
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            benchmarks = build_benchmarks(pages)
+        for name, fn, ops in benchmarks:
+            if args.pattern not in name:
+                continue
+            with contextlib.redirect_stdout(devnull):
+                ops_per_sec, peak_kib = measure(fn, ops, args.seconds, args.rounds)
+            results[name] = {'ops_per_sec': round(ops_per_sec, 1), 'peak_kib': round(peak_kib, 1)}
+            change, regressed = compare(results[name], baseline.get(name), args.tolerance)
+            regressions += regressed
+            print(f"{name:<44} {ops_per_sec:>12,.1f} {peak_kib:>10,.1f}  {change}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'benchmarks': results,
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nBaseline saved to {os.path.relpath(args.baseline, ROOT)}")
+    elif regressions:
+        print(f"\n{regressions} benchmark(s) regressed by more than {args.tolerance:.0%}")
+    return 1 if args.check and regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
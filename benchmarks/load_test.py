@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+API Load Test
+Drives /tab, /tab/combined and /search on a running API at a fixed
+concurrency and reports throughput and p50/p95/p99 latency per endpoint.
+
+Meant to be run against an API whose upstream is the local stand-in
+(benchmarks/ug_standin.py), never against ultimate-guitar.com:
+
+    python benchmarks/ug_standin.py --latency 150 --needs-js 0.1 &
+    UG_TABS_BASE=http://127.0.0.1:8081 UG_WWW_BASE=http://127.0.0.1:8081 python run.py &
+    python benchmarks/load_test.py --base http://127.0.0.1:5001 --concurrency 16 --duration 30
+
+Usage:
+    python benchmarks/load_test.py [--base URL] [--concurrency N] [--duration S | --requests N]
+                                   [--endpoints tab,combined,search] [--unique N]
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+import requests
+
+# Tab types of the generated tab urls, weighted like real traffic
+TAB_TYPES = ['chords', 'chords', 'chords', 'tabs', 'chords', 'official']
+SEARCHES = [('amazing grace', 'chris tomlin'), ('it is well', ''), ('ode to joy', 'beethoven'), ('how great thou art', '')]
+
+
+def tab_urls(unique):
+    """`unique` distinct canonical tab urls; fewer means more cache hits"""
+    return [f"https://tabs.ultimate-guitar.com/tab/artist-{i}/song-{i}-{TAB_TYPES[i % len(TAB_TYPES)]}-{900000 + i}"
+            for i in range(unique)]
+
+
+def request_for(endpoint, urls, rng):
+    """(path, params) of one request to `endpoint`"""
+    if endpoint == 'search':
+        song, artist = rng.choice(SEARCHES)
+        return '/search', {'song': song, 'artist': artist}
+    path = '/tab/combined' if endpoint == 'combined' else '/tab'
+    return path, {'url': rng.choice(urls)}
+
+
+def succeeded(response):
+    """2xx/3xx without an error payload; /tab reports failed fetches as error blocks with a 200"""
+    if response.status_code >= 400:
+        return False
+    try:
+        payload = response.json()
+    except ValueError:
+        return True
+    if 'error' in payload:
+        return False
+    return not any('error' in block for block in payload.get('blocks', []))
+
+
+def percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(base, endpoints, urls, concurrency, duration, total, timeout, seed):
+    """Runs the load and returns [(endpoint, seconds, ok)] plus the wall time it took"""
+    results = []
+    lock = threading.Lock()
+    issued = [0]
+    deadline = time.monotonic() + duration if duration else None
+
+    def take():
+        with lock:
+            if total is not None:
+                if issued[0] >= total:
+                    return False
+                issued[0] += 1
+            return deadline is None or time.monotonic() < deadline
+
+    def worker(index):
+        rng = random.Random(None if seed is None else seed + index)
+        session = requests.Session()
+        while take():
+            endpoint = rng.choice(endpoints)
+            path, params = request_for(endpoint, urls, rng)
+            start = time.perf_counter()
+            try:
+                ok = succeeded(session.get(base + path, params=params, timeout=timeout))
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((endpoint, elapsed, ok))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - started
+
+
+def report(results, wall):
+    print(f"{'endpoint':<10} {'requests':>9} {'errors':>7} {'req/s':>8} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    groups = {}
+    for endpoint, elapsed, ok in results:
+        groups.setdefault(endpoint, []).append((elapsed, ok))
+    groups['all'] = [(elapsed, ok) for _, elapsed, ok in results]
+    for endpoint, samples in groups.items():
+        latencies = sorted(elapsed * 1000 for elapsed, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        mean = sum(latencies) / len(latencies) if latencies else 0.0
+        print(f"{endpoint:<10} {len(samples):>9} {errors:>7} {len(samples) / wall:>8.1f} {mean:>9.1f} "
+              f"{percentile(latencies, 50):>9.1f} {percentile(latencies, 95):>9.1f} "
+              f"{percentile(latencies, 99):>9.1f} {latencies[-1] if latencies else 0.0:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base', default='http://127.0.0.1:5001', help='base url of the API under test')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to run (ignored with --requests)')
+    parser.add_argument('--requests', type=int, default=None, help='stop after this many requests instead')
+    parser.add_argument('--endpoints', default='tab,combined,search', help='comma-separated mix of tab, combined, search')
+    parser.add_argument('--unique', type=int, default=100, help='distinct tab urls requested')
+    parser.add_argument('--timeout', type=float, default=60, help='per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=None, help='seed for the request mix')
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = [e for e in endpoints if e not in ('tab', 'combined', 'search')]
+    if not endpoints or unknown:
+        print(f"Unknown endpoints: {', '.join(unknown) or '(none given)'}")
+        return 1
+
+    base = args.base.rstrip('/')
+    try:
+        requests.get(base + '/api/health', timeout=5).raise_for_status()
+    except requests.RequestException as e:
+        print(f"API at {base} is not reachable: {e}")
+        return 1
+
+    duration = None if args.requests else args.duration
+    print(f"Load testing {base} | {', '.join(endpoints)} | concurrency {args.concurrency} | "
+          f"{f'{args.requests} requests' if args.requests else f'{args.duration:g}s'} | {args.unique} tab urls\n")
+    results, wall = run(base, endpoints, tab_urls(args.unique), args.concurrency, duration,
+                        args.requests, args.timeout, args.seed)
+    report(results, wall)
+    print(f"\n{len(results)} requests in {wall:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Ultimate Guitar Stand-in Server
+Serves the saved pages in benchmarks/corpus in place of tabs.ultimate-guitar.com
+and www.ultimate-guitar.com, with configurable latency, error rate and share of
+tabs that need JavaScript, so the API can be load-tested without hitting UG.
+
+Tab urls get the corpus page for their tab type (chords, tabs, official/pro),
+and every search url gets the search results page. Point the API at it with:
+
+    UG_TABS_BASE=http://127.0.0.1:8081 UG_WWW_BASE=http://127.0.0.1:8081 python run.py
+
+Usage:
+    python benchmarks/ug_standin.py [--port 8081] [--latency 150] [--jitter 50]
+                                    [--error-rate 0.02] [--needs-js 0.1]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(ROOT, 'benchmarks', 'corpus')
+
+# Corpus page served for each tab type in the slug (".../song-chords-123")
+PAGES_BY_TAB_TYPE = {
+    'chords': 'js_store_chords.html',
+    'tabs': 'js_store_tab.html',
+    'official': 'official_shell.html',
+    'pro': 'official_shell.html',
+}
+DEFAULT_TAB_PAGE = 'legacy_pre_chords.html'
+NEEDS_JS_PAGE = 'official_shell.html'
+SEARCH_PAGE = 'search_results.html'
+
+_TAB_TYPE = re.compile(r'-([a-z]+)-\d+/?$')
+
+
+class StandinStats(object):
+    """Request counts by outcome, printed when the server stops"""
+
+    def __init__(self):
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, outcome):
+        with self._lock:
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+
+def load_pages():
+    pages = {}
+    for name in set(PAGES_BY_TAB_TYPE.values()) | {DEFAULT_TAB_PAGE, NEEDS_JS_PAGE, SEARCH_PAGE}:
+        with open(os.path.join(CORPUS_DIR, name), 'rb') as f:
+            pages[name] = f.read()
+    return pages
+
+
+def needs_js(path, share):
+    """Whether this tab is one of the `share` of tabs that only render client-side; stable per url"""
+    return share > 0 and zlib.crc32(path.encode('utf-8')) % 10000 < share * 10000
+
+
+def make_handler(pages, options, stats):
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive, like the real site
+
+        def log_message(self, format, *args):
+            if options.verbose:
+                super().log_message(format, *args)
+
+        def do_GET(self):
+            delay = max(0.0, options.latency + random.uniform(-options.jitter, options.jitter)) / 1000
+            if delay:
+                time.sleep(delay)
+
+            if options.error_rate and random.random() < options.error_rate:
+                stats.count('error')
+                return self.reply(503, b'Service temporarily unavailable', 'text/plain')
+
+            path = urlsplit(self.path).path
+            if path.startswith('/tab/'):
+                if needs_js(path, options.needs_js):
+                    stats.count('needs_js')
+                    page = NEEDS_JS_PAGE
+                else:
+                    match = _TAB_TYPE.search(path)
+                    page = PAGES_BY_TAB_TYPE.get(match.group(1) if match else None, DEFAULT_TAB_PAGE)
+                    stats.count('tab')
+            elif path.startswith('/search'):
+                stats.count('search')
+                page = SEARCH_PAGE
+            else:
+                stats.count('not_found')
+                return self.reply(404, b'Not found', 'text/plain')
+            return self.reply(200, pages[page], 'text/html; charset=utf-8')
+
+        def reply(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return StandinHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=150, help='mean response latency in ms')
+    parser.add_argument('--jitter', type=float, default=50, help='uniform +/- variation of the latency in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 503')
+    parser.add_argument('--needs-js', type=float, default=0.0,
+                        help='share of tab urls served as a page whose tab only renders with JavaScript')
+    parser.add_argument('--seed', type=int, default=None, help='seed for latency and error randomness')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    options = parser.parse_args()
+
+    random.seed(options.seed)
+    stats = StandinStats()
+    server = ThreadingHTTPServer((options.host, options.port), make_handler(load_pages(), options, stats))
+    server.daemon_threads = True
+    print(f"UG stand-in on http://{options.host}:{options.port} | latency {options.latency:g}±{options.jitter:g}ms, "
+          f"error rate {options.error_rate:g}, needs JS {options.needs_js:g}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\nRequests served: {stats.counts}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
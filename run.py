@@ -1,5 +1,10 @@
 import os
 from server import app
+from server.boot import start_boot_tasks
+
+# Find a working Chrome driver and warm the pool once, before the first render needs them.
+# Started here rather than on package import, so CLIs, benchmarks and tests never launch Chrome.
+start_boot_tasks()
 
 if __name__ == '__main__':
     app.run(
@@ -1,3 +1,4 @@
+from server.boot import record_import_finished
 from flask import Flask
 from flask_cors import CORS
 
@@ -10,3 +11,5 @@ app.config['PERMANENT_SESSION_LIFETIME'] = 300  # 5 minutes
 
 # Import views
 import server.views
+
+record_import_finished()
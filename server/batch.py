@@ -0,0 +1,38 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from .tab_parser import grouped_blocks_from_ultimate_tab
+
+BATCH_MAX_WORKERS = int(os.environ.get('BATCH_MAX_WORKERS', 4))
+BATCH_MAX_URLS = int(os.environ.get('BATCH_MAX_URLS', 25))
+
+# Shared by every batch request so the number of concurrent upstream fetches stays bounded per worker
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS, thread_name_prefix='tab-batch')
+
+
+def _tab_result(url: str, progress=None) -> dict:
+    try:
+        blocks = grouped_blocks_from_ultimate_tab(url, progress=progress)
+    except Exception as e:
+        return {'url': url, 'error': str(e)}
+
+    errors = [block['error'] for block in blocks if 'error' in block]
+    if errors:
+        return {'url': url, 'error': '; '.join(errors)}
+    return {'url': url, 'blocks': blocks}
+
+
+def submit_tab_batch(urls: list, progress=None) -> list:
+    '''
+    Starts fetching every url on the shared batch executor and returns one
+    future per url, in the same order. Each future resolves to a dict with
+    either `blocks` or `error` for its url. `progress` receives the pipeline
+    events of every url (see grouped_blocks_from_ultimate_tab).
+    '''
+    return [batch_executor.submit(_tab_result, url, progress) for url in urls]
+
+
+def grouped_blocks_for_urls(urls: list) -> list:
+    '''
+    Fetches every url concurrently and returns their results in input order.
+    '''
+    return [future.result() for future in submit_tab_batch(urls)]
@@ -0,0 +1,69 @@
+import os
+import sys
+import threading
+import time
+
+# Set as early as possible so import and boot durations include the whole app
+BOOT_STARTED = time.time()
+
+boot_info = {
+    'started_at': BOOT_STARTED,
+    'import_seconds': None,
+    'provision_seconds': None,
+    'prewarm_seconds': None,
+    'ready_seconds': None,
+    'driver_strategy': None,
+    'error': None,
+}
+
+
+def record_import_finished() -> None:
+    boot_info['import_seconds'] = round(time.time() - BOOT_STARTED, 3)
+    print(f"[Boot] App imported in {boot_info['import_seconds']:.3f}s")
+
+
+def _provision_and_prewarm(prewarm: bool) -> None:
+    # Imported here so the request path never waits on this module's imports
+    from .browser import provision, provisioned_strategy, CHROME_ALLOW_INSTALL
+    from .parser import driver_pool
+
+    start = time.time()
+    try:
+        probe_driver = provision(allow_install=CHROME_ALLOW_INSTALL)
+        try:
+            probe_driver.quit()
+        except Exception:
+            pass
+    except Exception as e:
+        boot_info['error'] = str(e)
+    boot_info['provision_seconds'] = round(time.time() - start, 3)
+    boot_info['driver_strategy'] = provisioned_strategy()
+    print(f"[Boot] Driver provisioning took {boot_info['provision_seconds']:.3f}s (strategy: {boot_info['driver_strategy']})")
+
+    if prewarm and boot_info['driver_strategy'] is not None:
+        start = time.time()
+        driver_pool.prewarm()
+        boot_info['prewarm_seconds'] = round(time.time() - start, 3)
+        print(f"[Boot] Driver pool prewarmed in {boot_info['prewarm_seconds']:.3f}s")
+
+    boot_info['ready_seconds'] = round(time.time() - BOOT_STARTED, 3)
+
+
+def start_boot_tasks() -> None:
+    '''
+    Runs the one-time startup work in the background: probing which Chrome
+    driver strategy works (installing Chrome if CHROME_ALLOW_INSTALL=1) and
+    then prewarming the driver pool. Requests are served while this runs.
+    Called by the server entry point (run.py), never on package import.
+    '''
+    if os.environ.get('CHROME_PROVISION_AT_BOOT', '1') != '1':
+        return
+    prewarm = os.environ.get('CHROME_POOL_PREWARM', '1') == '1'
+    threading.Thread(target=_provision_and_prewarm, args=(prewarm,), name='boot-provision', daemon=True).start()
+
+
+def boot_report() -> dict:
+    report = dict(boot_info)
+    report['uptime_seconds'] = round(time.time() - BOOT_STARTED, 3)
+    report['selenium_loaded'] = 'selenium' in sys.modules
+    return report
@@ -0,0 +1,175 @@
+import os
+import subprocess
+import threading
+import time
+
+# Selenium and webdriver-manager are imported inside the functions below so
+# that importing the app doesn't pay for them until a render is needed.
+
+CHROME_BINARY_PATH = "/usr/bin/google-chrome-stable"
+CHROMEDRIVER_PATH = "/usr/bin/chromedriver"
+
+CHROME_ARGUMENTS = [
+    "--headless",
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-infobars",
+    "--window-size=1920,1080",
+    "--disable-blink-features=AutomationControlled",
+    "--blink-settings=imagesEnabled=false",
+    "--disable-features=VizDisplayCompositor",
+    "--disable-web-security",
+    "--allow-running-insecure-content",
+    "--disable-background-timer-throttling",
+    "--disable-backgrounding-occluded-windows",
+    "--disable-renderer-backgrounding",
+    "--disable-features=TranslateUI",
+    "--disable-ipc-flooding-protection",
+]
+
+# Whether provisioning at boot may apt-get install Chrome when nothing else works; opt-in
+CHROME_ALLOW_INSTALL = os.environ.get('CHROME_ALLOW_INSTALL', '0') == '1'
+
+# After every strategy has failed, requests skip re-probing for this long
+CHROME_REPROBE_SECONDS = float(os.environ.get('CHROME_REPROBE_SECONDS', 300))
+
+_provision_lock = threading.Lock()
+_provisioned = None  # (strategy name, service path) of the strategy that last worked
+_probe_failed_at = None
+
+
+def install_chrome_on_railway():
+    """Install Chrome and ChromeDriver on Railway"""
+    try:
+        # Update package list
+        subprocess.run(["apt-get", "update", "-y"], check=True, capture_output=True)
+
+        # Install dependencies
+        subprocess.run(["apt-get", "install", "-y", "wget", "gnupg", "curl"], check=True, capture_output=True)
+
+        # Add Google Chrome repository
+        subprocess.run(["wget", "-q", "-O", "-", "https://dl.google.com/linux/linux_signing_key.pub"],
+                      check=True, capture_output=True, stdout=subprocess.PIPE)
+
+        # Add Chrome repository
+        with open("/etc/apt/sources.list.d/google-chrome.list", "w") as f:
+            f.write("deb [arch=amd64] http://dl.google.com/linux/chrome/deb/ stable main\n")
+
+        # Update and install Chrome
+        subprocess.run(["apt-get", "update", "-y"], check=True, capture_output=True)
+        subprocess.run(["apt-get", "install", "-y", "google-chrome-stable"], check=True, capture_output=True)
+
+        # Install ChromeDriver
+        subprocess.run(["apt-get", "install", "-y", "chromium-chromedriver"], check=True, capture_output=True)
+
+        print("Chrome and ChromeDriver installed successfully")
+        return True
+    except Exception as e:
+        print(f"Failed to install Chrome: {e}")
+        return False
+
+
+def _launch(service_path):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    options = Options()
+    for argument in CHROME_ARGUMENTS:
+        options.add_argument(argument)
+    return webdriver.Chrome(service=Service(service_path), options=options)
+
+
+def _existing(path):
+    return path if os.path.exists(path) else None
+
+
+def _webdriver_manager_path():
+    """Download ChromeDriver with webdriver-manager and return the actual executable"""
+    from webdriver_manager.chrome import ChromeDriverManager
+    driver_path = ChromeDriverManager().install()
+    if not os.path.exists(driver_path):
+        return None
+
+    # Look for the actual chromedriver executable
+    driver_dir = os.path.dirname(driver_path)
+    for file in os.listdir(driver_dir):
+        if file.startswith('chromedriver') and not file.endswith(('.txt', '.md', '.notice')):
+            actual_driver_path = os.path.join(driver_dir, file)
+            if os.path.isfile(actual_driver_path):
+                # Make it executable
+                os.chmod(actual_driver_path, 0o755)
+                return actual_driver_path
+    return None
+
+
+def _installed_chrome_path():
+    install_chrome_on_railway()
+    return _existing(CHROME_BINARY_PATH)
+
+
+def _strategies(allow_install):
+    """Driver strategies in order of preference, as (name, service path resolver) pairs"""
+    yield "system Chrome", lambda: _existing(CHROME_BINARY_PATH)
+    yield "system ChromeDriver", lambda: _existing(CHROMEDRIVER_PATH)
+    yield "webdriver-manager ChromeDriver", _webdriver_manager_path
+    if allow_install:
+        yield "manually installed Chrome", _installed_chrome_path
+
+
+def provision(allow_install=False, failed=None):
+    """
+    Find the first driver strategy that actually launches Chrome and remember it.
+
+    Returns the driver launched while probing so it isn't wasted. Only one
+    thread probes at a time; threads that waited reuse the strategy the
+    prober found unless it is the one (`failed`) they just saw fail.
+    """
+    global _provisioned, _probe_failed_at
+    with _provision_lock:
+        strategy = _provisioned
+        if strategy is not None and strategy != failed:
+            try:
+                return _launch(strategy[1])
+            except Exception as e:
+                print(f"{strategy[0]} failed, re-provisioning: {e}")
+
+        if not allow_install and _probe_failed_at is not None and time.time() - _probe_failed_at < CHROME_REPROBE_SECONDS:
+            raise Exception("All Chrome driver strategies failed (cached result of the last probe)")
+
+        for name, resolve in _strategies(allow_install):
+            try:
+                service_path = resolve()
+                if not service_path:
+                    continue
+                driver = _launch(service_path)
+                _provisioned = (name, service_path)
+                _probe_failed_at = None
+                print(f"Using {name}")
+                return driver
+            except Exception as e:
+                print(f"{name} failed: {e}")
+
+        _provisioned = None
+        _probe_failed_at = time.time()
+        raise Exception("All Chrome driver strategies failed")
+
+
+def provisioned_strategy():
+    """Name of the driver strategy found by provisioning, if any"""
+    return _provisioned[0] if _provisioned else None
+
+
+def get_chrome_driver():
+    """Get a working Chrome driver using the strategy found by provisioning"""
+    strategy = _provisioned
+    if strategy is not None:
+        try:
+            return _launch(strategy[1])
+        except Exception as e:
+            print(f"{strategy[0]} failed, re-provisioning: {e}")
+
+    # Never apt-get install from inside a request; that only happens at boot
+    return provision(allow_install=False, failed=strategy)
@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from urllib.parse import urlparse, urlunparse
+from .metrics import registry, CallbackCounter
+
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'tab_cache.sqlite3')
+
+# Writes to the on-disk tier between two prunes of its dead and excess rows
+DISK_PRUNE_EVERY = 100
+
+
+def normalize_tab_url(url: str) -> str:
+    '''
+    Returns the canonical form of a tab url, used as its cache key.
+
+    The scheme is forced to https, the host is lowercased and the query,
+    fragment and any trailing or doubled slashes are dropped, since none of
+    them change which tab Ultimate Guitar serves.
+    '''
+    parsed = urlparse(url.strip())
+    path = re.sub(r'/{2,}', '/', parsed.path).rstrip('/')
+    return urlunparse(('https', parsed.netloc.lower(), path, '', '', ''))
+
+
+def fold_text(text: str) -> str:
+    '''
+    Lowercases `text`, strips accents and apostrophes, and joins its words
+    with single spaces: "Don't Stop Me Now!" -> "dont stop me now".
+    '''
+    text = unicodedata.normalize('NFKD', (text or '').casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"['\u2019]", '', text)
+    return ' '.join(re.findall(r'[^\W_]+', text))
+
+
+def normalize_search_query(song_name: str, artist_name: str = '') -> str:
+    '''
+    Returns the canonical form of a search, used as its cache key.
+
+    Case, accents, punctuation and spacing are dropped and the words of the
+    song and artist are sorted together, so "Amazing Grace" by "Chris Tomlin"
+    and "chris tomlin amazing-grace" with no artist share one entry. UG is
+    searched with both in one query anyway.
+    '''
+    return ' '.join(sorted(fold_text(f"{artist_name or ''} {song_name or ''}").split()))
+
+
+class TabCache(object):
+    '''
+    A two-tier cache for parsed tabs, and for search results as `search_cache`.
+
+    The first tier is a size-bounded in-process LRU. The second is an SQLite
+    file shared by every worker that survives restarts. Every entry carries
+    its own expiry; expired entries are misses for get(). They are kept for
+    another `max_stale` seconds, during which get_stale() still returns them
+    so they can be served while a fresh copy is fetched, and are evicted
+    after that. The on-disk tier is pruned every DISK_PRUNE_EVERY writes:
+    rows past the max-stale bound are deleted, then the oldest rows beyond
+    `max_disk_entries`. Caches sharing a file keep their entries in separate
+    tables.
+    '''
+
+    def __init__(self, max_entries: int = 512, ttl: float = 86400, path: str = None, table: str = 'tab_cache',
+                 max_stale: float = 0, max_disk_entries: int = 10000):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_stale = max(0.0, max_stale)
+        self.max_disk_entries = max(1, max_disk_entries)
+        self.path = path
+        self.table = table
+
+        self._memory = OrderedDict()  # key -> (value, stored_at, expires_at)
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.sets = 0
+        self.pruned = 0
+        self._writes_since_prune = 0
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ('
+                    'key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL)'
+                )
+            except Exception as e:
+                print(f"[Cache] On-disk tier disabled: {e}")
+                self._db = None
+
+    def _remember(self, key: str, entry: tuple) -> None:
+        # Caller holds self._lock
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str, now: float) -> tuple:
+        # Caller holds self._lock. Returns the entry for `key` and the tier it
+        # came from, or (None, None) if it is missing or past the max-stale bound
+        entry = self._memory.get(key)
+        tier = 'memory'
+        if (entry is None or entry[2] <= now) and self._db is not None:
+            # Another worker may have refreshed an entry that expired here
+            try:
+                row = self._db.execute(
+                    f'SELECT value, stored_at, expires_at FROM {self.table} WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None and (entry is None or row[2] > entry[2]):
+                    entry = (json.loads(row[0]), row[1], row[2])
+                    tier = 'disk'
+            except Exception as e:
+                print(f"[Cache] Disk read failed: {e}")
+
+        if entry is None:
+            return None, None
+        if entry[2] + self.max_stale <= now:
+            self._memory.pop(key, None)
+            if self._db is not None:
+                try:
+                    self._db.execute(f'DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?',
+                                     (key, now - self.max_stale))
+                except Exception as e:
+                    print(f"[Cache] Disk write failed: {e}")
+            return None, None
+        self._remember(key, entry)
+        return entry, tier
+
+    def _count_hit(self, tier: str) -> None:
+        # Caller holds self._lock
+        if tier == 'memory':
+            self.memory_hits += 1
+        else:
+            self.disk_hits += 1
+
+    def get(self, key: str):
+        '''
+        Returns the cached value for `key`, or None on a miss.
+        '''
+        now = time.time()
+        with self._lock:
+            entry, tier = self._lookup(key, now)
+            if entry is not None and entry[2] > now:
+                self._count_hit(tier)
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def get_stale(self, key: str):
+        '''
+        Like get(), but expired entries are returned too until they are
+        `max_stale` seconds past their expiry. Returns (value, age, stale),
+        `age` being the seconds since the value was stored, or None on a miss.
+        '''
+        now = time.time()
+        with self._lock:
+            entry, tier = self._lookup(key, now)
+            if entry is None:
+                self.misses += 1
+                return None
+            stale = entry[2] <= now
+            if stale:
+                self.stale_hits += 1
+            else:
+                self._count_hit(tier)
+            return entry[0], now - entry[1], stale
+
+    def set(self, key: str, value, ttl: float = None) -> None:
+        '''
+        Stores `value` (which must be JSON serializable) under `key` for `ttl`
+        seconds, defaulting to the cache-wide TTL.
+        '''
+        stored_at = time.time()
+        expires_at = stored_at + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remember(key, (value, stored_at, expires_at))
+            self.sets += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        f'INSERT OR REPLACE INTO {self.table} (key, value, stored_at, expires_at) VALUES (?, ?, ?, ?)',
+                        (key, json.dumps(value, ensure_ascii=False), stored_at, expires_at)
+                    )
+                    self._writes_since_prune += 1
+                    if self._writes_since_prune >= DISK_PRUNE_EVERY:
+                        self._prune_disk(stored_at)
+                except Exception as e:
+                    print(f"[Cache] Disk write failed: {e}")
+
+    def _prune_disk(self, now: float) -> None:
+        # Caller holds self._lock
+        self._writes_since_prune = 0
+        removed = self._db.execute(
+            f'DELETE FROM {self.table} WHERE expires_at <= ?', (now - self.max_stale,)
+        ).rowcount
+        excess = self._db.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0] - self.max_disk_entries
+        if excess > 0:
+            removed += self._db.execute(
+                f'DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} ORDER BY stored_at LIMIT ?)',
+                (excess,)
+            ).rowcount
+        self.pruned += removed
+
+    def prune(self) -> None:
+        '''
+        Deletes on-disk rows past the max-stale bound, then the oldest rows
+        beyond `max_disk_entries`. Runs on its own every DISK_PRUNE_EVERY writes.
+        '''
+        with self._lock:
+            if self._db is not None:
+                self._prune_disk(time.time())
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f'DELETE FROM {self.table}')
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits + self.stale_hits
+            lookups = hits + self.misses
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'max_stale': self.max_stale,
+                'disk_enabled': self._db is not None,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'sets': self.sets,
+                'disk_pruned': self.pruned,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+tab_cache = TabCache(
+    max_entries=int(os.environ.get('TAB_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('TAB_CACHE_TTL', 86400)),
+    path=os.environ.get('TAB_CACHE_PATH', DEFAULT_CACHE_PATH) or None,
+    max_stale=float(os.environ.get('TAB_CACHE_MAX_STALE', 604800)),
+    max_disk_entries=int(os.environ.get('TAB_CACHE_DISK_SIZE', 10000)),
+)
+
+# Raw UG search results by normalized query; searches that found nothing are
+# cached too, for a shorter time, so repeated misses don't hit UG every time
+search_cache = TabCache(
+    max_entries=int(os.environ.get('SEARCH_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', 3600)),
+    path=os.environ.get('TAB_CACHE_PATH', DEFAULT_CACHE_PATH) or None,
+    table='search_cache',
+    max_disk_entries=int(os.environ.get('SEARCH_CACHE_DISK_SIZE', 10000)),
+)
+SEARCH_NEGATIVE_TTL = float(os.environ.get('SEARCH_NEGATIVE_TTL', 600))
+
+
+def _cache_lookups(cache: TabCache):
+    def lookups() -> dict:
+        stats = cache.stats()
+        return {('memory',): stats['memory_hits'], ('disk',): stats['disk_hits'], ('stale',): stats['stale_hits'],
+                ('miss',): stats['misses']}
+    return lookups
+
+
+registry.register(CallbackCounter(
+    'tab_cache_lookups_total',
+    'Tab cache lookups by the tier that answered them',
+    ['result'],
+    _cache_lookups(tab_cache),
+))
+registry.register(CallbackCounter(
+    'search_cache_lookups_total',
+    'Search cache lookups by the tier that answered them',
+    ['result'],
+    _cache_lookups(search_cache),
+))
@@ -0,0 +1,273 @@
+"""
+Tab Crawler
+Pre-warms the tab cache, tab store and search index from a file of Ultimate
+Guitar tab urls and/or search queries, one per line:
+
+    https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1234567
+    Chris Tomlin - Amazing Grace      # "artist - song", crawls the best search result
+    it is well                        # just a song title
+    # comments and blank lines are skipped
+
+Entries are fetched with bounded concurrency and a per-host request rate,
+applied to every upstream request (search endpoints and Selenium page loads
+included).
+Every finished entry is appended to a checkpoint file, so an interrupted run
+picks up where it stopped when started again; entries that failed are
+retried. The final report shows throughput, outcomes by category and the
+time spent in each pipeline stage.
+
+Usage:
+    python -m server.crawl urls.txt [--concurrency 4] [--rate 1] [--checkpoint urls.txt.checkpoint]
+                                    [--restart] [--no-render] [--fresh] [--per-query 1]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .metrics import stage_seconds
+from .search import search_tabs
+from .tab_parser import grouped_blocks_from_ultimate_tab
+from .tab_store import tab_store
+from .upstream import upstream
+
+# Outcomes of a crawled tab
+STATIC_OK = 'static_ok'
+NEEDED_RENDER = 'needed_render'
+CACHED = 'cached'
+NEEDS_RENDER = 'needs_render'  # Only JavaScript renders the tab, and rendering is disabled
+RENDER_FAILED = 'render_failed'
+PARSE_ERROR = 'parse_error'
+FETCH_ERROR = 'fetch_error'
+SEARCH_MISS = 'search_miss'
+
+SUCCESSES = (STATIC_OK, NEEDED_RENDER, CACHED)
+
+
+class HostRateLimiter(object):
+    '''
+    Spaces out requests to each host so they start at most `rate` per second,
+    whatever the number of crawl threads. Installed as the upstream client's
+    throttle, so it sees every request rather than every entry.
+    '''
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next = {}  # host -> earliest start of its next request
+        self._lock = threading.Lock()
+
+    def wait(self, host: str) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next.get(host, now))
+            self._next[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def parse_entry(line: str):
+    '''
+    ('url', url) or ('query', song, artist) for a line of the input file, or
+    None for blank and comment lines.
+    '''
+    line = line.split(' #', 1)[0].strip()
+    if not line or line.startswith('#'):
+        return None
+    if line.startswith(('http://', 'https://')):
+        return ('url', line)
+    artist, separator, song = line.partition(' - ')
+    return ('query', song.strip(), artist.strip()) if separator else ('query', line, '')
+
+
+def classify(blocks: list, events: list) -> tuple:
+    '''
+    (outcome, error) of one tab from its blocks and the pipeline events it reported.
+    '''
+    kinds = {event['event'] for event in events}
+    errors = [block['error'] for block in blocks if 'error' in block]
+    if not errors:
+        if 'cache_hit' in kinds:
+            return CACHED, None
+        parsed = next((event for event in events if event['event'] == 'parsed'), {})
+        return (NEEDED_RENDER if parsed.get('source') == 'render' else STATIC_OK), None
+
+    reasons = [event.get('reason', '') for event in events if event['event'] == 'static_fetch_failed']
+    reason = reasons[0] if reasons else ''
+    if 'no tab lines' in reason:
+        return PARSE_ERROR, errors[0]
+    if 'empty HTML' in reason or 'too short HTML' in reason:
+        return FETCH_ERROR, errors[0]
+    if 'render_attempt' in kinds:
+        return RENDER_FAILED, errors[0]
+    return NEEDS_RENDER, errors[0]
+
+
+class Crawler(object):
+    '''
+    Runs entries through the normal tab pipeline, so results land in the tab
+    cache, tab store and search index exactly as if they had been requested.
+    '''
+
+    def __init__(self, rate: float = 1, use_render: bool = True, fresh: bool = False,
+                 per_query: int = 1, render_retries: int = 2):
+        self.limiter = HostRateLimiter(rate)
+        self.use_render = use_render
+        self.fresh = fresh
+        self.per_query = per_query
+        self.render_retries = render_retries
+
+    def crawl_url(self, url: str) -> dict:
+        events = []
+        start = time.perf_counter()
+        try:
+            blocks = grouped_blocks_from_ultimate_tab(url, max_retries=self.render_retries, progress=events.append,
+                                                      use_render=self.use_render, fresh=self.fresh)
+            outcome, error = classify(blocks, events)
+        except Exception as e:
+            outcome, error = FETCH_ERROR, str(e)
+        result = {'url': url, 'outcome': outcome, 'seconds': round(time.perf_counter() - start, 3)}
+        if error:
+            result['error'] = error
+        return result
+
+    def crawl(self, entry: tuple) -> list:
+        '''
+        Crawls one parsed input entry and returns a result per tab it covered.
+        '''
+        if entry[0] == 'url':
+            return [self.crawl_url(entry[1])]
+
+        _, song, artist = entry
+        try:
+            results, _ = search_tabs(song, artist, limit=self.per_query)
+        except Exception as e:
+            return [{'query': song, 'outcome': FETCH_ERROR, 'error': f'Search failed: {e}'}]
+        if not results:
+            return [{'query': song, 'outcome': SEARCH_MISS, 'error': 'No tabs found'}]
+        return [dict(self.crawl_url(result['url']), query=song) for result in results]
+
+
+def load_checkpoint(path: str) -> set:
+    '''
+    Input lines whose every tab was crawled successfully by an earlier run.
+    '''
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # A line cut short when the previous run was killed
+            if all(result['outcome'] in SUCCESSES for result in record['results']):
+                done.add(record['entry'])
+            else:
+                done.discard(record['entry'])
+    return done
+
+
+def _stage_totals() -> dict:
+    return {key[0]: totals for key, totals in stage_seconds.totals().items()}
+
+
+def report(outcomes: dict, results: list, wall: float, entries: int, stages_before: dict, reused: int) -> None:
+    tabs = sum(outcomes.values())
+    print(f"\nCrawled {entries} entries ({tabs} tabs) in {wall:.1f}s: "
+          f"{entries / wall if wall else 0:.2f} entries/s, {tabs / wall if wall else 0:.2f} tabs/s")
+    for outcome, count in sorted(outcomes.items(), key=lambda item: -item[1]):
+        print(f"  {outcome:<14} {count:>7}")
+    if reused:
+        print(f"  ({reused} re-fetched tabs were unchanged and reused their stored parse)")
+
+    print(f"\n{'stage':<16} {'count':>7} {'total s':>9} {'mean ms':>9}")
+    for stage, (count, total) in sorted(_stage_totals().items()):
+        before_count, before_total = stages_before.get(stage, (0, 0.0))
+        count, total = count - before_count, total - before_total
+        if count:
+            print(f"{stage:<16} {count:>7} {total:>9.2f} {total / count * 1000:>9.1f}")
+
+    failures = [result for result in results if result['outcome'] not in SUCCESSES]
+    if failures:
+        print(f"\nFirst failures:")
+        for result in failures[:10]:
+            print(f"  [{result['outcome']}] {result.get('url') or result.get('query')}: {result.get('error', '')[:160]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='file with one tab url or search query per line')
+    parser.add_argument('--concurrency', type=int, default=4, help='entries crawled at once')
+    parser.add_argument('--rate', type=float, default=1, help='requests started per second per host (0 = unlimited)')
+    parser.add_argument('--checkpoint', default=None, help='progress file (default: <input>.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='ignore the checkpoint and crawl everything again')
+    parser.add_argument('--no-render', action='store_true', help='never start Selenium; tabs that need it are reported')
+    parser.add_argument('--fresh', action='store_true', help='fetch even tabs that are already cached')
+    parser.add_argument('--per-query', type=int, default=1, help='search results crawled per query line')
+    parser.add_argument('--render-retries', type=int, default=2, help='Selenium attempts per tab')
+    args = parser.parse_args()
+
+    checkpoint_path = args.checkpoint or args.input + '.checkpoint'
+    with open(args.input, encoding='utf-8') as f:
+        lines = [line.strip() for line in f]
+    done = set() if args.restart else load_checkpoint(checkpoint_path)
+    entries = [(line, entry) for line, entry in ((line, parse_entry(line)) for line in dict.fromkeys(lines))
+               if entry is not None and line not in done]
+    print(f"Crawling {len(entries)} entries ({len(done)} already done per {checkpoint_path}) | "
+          f"concurrency {args.concurrency} | {args.rate:g} req/s per host | render {'off' if args.no_render else 'on'}")
+
+    crawler = Crawler(rate=args.rate, use_render=not args.no_render, fresh=args.fresh,
+                      per_query=max(1, args.per_query), render_retries=max(1, args.render_retries))
+    upstream.throttle = crawler.limiter.wait
+    stages_before = _stage_totals()
+    reused_before = tab_store.reused
+    outcomes = {}
+    results = []
+    finished = 0
+    started = time.perf_counter()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, args.concurrency), thread_name_prefix='crawl')
+    pending = {}
+    remaining = iter(entries)
+    try:
+        with open(checkpoint_path, 'w' if args.restart else 'a', encoding='utf-8') as checkpoint:
+            while True:
+                # Keep a bounded number of entries queued, so an interrupt loses little work
+                while len(pending) < args.concurrency * 2:
+                    item = next(remaining, None)
+                    if item is None:
+                        break
+                    pending[executor.submit(crawler.crawl, item[1])] = item[0]
+                if not pending:
+                    break
+                done_futures, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done_futures:
+                    line = pending.pop(future)
+                    entry_results = future.result()
+                    checkpoint.write(json.dumps({'entry': line, 'results': entry_results}, ensure_ascii=False) + '\n')
+                    checkpoint.flush()
+                    finished += 1
+                    for result in entry_results:
+                        outcomes[result['outcome']] = outcomes.get(result['outcome'], 0) + 1
+                        results.append(result)
+                    print(f"[Crawl] {finished}/{len(entries)} {line[:80]} -> "
+                          f"{', '.join(result['outcome'] for result in entry_results)}")
+    except KeyboardInterrupt:
+        print(f"\n[Crawl] Interrupted; run again to resume from {checkpoint_path}")
+        executor.shutdown(wait=False, cancel_futures=True)
+    else:
+        executor.shutdown()
+    finally:
+        upstream.throttle = None
+
+    report(outcomes, results, time.perf_counter() - started, finished, stages_before, tab_store.reused - reused_before)
+    return 0 if all(result['outcome'] in SUCCESSES for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
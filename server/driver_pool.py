@@ -0,0 +1,181 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PooledDriver(object):
+    '''
+    A Chrome driver owned by a DriverPool, along with the bookkeeping
+    needed to decide when it should be recycled.
+    '''
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.created_at = time.time()
+
+
+class DriverPool(object):
+    '''
+    A bounded pool of pre-launched Chrome drivers with lease/return semantics.
+
+    At most `size` drivers exist at once. A lease hands out an idle driver (or
+    launches one if none is idle), and returning it either puts it back for
+    the next caller or quits it when it has served `max_pages` pages or no
+    longer responds.
+    '''
+
+    def __init__(self, factory, size: int = 1, max_pages: int = 50, acquire_timeout: float = 90):
+        self._factory = factory
+        self.size = max(1, size)
+        self.max_pages = max(1, max_pages)
+        self.acquire_timeout = acquire_timeout
+
+        self._idle = []  # LIFO so the most recently used (warmest) driver goes out first
+        self._live = 0  # Drivers that exist right now, idle or leased
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+        self.launched = 0
+        self.recycled = 0
+        self.discarded = 0
+        self.leases = 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _launch(self) -> PooledDriver:
+        driver = self._factory()
+        with self._lock:
+            self.launched += 1
+            self._live += 1
+        return PooledDriver(driver)
+
+    def _quit(self, pooled: PooledDriver) -> None:
+        with self._lock:
+            self._live -= 1
+        try:
+            pooled.driver.quit()
+        except Exception:
+            pass
+
+    def _is_healthy(self, pooled: PooledDriver) -> bool:
+        try:
+            pooled.driver.execute_script('return 1')
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self) -> PooledDriver:
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+            if pooled is None:
+                return self._launch()
+            if self._is_healthy(pooled):
+                return pooled
+            print("[DriverPool] Discarding idle driver that failed its health check")
+            self._count('discarded')
+            self._quit(pooled)
+
+    def _checkin(self, pooled: PooledDriver, failed: bool) -> None:
+        pooled.pages += 1
+
+        if pooled.pages >= self.max_pages:
+            self._count('recycled')
+            self._quit(pooled)
+            return
+
+        if failed and not self._is_healthy(pooled):
+            print("[DriverPool] Discarding driver that crashed during a render")
+            self._count('discarded')
+            self._quit(pooled)
+            return
+
+        try:
+            # Drop the previous page so idle drivers don't keep it in memory
+            pooled.driver.get('about:blank')
+        except Exception:
+            self._count('discarded')
+            self._quit(pooled)
+            return
+
+        with self._lock:
+            if not self._closed:
+                self._idle.append(pooled)
+                return
+        self._quit(pooled)
+
+    @contextmanager
+    def lease(self):
+        '''
+        Leases a driver for the duration of a `with` block.
+
+        Blocks for up to `acquire_timeout` seconds when every driver is busy.
+        '''
+        if self._closed:
+            raise Exception('Chrome driver pool is closed')
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise Exception('Timed out waiting for a Chrome driver from the pool')
+
+        pooled = None
+        failed = False
+        try:
+            pooled = self._checkout()
+            self._count('leases')
+            yield pooled.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if pooled is not None:
+                self._checkin(pooled, failed)
+            self._slots.release()
+
+    def prewarm(self) -> None:
+        '''
+        Launches idle drivers until `size` drivers exist, counting the ones
+        that are leased right now.
+        '''
+        while True:
+            with self._lock:
+                if self._closed or self._live >= self.size:
+                    return
+            if not self._slots.acquire(blocking=False):
+                return
+            try:
+                pooled = self._launch()
+                with self._lock:
+                    self._idle.append(pooled)
+            except Exception as e:
+                print(f"[DriverPool] Prewarm failed: {e}")
+                return
+            finally:
+                self._slots.release()
+
+    def prewarm_in_background(self) -> threading.Thread:
+        thread = threading.Thread(target=self.prewarm, name='driver-pool-prewarm', daemon=True)
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._quit(pooled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'max_pages': self.max_pages,
+                'idle': len(self._idle),
+                'live': self._live,
+                'launched': self.launched,
+                'recycled': self.recycled,
+                'discarded': self.discarded,
+                'leases': self.leases,
+            }
@@ -0,0 +1,205 @@
+import os
+import re
+import threading
+from .locator import url_pattern, COMPILED_SELECTORS
+from .metrics import fetch_outcomes
+
+STATIC = 'static'
+RENDER = 'render'
+
+# Tab types that are only ever rendered client-side, so requests never sees their content
+FETCHER_RENDER_TYPES = [t for t in os.environ.get('FETCHER_RENDER_TYPES', 'official,pro').split(',') if t]
+
+# A pattern goes render-first once this many static fetches have mostly failed...
+FETCHER_MIN_SAMPLES = int(os.environ.get('FETCHER_MIN_SAMPLES', 5))
+FETCHER_STATIC_RATIO = 0.2
+# ...but still gets every Nth request fetched statically, in case the pages changed
+FETCHER_REPROBE_EVERY = int(os.environ.get('FETCHER_REPROBE_EVERY', 20))
+
+
+def _content_targets(selectors) -> dict:
+    # The locator's selectors as {'tag': {names}, attribute: {values}}
+    targets = {}
+    for _, (kind, value) in selectors:
+        if kind == 'attr':
+            kind, value = value
+        targets.setdefault(kind, set()).add(value)
+    return targets
+
+
+def _marker(kind: str, values: set):
+    names = '|'.join(map(re.escape, sorted(values, key=len, reverse=True)))
+    if kind == 'tag':
+        return re.compile(rf'<(?:{names})[\s>]')
+    if kind == 'class':
+        # One of the names as a whole class in the attribute, not part of a longer one
+        return re.compile(rf'class=["\'](?:[^"\']*?\s)?(?:{names})(?=["\'\s])')
+    return re.compile(rf'{re.escape(kind)}=["\'](?:{names})["\']')
+
+
+# Where static tab content can start in the raw markup: what the locator's
+# TAB_CONTENT_SELECTORS look for. Each scan starts with a literal, so it is
+# cheap; the enclosing start tag is confirmed by _content_starts
+_CONTENT_MARKERS = [_marker(kind, values) for kind, values in _content_targets(COMPILED_SELECTORS).items()]
+_TAGS = re.compile(r'<[^>]+>')
+_CONTENT_WINDOW = 4000
+
+# The js-store is still HTML-escaped in the raw page: a non-empty wiki_tab content string
+_JS_STORE_TAB = re.compile(r'&quot;wiki_tab&quot;:\s*\{\s*&quot;content&quot;:\s*&quot;(?!&quot;)')
+_JS_STORE_WINDOW = 20000
+_JS_STORE_CHORD = re.compile(r'\[ch\][^\[]{1,12}\[/ch\]')
+_ESCAPED_NEWLINE = re.compile(r'(?:\\r)?\\n')
+
+# A chord name standing alone: "G", "F#m7", "Cadd9", "D/F#". Stricter than the
+# lexer's is_chord_line, which only needs a word to start with one
+_CHORD_WORD = re.compile(r'[A-G][#b]?(?:m|maj|min|dim|aug|sus|add|\d|\+)*(?:/[A-G][#b]?)?')
+# A tab staff line: "e|---0---3---|"
+_STAFF_LINE = re.compile(r'[A-Ga-g][#b]?\s*\|[-\d|hpbrx/\\~().^ ]*-{2}[-\d|hpbrx/\\~().^ ]*')
+
+# Chord names a page must show before its markup counts as a tab
+_MIN_CHORDS = 2
+
+
+def _content_starts(html: str):
+    # Yields where the content of each element matching a selector starts;
+    # attributes outside a start tag (CSS, scripts, text) are skipped
+    for pattern in _CONTENT_MARKERS:
+        for marker in pattern.finditer(html):
+            start = html.rfind('<', 0, marker.start() + 1)
+            end = html.find('>', marker.start())
+            if start == -1 or end == -1 or not html[start + 1:start + 2].isalpha() or html.find('>', start, marker.start()) != -1:
+                continue
+            yield end + 1
+
+
+def _has_tab_lines(lines) -> bool:
+    '''
+    Whether `lines` hold a tab staff line or at least _MIN_CHORDS chord names
+    on lines made of nothing but chords.
+    '''
+    chords = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if _STAFF_LINE.fullmatch(line):
+            return True
+        words = line.split()
+        if all(_CHORD_WORD.fullmatch(word) for word in words):
+            chords += len(words)
+            if chords >= _MIN_CHORDS:
+                return True
+    return False
+
+
+def needs_render(html: str) -> tuple:
+    '''
+    Decides from the raw markup, without parsing it, whether a statically
+    fetched page carries its tab. Returns (needs render, reason).
+
+    A page is static when its js-store's wiki_tab content holds chords
+    ([ch] markup) or a tab staff, or when an element matching one of the
+    locator's TAB_CONTENT_SELECTORS holds chord-only lines or a staff line.
+    Pages that merely mention those class names, i.e. in their CSS, don't
+    count. A page without a js-store or any such element isn't a UG layout
+    this knows, so it is parsed rather than sent to Selenium unseen.
+    '''
+    if not html or len(html.strip()) < 100:
+        return True, 'empty'
+    for match in _JS_STORE_TAB.finditer(html):
+        content = html[match.end():match.end() + _JS_STORE_WINDOW].split('&quot;', 1)[0]
+        if _JS_STORE_CHORD.search(content) or _has_tab_lines(_ESCAPED_NEWLINE.split(content)):
+            return False, 'js_store'
+    found_container = False
+    for start in _content_starts(html):
+        found_container = True
+        text = _TAGS.sub('\n', html[start:start + _CONTENT_WINDOW])
+        if _has_tab_lines(text.split('\n')):
+            return False, 'tab_markup'
+    if 'js-store' in html:
+        return True, 'js_store_without_tab'
+    if found_container:
+        return True, 'no_tab_markup'
+    return False, 'unknown_markup'
+
+
+def _tab_type(pattern: str) -> str:
+    return pattern.rsplit('/', 1)[-1]
+
+
+class FetcherStats(object):
+    '''
+    Per url pattern (host plus tab type) counts of how static fetches and
+    renders turned out, used to send known-dynamic pages straight to Selenium.
+
+    Patterns whose tab type is in `render_types` always prefer the render;
+    others do once `min_samples` static fetches have succeeded less than
+    `static_ratio` of the time.
+    '''
+
+    def __init__(self, render_types=(), min_samples: int = 5, static_ratio: float = 0.2, reprobe_every: int = 20):
+        self.render_types = set(render_types)
+        self.min_samples = min_samples
+        self.static_ratio = static_ratio
+        self.reprobe_every = reprobe_every
+        self._patterns = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, pattern: str) -> dict:
+        # Caller holds self._lock
+        entry = self._patterns.get(pattern)
+        if entry is None:
+            entry = self._patterns[pattern] = {
+                'static_ok': 0,
+                'static_failed': 0,
+                'render_ok': 0,
+                'render_failed': 0,
+                'render_first': 0,
+                'reasons': {},
+            }
+        return entry
+
+    def _prefers_render(self, pattern: str, entry: dict) -> bool:
+        if _tab_type(pattern) in self.render_types:
+            return True
+        static_total = entry['static_ok'] + entry['static_failed']
+        return static_total >= self.min_samples and entry['static_ok'] < static_total * self.static_ratio
+
+    def choose(self, url: str) -> str:
+        '''
+        The fetcher to try first for `url`: STATIC or RENDER.
+        '''
+        pattern = url_pattern(url)
+        with self._lock:
+            entry = self._entry(pattern)
+            if not self._prefers_render(pattern, entry):
+                return STATIC
+            entry['render_first'] += 1
+            learned = _tab_type(pattern) not in self.render_types
+            if learned and self.reprobe_every > 0 and entry['render_first'] % self.reprobe_every == 0:
+                return STATIC
+            return RENDER
+
+    def record(self, url: str, fetcher: str, ok: bool, reason: str = None) -> None:
+        fetch_outcomes.inc(fetcher=fetcher, outcome='ok' if ok else 'failed')
+        with self._lock:
+            entry = self._entry(url_pattern(url))
+            entry[f"{fetcher}_{'ok' if ok else 'failed'}"] += 1
+            if reason is not None:
+                entry['reasons'][reason] = entry['reasons'].get(reason, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            patterns = {}
+            for pattern, entry in self._patterns.items():
+                patterns[pattern] = dict(entry, reasons=dict(entry['reasons']),
+                                         preferred=RENDER if self._prefers_render(pattern, entry) else STATIC)
+        return {'render_types': sorted(self.render_types), 'patterns': patterns}
+
+
+fetcher_stats = FetcherStats(
+    render_types=FETCHER_RENDER_TYPES,
+    min_samples=FETCHER_MIN_SAMPLES,
+    static_ratio=FETCHER_STATIC_RATIO,
+    reprobe_every=FETCHER_REPROBE_EVERY,
+)
@@ -0,0 +1,144 @@
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+from .metrics import registry, CallbackCounter
+from .tracing import annotate
+
+# Start the backup attempt once the first one has run this long without a
+# result; <= 0 disables hedging and runs the attempts one after the other
+HEDGE_AFTER_SECONDS = float(os.environ.get('HEDGE_AFTER_SECONDS', 3))
+
+# Once enough first attempts have succeeded, hedge at this percentile of
+# their latency instead (0 keeps the fixed threshold)
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 95))
+HEDGE_MIN_SAMPLES = 20
+
+# The learned threshold never drops below this, so a run of very fast fetches
+# doesn't make every slightly slower page start a render
+HEDGE_MIN_SECONDS = float(os.environ.get('HEDGE_MIN_SECONDS', 1))
+
+
+def _accepted(result) -> bool:
+    return result is not None
+
+
+class Hedger(object):
+    '''
+    Races a backup attempt against a slow first attempt.
+
+    `run(primary, secondary)` starts `primary` and waits for it. The
+    `secondary` starts as soon as the primary fails, or once the primary has
+    run for the hedge threshold without finishing, in which case both run in
+    parallel. The first accepted result wins and the other attempt is asked to
+    stop through the cancel event both are called with.
+
+    The threshold follows the observed latency of successful primaries, but
+    never drops below `floor`, so that only the slow tail gets hedged.
+    '''
+
+    def __init__(self, after: float = 3, percentile: float = 95, window: int = 200, floor: float = 1):
+        self.after = after
+        self.percentile = percentile
+        self.floor = floor
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.hedged = 0
+        self.secondary_wins = 0
+
+    def threshold(self) -> float:
+        '''
+        Seconds the primary may run before the secondary is started.
+        '''
+        with self._lock:
+            samples = sorted(self._latencies)
+        if self.percentile <= 0 or len(samples) < HEDGE_MIN_SAMPLES:
+            return self.after
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(samples[index], self.floor)
+
+    def _record(self, **counts) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def run(self, primary, secondary, accept=_accepted, on_hedge=None):
+        '''
+        Returns the first accepted result of `primary(cancel)` or
+        `secondary(cancel)`, or None if neither produced one. `on_hedge` is
+        called with the threshold when the attempts start racing.
+        '''
+        self._record(runs=1)
+        if self.after <= 0:
+            result = primary(threading.Event())
+            return result if accept(result) else secondary(threading.Event())
+
+        cancel = threading.Event()
+        finished = queue.Queue()
+
+        def attempt(name, fn):
+            try:
+                result = fn(cancel)
+            except Exception as e:
+                print(f"[Error] {name} attempt failed: {e}")
+                result = None
+            finished.put((name, result))
+
+        started = time.monotonic()
+        # Each attempt runs in a copy of the caller's context so a traced request sees both
+        threading.Thread(target=contextvars.copy_context().run, args=(attempt, 'primary', primary),
+                         name='hedge-primary', daemon=True).start()
+
+        after = self.threshold()
+        pending = 1
+        try:
+            name, result = finished.get(timeout=after)
+            pending = 0
+            if accept(result):
+                with self._lock:
+                    self._latencies.append(time.monotonic() - started)
+                return result
+        except queue.Empty:
+            self._record(hedged=1)
+            annotate(hedged_after=round(after, 3))
+            print(f"[Hedge] No result after {after:.2f}s, starting the backup attempt")
+            if on_hedge is not None:
+                on_hedge(after)
+
+        threading.Thread(target=contextvars.copy_context().run, args=(attempt, 'secondary', secondary),
+                         name='hedge-secondary', daemon=True).start()
+        pending += 1
+        while pending:
+            name, result = finished.get()
+            pending -= 1
+            if accept(result):
+                cancel.set()
+                if name == 'secondary' and pending:
+                    self._record(secondary_wins=1)
+                elif name == 'primary':
+                    with self._lock:
+                        self._latencies.append(time.monotonic() - started)
+                return result
+        return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {'runs': self.runs, 'hedged': self.hedged, 'secondary_wins': self.secondary_wins,
+                      'samples': len(self._latencies)}
+        counts['threshold'] = self.threshold()
+        return counts
+
+
+# Races the static requests fetch against a Selenium render
+fetch_hedge = Hedger(after=HEDGE_AFTER_SECONDS, percentile=HEDGE_PERCENTILE, floor=HEDGE_MIN_SECONDS)
+
+registry.register(CallbackCounter(
+    'tab_fetch_hedges_total',
+    'Fetches run through the hedge, those that started the backup render, and renders that won',
+    ['event'],
+    lambda: {(event,): count for event, count in fetch_hedge.stats().items()
+             if event in ('runs', 'hedged', 'secondary_wins')},
+))
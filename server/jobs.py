@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobStore(object):
+    '''
+    Runs slow work on a background worker pool and keeps its state for polling.
+
+    Jobs live in a bounded in-process store: finished jobs expire `ttl`
+    seconds after they finish, and once `max_jobs` is exceeded the oldest jobs
+    are dropped first. Submitting work for a key that already has a pending
+    or running job returns that job instead of starting another one.
+    '''
+
+    def __init__(self, workers: int = 2, max_jobs: int = 256, ttl: float = 600):
+        self.max_jobs = max(1, max_jobs)
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='render-job')
+        self._jobs = OrderedDict()  # job id -> job dict, oldest first
+        self._active = {}  # key -> job id of its pending/running job
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        # Caller holds self._lock
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['finished_at'] is not None and now - job['finished_at'] > self.ttl]:
+            del self._jobs[job_id]
+        while len(self._jobs) > self.max_jobs:
+            job_id, job = self._jobs.popitem(last=False)
+            if self._active.get(job['key']) == job_id:
+                del self._active[job['key']]
+
+    def submit(self, key, fn, *args) -> dict:
+        '''
+        Schedules `fn(*args)` and returns a snapshot of its job. The job's
+        result is whatever `fn` returns; if it raises, the job fails with the
+        exception message as its error.
+        '''
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            job_id = self._active.get(key)
+            if job_id is not None and job_id in self._jobs:
+                return dict(self._jobs[job_id])
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id,
+                'key': key,
+                'status': PENDING,
+                'created_at': now,
+                'finished_at': None,
+                'result': None,
+                'error': None,
+            }
+            self._active[key] = job_id
+            snapshot = dict(self._jobs[job_id])
+
+        self._executor.submit(self._run, job_id, fn, args)
+        return snapshot
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            if fields.get('status') in (DONE, FAILED) and self._active.get(job['key']) == job_id:
+                del self._active[job['key']]
+
+    def _run(self, job_id: str, fn, args) -> None:
+        self._update(job_id, status=RUNNING)
+        try:
+            result = fn(*args)
+        except Exception as e:
+            self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+        else:
+            self._update(job_id, status=DONE, result=result, finished_at=time.time())
+
+    def get(self, job_id: str) -> dict:
+        '''
+        Returns a snapshot of the job, or None if it is unknown or expired.
+        '''
+        with self._lock:
+            self._expire(time.time())
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+render_jobs = JobStore(
+    workers=int(os.environ.get('RENDER_JOB_WORKERS', 2)),
+    max_jobs=int(os.environ.get('RENDER_JOB_MAX', 256)),
+    ttl=float(os.environ.get('RENDER_JOB_TTL', 600)),
+)
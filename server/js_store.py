@@ -0,0 +1,104 @@
+import html
+import json
+import re
+from .tab import UltimateTabInfo
+
+# Modern UG pages ship the whole tab as an HTML-escaped JSON blob:
+#   <div class="js-store" data-content="{&quot;store&quot;:{&quot;page&quot;:...}}"></div>
+JS_STORE_MARKER = 'js-store'
+DATA_CONTENT_ATTR = 'data-content="'
+
+CHORD_MARKUP = re.compile(r'\[/?ch\]')
+TAB_MARKUP = re.compile(r'\[/?tab\]')
+
+
+def find_js_store(html_body: str):
+    '''
+    Returns the decoded js-store JSON of a UG page, or None if the page has none.
+
+    Scans the raw markup for the js-store element and decodes only its
+    data-content attribute, without building a DOM for the rest of the page.
+    '''
+    marker = html_body.find(JS_STORE_MARKER)
+    while marker != -1:
+        tag_end = html_body.find('>', marker)
+        attr = html_body.find(DATA_CONTENT_ATTR, marker, tag_end if tag_end != -1 else len(html_body))
+        if attr != -1:
+            start = attr + len(DATA_CONTENT_ATTR)
+            end = html_body.find('"', start)  # Quotes inside the blob are escaped as &quot;
+            if end == -1:
+                return None
+            try:
+                return json.loads(html.unescape(html_body[start:end]))
+            except ValueError:
+                return None
+        marker = html_body.find(JS_STORE_MARKER, marker + len(JS_STORE_MARKER))
+    return None
+
+
+def page_data(store: dict) -> dict:
+    '''
+    The page's data object (`store.page.data`) of a decoded js-store, or {}
+    when it has none.
+    '''
+    try:
+        return store['store']['page']['data'] or {}
+    except (KeyError, TypeError):
+        return {}
+
+
+def _text_or_none(value):
+    if value is None or value == '':
+        return None
+    return str(value).strip()
+
+
+def extract_js_store_tab(html_body: str):
+    '''
+    Returns a (UltimateTabInfo, tab_text) tuple read from the page's js-store,
+    or None when the page has no js-store or it carries no tab content
+    (e.g. official/pro tabs that are only rendered client-side).
+    '''
+    store = find_js_store(html_body)
+    if store is None:
+        return None
+
+    data = page_data(store)
+    tab = data.get('tab') or {}
+    tab_view = data.get('tab_view') or {}
+    wiki_tab = tab_view.get('wiki_tab') or {}
+    content = wiki_tab.get('content')
+    if not content:
+        return None
+
+    meta = tab_view.get('meta') or {}
+    if not isinstance(meta, dict):
+        meta = {}  # UG sends [] instead of {} when a tab has no meta
+    tuning = meta.get('tuning')
+    if isinstance(tuning, dict):
+        tuning = tuning.get('value') or tuning.get('name')
+
+    tab_info = UltimateTabInfo(
+        _text_or_none(tab.get('song_name')) or "UNKNOWN",
+        _text_or_none(tab.get('artist_name')) or "UNKNOWN",
+        _text_or_none(tab.get('username')) or "UNKNOWN",
+        difficulty=_text_or_none(meta.get('difficulty') or tab_view.get('ug_difficulty')),
+        key=_text_or_none(meta.get('tonality') or tab.get('tonality_name')),
+        capo=_text_or_none(meta.get('capo') or None),  # 0 means no capo
+        tuning=_text_or_none(tuning),
+    )
+
+    tab_text = CHORD_MARKUP.sub('', TAB_MARKUP.sub('', content))
+    return tab_info, tab_text
+
+
+def extract_js_store_search_results(html_body: str):
+    '''
+    Returns the raw result entries of a UG search page's js-store, or None
+    when the page has no js-store (e.g. an older markup-only results page).
+    '''
+    store = find_js_store(html_body)
+    if store is None:
+        return None
+    results = page_data(store).get('results')
+    return [result for result in results if isinstance(result, dict)] if isinstance(results, list) else []
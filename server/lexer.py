@@ -0,0 +1,102 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Token types produced by the lexer
+CHORD    = 'chord'
+LYRIC    = 'lyric'
+SECTION  = 'section'
+METADATA = 'metadata'
+BLANK    = 'blank'
+
+# `text` is the stripped line, or the section name for SECTION tokens
+Token = namedtuple('Token', ['type', 'text'])
+
+CHORD_PATTERN = re.compile(r'[A-G][#b]?(m|maj|min|dim|aug|sus[24]?|add\d*|maj7|m7|7|6|9|11|13)?')
+
+# "[Chorus]", "[Verse 1]"
+BRACKET_SECTION_PATTERN = re.compile(r'^\[([^\]]*)\]$')
+# "Chorus", "Verse 2:", "Intro: G D Em C"
+NAMED_SECTION_PATTERN = re.compile(
+    r'^((?:intro|verse|pre-chorus|chorus|bridge|outro|interlude|instrumental|refrain)\b(?:\s*\d+)?)\s*:?\s*(.*)$',
+    re.IGNORECASE
+)
+METADATA_PATTERN = re.compile(r'^(?:capo|tuning|key:|difficulty:|author:|transpose:|chords:)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=8192)
+def is_chord_line(line: str) -> bool:
+    """
+    A line is a chord line if it contains primarily chord names and spaces.
+    This improved version checks for chord patterns and minimal text content.
+    """
+    line = line.strip()
+    if not line:
+        return False
+
+    # Split the line into words
+    words = line.split()
+    if not words:
+        return False
+
+    # Count how many words are chords
+    chord_count = 0
+    for word in words:
+        if CHORD_PATTERN.match(word):
+            chord_count += 1
+
+    # If more than 70% of words are chords, it's likely a chord line
+    if chord_count / len(words) >= 0.7:
+        return True
+
+    # Also check if the line is mostly spaces and a few chord-like words
+    # This catches lines like "    Cadd9  G  D                  Em7"
+    non_space_chars = len(line.replace(' ', ''))
+    if non_space_chars > 0 and chord_count / non_space_chars >= 0.6:
+        return True
+
+    return False
+
+
+@lru_cache(maxsize=8192)
+def classify_line(line: str) -> tuple:
+    """
+    Classifies a single stripped line into one or more tokens.
+
+    Most lines produce one token; a section label followed by chords on the
+    same line ("Intro: G D Em C") produces a SECTION and a CHORD token.
+    Results are memoized since choruses repeat the same lines many times.
+    """
+    if not line:
+        return (Token(BLANK, ''),)
+
+    if line == 'X':  # UG ends some tabs with a lone X
+        return (Token(METADATA, line),)
+
+    bracket = BRACKET_SECTION_PATTERN.match(line)
+    if bracket:
+        return (Token(SECTION, bracket.group(1).strip()),)
+
+    named = NAMED_SECTION_PATTERN.match(line)
+    if named:
+        name, rest = named.group(1).strip(), named.group(2)
+        if not rest:
+            return (Token(SECTION, name),)
+        if is_chord_line(rest):
+            return (Token(SECTION, name), Token(CHORD, rest))
+
+    if METADATA_PATTERN.match(line):
+        return (Token(METADATA, line),)
+
+    if is_chord_line(line):
+        return (Token(CHORD, line),)
+
+    return (Token(LYRIC, line),)
+
+
+def tokenize(tab_text: str):
+    """
+    Yields the tokens of a tab's plain text, classifying every line exactly once.
+    """
+    for line in tab_text.splitlines():
+        yield from classify_line(line.strip())
@@ -0,0 +1,182 @@
+import re
+import threading
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup, NavigableString
+from .lexer import is_chord_line
+
+# Where tab content lives on the page layouts UG has used, most specific first
+TAB_CONTENT_SELECTORS = [
+    'pre',  # Original format
+    '.js-tab-content',  # Modern UG format
+    '.tab-content',  # Alternative modern format
+    '[data-content="tab"]',  # Data attribute format
+    '.chord-content',  # Chord-specific content
+    '.tab-text',  # Tab text format
+    '#tab-content',  # ID-based format
+    '.js-tab',  # JavaScript tab format
+    '.tab-body',  # Tab body format
+    '.content-body',  # Generic content body
+    '.tab',  # Generic tab class
+    '.chords',  # Chords class
+    '.lyrics',  # Lyrics class
+]
+
+# Elements that may hold the tab when none of the selectors match
+SCORED_TAGS = {'div', 'pre', 'span', 'p'}
+
+# A scored container must hold at least this share of the page's chord lines
+SCORE_COVERAGE = 0.8
+
+_ATTRIBUTE_SELECTOR = re.compile(r'^\[([\w-]+)="([^"]*)"\]$')
+_TAB_TYPE = re.compile(r'-([a-z]+)-\d+/?$')
+
+
+def _compile_selector(selector: str) -> tuple:
+    # Only the simple selector forms in TAB_CONTENT_SELECTORS are supported
+    if selector.startswith('.'):
+        return ('class', selector[1:])
+    if selector.startswith('#'):
+        return ('id', selector[1:])
+    match = _ATTRIBUTE_SELECTOR.match(selector)
+    if match:
+        return ('attr', match.groups())
+    return ('tag', selector)
+
+
+COMPILED_SELECTORS = [(selector, _compile_selector(selector)) for selector in TAB_CONTENT_SELECTORS]
+
+
+def url_pattern(url: str) -> str:
+    '''
+    Groups tab urls whose pages share a layout: the host plus the tab type
+    from the slug, i.e. "tabs.ultimate-guitar.com/chords".
+    '''
+    parsed = urlparse(url)
+    match = _TAB_TYPE.search(parsed.path.lower())
+    return f"{parsed.netloc.lower()}/{match.group(1) if match else 'other'}"
+
+
+class ElementIndex(object):
+    '''
+    The first element for every tag, class, id and data-content value in a
+    soup, plus every element in document order, built in one traversal.
+    '''
+
+    def __init__(self, soup: BeautifulSoup):
+        self.first = {}
+        self.elements = []
+        for element in soup.find_all(True):
+            self.elements.append(element)
+            first = self.first
+            first.setdefault(('tag', element.name), element)
+            attrs = element.attrs
+            for name in attrs.get('class') or ():
+                first.setdefault(('class', name), element)
+            if 'id' in attrs:
+                first.setdefault(('id', attrs['id']), element)
+            if 'data-content' in attrs:
+                first.setdefault(('attr', ('data-content', attrs['data-content'])), element)
+
+    def lookup(self, compiled: tuple):
+        return self.first.get(compiled)
+
+    def best_scored(self):
+        '''
+        The innermost div/pre/span/p holding most of the page's chord lines,
+        or None if the page has none.
+
+        Chord lines are counted in each element's own text only and then added
+        up into its ancestors, so every element is read once instead of
+        calling get_text() on every candidate.
+        '''
+        scores = {}
+        depths = {}
+        for element in self.elements:
+            parent = element.parent
+            depths[id(element)] = depths.get(id(parent), 0) + 1
+            own = 0
+            if element.name not in ('script', 'style'):
+                for child in element.contents:
+                    if type(child) is NavigableString:
+                        own += sum(1 for line in child.split('\n') if line.strip() and is_chord_line(line))
+            scores[id(element)] = own
+
+        # Children come after their parents in document order, so walking
+        # backwards adds every subtree into its parent before the parent is read
+        for element in reversed(self.elements):
+            parent = element.parent
+            if id(parent) in scores:
+                scores[id(parent)] += scores[id(element)]
+
+        candidates = [element for element in self.elements if element.name in SCORED_TAGS]
+        top = max((scores[id(element)] for element in candidates), default=0)
+        if top == 0:
+            return None
+        best = None
+        for element in candidates:
+            if scores[id(element)] >= top * SCORE_COVERAGE:
+                if best is None or depths[id(element)] > depths[id(best)]:
+                    best = element
+        return best
+
+
+class TabContentLocator(object):
+    '''
+    Finds the element holding the tab in a page soup.
+
+    The selectors are resolved against an ElementIndex in priority order
+    rather than walking the tree once per selector. The selector that won is
+    remembered per url pattern, and later pages of the same pattern try it
+    first with a single select_one.
+    '''
+
+    def __init__(self):
+        self._learned = {}  # url pattern -> selector
+        self._lock = threading.Lock()
+
+    def learned(self) -> dict:
+        with self._lock:
+            return dict(self._learned)
+
+    def _remember(self, pattern: str, selector: str) -> None:
+        if pattern is None:
+            return
+        with self._lock:
+            self._learned[pattern] = selector
+
+    def locate(self, soup: BeautifulSoup, url: str = None):
+        '''
+        Returns the tab content element, or None if nothing resembling a tab
+        was found.
+        '''
+        pattern = url_pattern(url) if url else None
+        if pattern is not None:
+            selector = self._learned.get(pattern)
+            if selector is not None:
+                element = soup.select_one(selector)
+                if element is not None:
+                    print(f"Found tab content using learned selector: {selector}")
+                    return element
+
+        index = ElementIndex(soup)
+        for selector, compiled in COMPILED_SELECTORS:
+            element = index.lookup(compiled)
+            if element is not None:
+                print(f"Found tab content using selector: {selector}")
+                self._remember(pattern, selector)
+                return element
+
+        # If no specific selector worked, look for the element holding the chord lines
+        element = index.best_scored()
+        if element is not None:
+            print(f"Found tab content in element: {element.name}")
+            return element
+
+        # Last resort: try to extract any text content that might be a tab
+        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
+        if main_content:
+            print("Using main content as fallback")
+        return main_content
+
+
+tab_locator = TabContentLocator()
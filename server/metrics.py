@@ -0,0 +1,196 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from .tracing import span, record_span
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds; covers sub-millisecond parses up to a full render deadline
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15, 30, 60)
+
+
+def _label_text(labelnames, values, extra=()) -> str:
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    '''
+    A monotonically increasing count per combination of label values.
+    '''
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_label_text(self.labelnames, key)} {_number(value)}'
+
+
+class Histogram(object):
+    '''
+    Cumulative bucket counts, sum and count of observed values per
+    combination of label values.
+    '''
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def totals(self) -> dict:
+        '''
+        (count, sum) of the observed values per combination of label values.
+        '''
+        with self._lock:
+            return {key: (sum(counts), total) for key, (counts, total) in self._values.items()}
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(float(bound))
+                yield f'{self.name}_bucket{_label_text(self.labelnames, key, [("le", le)])} {cumulative}'
+            yield f'{self.name}_sum{_label_text(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_label_text(self.labelnames, key)} {cumulative}'
+
+
+class CallbackCounter(object):
+    '''
+    A counter read at scrape time from `read()`, which returns a dict of
+    label values tuple -> count. Used for components that already keep
+    their own counters (i.e. the tab cache).
+    '''
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames, read):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.read = read
+
+    def samples(self):
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"[Metrics] Reading {self.name} failed: {e}")
+            return
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_label_text(self.labelnames, key)} {_number(value)}'
+
+
+class Registry(object):
+    '''
+    The metrics of this process, rendered in the Prometheus text format.
+    '''
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    'tab_stage_seconds',
+    'Time spent in each tab pipeline stage',
+    ['stage'],
+)
+fetch_outcomes = registry.counter(
+    'tab_fetch_outcomes_total',
+    'Static fetch and render outcomes',
+    ['fetcher', 'outcome'],
+)
+render_retries = registry.counter(
+    'tab_render_retries_total',
+    'Render attempts after the first one for the same tab',
+)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    '''
+    Context manager recording how long its body took as `stage`
+    (static_fetch, driver_acquire, page_load, readiness, parse, blocks, serialization),
+    and as a span of the current trace if the request is being traced.
+    '''
+    with span(stage):
+        with stage_seconds.time(stage=stage):
+            yield
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    '''
+    Records a stage that was timed elsewhere and has just finished.
+    '''
+    stage_seconds.observe(seconds, stage=stage)
+    record_span(stage, seconds)
@@ -2,191 +2,19 @@ import json
 import time
 from bs4 import BeautifulSoup
 from .tab import UltimateTab, UltimateTabInfo
+from .driver_pool import DriverPool
+from .browser import get_chrome_driver
+from .upstream import upstream, upstream_url
+from .soup import make_soup, TAB_PAGE_STRAINER
+from .js_store import extract_js_store_tab
+from .locator import tab_locator
+from .readiness import wait_until_ready
+from .metrics import registry, stage_timer, observe_stage, CallbackCounter
+from .tracing import profiled
+from .lexer import CHORD, LYRIC, SECTION, tokenize
 import re
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+import atexit
 import os
-import subprocess
-import sys
-
-def install_chrome_on_railway():
-    """Install Chrome and ChromeDriver on Railway"""
-    try:
-        # Update package list
-        subprocess.run(["apt-get", "update", "-y"], check=True, capture_output=True)
-        
-        # Install dependencies
-        subprocess.run(["apt-get", "install", "-y", "wget", "gnupg", "curl"], check=True, capture_output=True)
-        
-        # Add Google Chrome repository
-        subprocess.run(["wget", "-q", "-O", "-", "https://dl.google.com/linux/linux_signing_key.pub"], 
-                      check=True, capture_output=True, stdout=subprocess.PIPE)
-        
-        # Add Chrome repository
-        with open("/etc/apt/sources.list.d/google-chrome.list", "w") as f:
-            f.write("deb [arch=amd64] http://dl.google.com/linux/chrome/deb/ stable main\n")
-        
-        # Update and install Chrome
-        subprocess.run(["apt-get", "update", "-y"], check=True, capture_output=True)
-        subprocess.run(["apt-get", "install", "-y", "google-chrome-stable"], check=True, capture_output=True)
-        
-        # Install ChromeDriver
-        subprocess.run(["apt-get", "install", "-y", "chromium-chromedriver"], check=True, capture_output=True)
-        
-        print("Chrome and ChromeDriver installed successfully")
-        return True
-    except Exception as e:
-        print(f"Failed to install Chrome: {e}")
-        return False
-
-def get_chrome_driver():
-    """Get a working Chrome driver with multiple fallback strategies"""
-    
-    # Strategy 1: Try system Chrome
-    try:
-        if os.path.exists("/usr/bin/google-chrome-stable"):
-            options = Options()
-            options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--disable-extensions")
-            options.add_argument("--disable-infobars")
-            options.add_argument("--window-size=1920,1080")
-            options.add_argument("--disable-blink-features=AutomationControlled")
-            options.add_argument("--blink-settings=imagesEnabled=false")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--disable-web-security")
-            options.add_argument("--allow-running-insecure-content")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--disable-background-timer-throttling")
-            options.add_argument("--disable-backgrounding-occluded-windows")
-            options.add_argument("--disable-renderer-backgrounding")
-            options.add_argument("--disable-features=TranslateUI")
-            options.add_argument("--disable-ipc-flooding-protection")
-            
-            service = Service("/usr/bin/google-chrome-stable")
-            driver = webdriver.Chrome(service=service, options=options)
-            print("Using system Chrome")
-            return driver
-    except Exception as e:
-        print(f"System Chrome failed: {e}")
-    
-    # Strategy 2: Try system ChromeDriver
-    try:
-        if os.path.exists("/usr/bin/chromedriver"):
-            options = Options()
-            options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--disable-extensions")
-            options.add_argument("--disable-infobars")
-            options.add_argument("--window-size=1920,1080")
-            options.add_argument("--disable-blink-features=AutomationControlled")
-            options.add_argument("--blink-settings=imagesEnabled=false")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--disable-web-security")
-            options.add_argument("--allow-running-insecure-content")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--disable-background-timer-throttling")
-            options.add_argument("--disable-backgrounding-occluded-windows")
-            options.add_argument("--disable-renderer-backgrounding")
-            options.add_argument("--disable-features=TranslateUI")
-            options.add_argument("--disable-ipc-flooding-protection")
-            
-            service = Service("/usr/bin/chromedriver")
-            driver = webdriver.Chrome(service=service, options=options)
-            print("Using system ChromeDriver")
-            return driver
-    except Exception as e:
-        print(f"System ChromeDriver failed: {e}")
-    
-    # Strategy 3: Try webdriver-manager with manual path resolution
-    try:
-        from webdriver_manager.chrome import ChromeDriverManager
-        driver_path = ChromeDriverManager().install()
-        
-        # Find the actual chromedriver executable
-        if os.path.exists(driver_path):
-            driver_dir = os.path.dirname(driver_path)
-            actual_driver_path = None
-            
-            # Look for the actual chromedriver executable
-            for file in os.listdir(driver_dir):
-                if file.startswith('chromedriver') and not file.endswith(('.txt', '.md', '.notice')):
-                    actual_driver_path = os.path.join(driver_dir, file)
-                    break
-            
-            if actual_driver_path and os.path.isfile(actual_driver_path):
-                # Make it executable
-                os.chmod(actual_driver_path, 0o755)
-                
-                options = Options()
-                options.add_argument("--headless")
-                options.add_argument("--no-sandbox")
-                options.add_argument("--disable-dev-shm-usage")
-                options.add_argument("--disable-gpu")
-                options.add_argument("--disable-extensions")
-                options.add_argument("--disable-infobars")
-                options.add_argument("--window-size=1920,1080")
-                options.add_argument("--disable-blink-features=AutomationControlled")
-                options.add_argument("--blink-settings=imagesEnabled=false")
-                options.add_argument("--disable-features=VizDisplayCompositor")
-                options.add_argument("--disable-web-security")
-                options.add_argument("--allow-running-insecure-content")
-                options.add_argument("--disable-features=VizDisplayCompositor")
-                options.add_argument("--disable-background-timer-throttling")
-                options.add_argument("--disable-backgrounding-occluded-windows")
-                options.add_argument("--disable-renderer-backgrounding")
-                options.add_argument("--disable-features=TranslateUI")
-                options.add_argument("--disable-ipc-flooding-protection")
-                
-                service = Service(actual_driver_path)
-                driver = webdriver.Chrome(service=service, options=options)
-                print("Using webdriver-manager ChromeDriver")
-                return driver
-    except Exception as e:
-        print(f"WebDriver Manager failed: {e}")
-    
-    # Strategy 4: Manual installation and setup
-    try:
-        install_chrome_on_railway()
-        
-        # Try again with system Chrome
-        if os.path.exists("/usr/bin/google-chrome-stable"):
-            options = Options()
-            options.add_argument("--headless")
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument("--disable-gpu")
-            options.add_argument("--disable-extensions")
-            options.add_argument("--disable-infobars")
-            options.add_argument("--window-size=1920,1080")
-            options.add_argument("--disable-blink-features=AutomationControlled")
-            options.add_argument("--blink-settings=imagesEnabled=false")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--disable-web-security")
-            options.add_argument("--allow-running-insecure-content")
-            options.add_argument("--disable-features=VizDisplayCompositor")
-            options.add_argument("--disable-background-timer-throttling")
-            options.add_argument("--disable-backgrounding-occluded-windows")
-            options.add_argument("--disable-renderer-backgrounding")
-            options.add_argument("--disable-features=TranslateUI")
-            options.add_argument("--disable-ipc-flooding-protection")
-            
-            service = Service("/usr/bin/google-chrome-stable")
-            driver = webdriver.Chrome(service=service, options=options)
-            print("Using manually installed Chrome")
-            return driver
-    except Exception as e:
-        print(f"Manual installation failed: {e}")
-    
-    raise Exception("All Chrome driver strategies failed")
 
 def _tab_info_from_soup(soup: BeautifulSoup) -> UltimateTabInfo:
     '''
@@ -240,172 +68,71 @@ def _tab_info_from_soup(soup: BeautifulSoup) -> UltimateTabInfo:
     tab_info = UltimateTabInfo(song_title, artist_name, author, difficulty, key, capo, tuning)
     return tab_info
 
-def is_chord_line(line):
+def _tab_text_from_soup(soup: BeautifulSoup, url: str = None):
     """
-    A line is a chord line if it contains primarily chord names and spaces.
-    This improved version checks for chord patterns and minimal text content.
+    Locates the tab content in a full page soup and returns its text,
+    or None if nothing resembling a tab was found.
     """
-    line = line.strip()
-    if not line:
-        return False
-    
-    # Common chord patterns (more comprehensive)
-    chord_pattern = re.compile(r'[A-G][#b]?(m|maj|min|dim|aug|sus[24]?|add\d*|maj7|m7|7|6|9|11|13)?')
-    
-    # Split the line into words
-    words = line.split()
-    if not words:
-        return False
-    
-    # Count how many words are chords
-    chord_count = 0
-    total_chars = 0
-    
-    for word in words:
-        total_chars += len(word)
-        if chord_pattern.match(word):
-            chord_count += 1
-    
-    # If more than 70% of words are chords, it's likely a chord line
-    if len(words) > 0 and chord_count / len(words) >= 0.7:
-        return True
-    
-    # Also check if the line is mostly spaces and a few chord-like words
-    # This catches lines like "    Cadd9  G  D                  Em7"
-    non_space_chars = len(line.replace(' ', ''))
-    if non_space_chars > 0 and chord_count / non_space_chars >= 0.6:
-        return True
-    
-    return False
-
-def html_tab_to_json_dict(html_body: str) -> json:
-    start_parse = time.time()
-    soup = BeautifulSoup(html_body, "html.parser")
-    tab_info = _tab_info_from_soup(soup)
-    
-    # Try multiple selectors for tab content
-    tab_content = None
-    selectors_to_try = [
-        'pre',  # Original format
-        '.js-tab-content',  # Modern UG format
-        '.tab-content',  # Alternative modern format
-        '[data-content="tab"]',  # Data attribute format
-        '.chord-content',  # Chord-specific content
-        '.tab-text',  # Tab text format
-        '#tab-content',  # ID-based format
-        '.js-tab',  # JavaScript tab format
-        '.tab-body',  # Tab body format
-        '.content-body',  # Generic content body
-        '.tab',  # Generic tab class
-        '.chords',  # Chords class
-        '.lyrics',  # Lyrics class
-    ]
-    
-    for selector in selectors_to_try:
-        tab_content = soup.select_one(selector)
-        if tab_content:
-            print(f"Found tab content using selector: {selector}")
-            break
-    
-    # If no specific selector worked, try to find any content that looks like a tab
+    tab_content = tab_locator.locate(soup, url)
     if tab_content is None:
-        # Look for any element containing tab-like content
-        for element in soup.find_all(['div', 'pre', 'span', 'p']):
-            text = element.get_text()
-            if text and len(text) > 50:
-                # Check if it contains chord-like patterns
-                chord_pattern = re.compile(r'[A-G][#b]?(m|maj|min|dim|aug|sus[24]?|add\d*|maj7|m7|7|6|9|11|13)?')
-                if chord_pattern.search(text):
-                    tab_content = element
-                    print(f"Found tab content in element: {element.name}")
-                    break
-    
-    if tab_content is None:
-        # Last resort: try to extract any text content that might be a tab
-        main_content = soup.find('main') or soup.find('article') or soup.find('div', class_='content')
-        if main_content:
-            tab_content = main_content
-            print("Using main content as fallback")
-        else:
-            return {'error': 'Could not find tab content in the page. The page structure may have changed or the content is not accessible.'}
-    
+        return None
+    return tab_content.get_text('\n')  # Get all text, preserving newlines
+
+def _tab_from_text(tab_text: str) -> UltimateTab:
+    """
+    Builds an UltimateTab from the plain text of a tab, pairing chord lines
+    with the lyric lines that follow them.
+
+    The text is tokenized once and the tokens are consumed in a single
+    forward pass. Metadata lines are dropped and blank lines are replaced
+    by the tab's own paragraph spacing.
+    """
     tab = UltimateTab()
-    tab_text = tab_content.get_text('\n')  # Get all text, preserving newlines
-    lines = tab_text.splitlines()
-    
-    # Filter out empty lines and clean up
-    cleaned_lines = []
-    for line in lines:
-        line = line.strip()
-        if line and len(line) > 0:
-            # Filter out metadata lines that interfere with alignment
-            # Skip lines that are just metadata (brackets, capo info, etc.)
-            if (line.startswith('[') and line.endswith(']')) or \
-               line.lower().startswith('capo') or \
-               line.lower().startswith('tuning') or \
-               line.lower().startswith('key:') or \
-               line.lower().startswith('difficulty:') or \
-               line.lower().startswith('author:') or \
-               line.lower().startswith('transpose:') or \
-               line.lower().startswith('chords:') or \
-               line.lower().startswith('intro') or \
-               line.lower().startswith('verse') or \
-               line.lower().startswith('chorus') or \
-               line.lower().startswith('bridge') or \
-               line.lower().startswith('outro') or \
-               line == 'X':  # Filter out the X at the end
-                continue
-            cleaned_lines.append(line)
-    
-    # More sophisticated parsing: look for patterns
+    tokens = [token for token in tokenize(tab_text) if token.type in (CHORD, LYRIC, SECTION)]
+    count = len(tokens)
+
     i = 0
-    while i < len(cleaned_lines):
-        line = cleaned_lines[i]
-        
-        if not line:
-            tab.append_blank_line()
+    while i < count:
+        token = tokens[i]
+
+        if token.type == SECTION:
+            # Separate sections from whatever came before them
+            if tab.lines and tab.lines[-1]:
+                tab.append_blank_line()
+            tab.append_section_line(token.text)
             i += 1
             continue
-        
-        # Check if this line looks like a chord line
-        if is_chord_line(line):
-            # Look ahead to see if there are multiple consecutive chord lines
-            combined_chord_line = line
+
+        if token.type == CHORD:
+            # Consecutive chord lines are merged into one
+            chord_lines = [token.text]
             j = i + 1
-            while j < len(cleaned_lines) and is_chord_line(cleaned_lines[j]):
-                combined_chord_line += ' ' + cleaned_lines[j]
+            while j < count and tokens[j].type == CHORD:
+                chord_lines.append(tokens[j].text)
                 j += 1
-            
-            # Look ahead to see if there's a lyric line following the chord lines
-            if j < len(cleaned_lines) and not is_chord_line(cleaned_lines[j]):
-                # We have chord line(s) followed by a lyric line
-                lyric_line = cleaned_lines[j]
-                
-                # Add the combined chord line
-                tab.append_chord_line(combined_chord_line)
-                # Then add the lyric line
-                tab.append_lyric_line(lyric_line)
-                
-                i = j + 1  # Skip all chord lines and the lyric line
-                
-                # Add blank line after each verse for better readability
-                # Check if next line is a chord line (indicating new verse/section)
-                if i < len(cleaned_lines) and is_chord_line(cleaned_lines[i]):
-                    tab.append_blank_line()
+            tab.append_chord_line(' '.join(chord_lines))
+
+            if j < count and tokens[j].type == LYRIC:
+                # Chord line(s) followed by the lyric they belong to
+                tab.append_lyric_line(tokens[j].text)
+                i = j + 1
             else:
                 # Just chord line(s) without following lyric
-                tab.append_chord_line(combined_chord_line)
-                i = j  # Skip all chord lines
+                i = j
+                continue
         else:
             # This is a lyric line without preceding chord line
-            tab.append_lyric_line(line)
+            tab.append_lyric_line(token.text)
             i += 1
-            
-            # Add blank line after each paragraph/verse for better readability
-            # Check if next line is a chord line (indicating new verse/section)
-            if i < len(cleaned_lines) and is_chord_line(cleaned_lines[i]):
-                tab.append_blank_line()
-    
+
+        # Add blank line after each verse for better readability
+        # Check if next line is a chord line (indicating new verse/section)
+        if i < count and tokens[i].type == CHORD:
+            tab.append_blank_line()
+
+    return tab
+
+def _tab_json(tab_info: UltimateTabInfo, tab: UltimateTab) -> dict:
     json_obj = {
         'title': tab_info.title,
         'artist_name': tab_info.artist,
@@ -420,104 +147,107 @@ def html_tab_to_json_dict(html_body: str) -> json:
     if tab_info.tuning is not None:
         json_obj['tuning'] = tab_info.tuning
     json_obj['lines'] = tab.as_json_dictionary()['lines']
-    print(f"[Timing] Tab parsing time: {time.time() - start_parse:.2f}s")
     return {'tab': json_obj}
 
-def get_rendered_html(url):
-    """Get rendered HTML with robust error handling"""
-    driver = None
+def html_tab_to_json_dict(html_body: str, url: str = None) -> json:
+    with stage_timer('parse'), profiled('parse'):
+        return _parse_tab_page(html_body, url)
+
+def _parse_tab_page(html_body: str, url: str = None) -> json:
+    # Fast path: read the tab straight out of the embedded js-store JSON
+    js_store_tab = extract_js_store_tab(html_body)
+    if js_store_tab is not None:
+        tab_info, tab_text = js_store_tab
+    else:
+        # Only build the tab content containers and metadata spans, not the whole page
+        soup = make_soup(html_body, only=TAB_PAGE_STRAINER)
+        tab_info = _tab_info_from_soup(soup)
+        tab_text = _tab_text_from_soup(soup, url)
+        if tab_text is None:
+            # Nothing matched the usual containers; search the full document instead
+            tab_text = _tab_text_from_soup(make_soup(html_body), url)
+        if tab_text is None:
+            return {'error': 'Could not find tab content in the page. The page structure may have changed or the content is not accessible.'}
+
+    return _tab_json(tab_info, _tab_from_text(tab_text))
+
+def _launch_pooled_driver():
+    """Launch a Chrome driver configured once for reuse across many renders"""
+    driver = get_chrome_driver()
+    driver.set_page_load_timeout(30)
+    driver.set_script_timeout(30)
+
+    # Configure Chrome for better performance
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {
+        "urls": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.css", "*.woff", "*.ttf", "*.svg"]
+    })
+    return driver
+
+# Drivers are kept warm between requests instead of paying Chrome startup on every render
+driver_pool = DriverPool(
+    _launch_pooled_driver,
+    size=int(os.environ.get('CHROME_POOL_SIZE', 1)),
+    max_pages=int(os.environ.get('CHROME_POOL_MAX_PAGES', 50)),
+)
+atexit.register(driver_pool.close)
+
+registry.register(CallbackCounter(
+    'chrome_driver_pool_events_total',
+    'Driver pool launches, recycles, discards and leases',
+    ['event'],
+    lambda: {(event,): count for event, count in driver_pool.stats().items()
+             if event in ('launched', 'recycled', 'discarded', 'leases')},
+))
+
+def _cancelled(cancel) -> bool:
+    return cancel is not None and cancel.is_set()
+
+def get_rendered_html(url, cancel=None):
+    """
+    Get rendered HTML with robust error handling. Gives up early, returning
+    an empty string, once the optional `cancel` event is set.
+    """
+    if _cancelled(cancel):
+        return ""
     try:
-        driver = get_chrome_driver()
-        driver.set_page_load_timeout(30)
-        driver.set_script_timeout(30)
-        
-        # Configure Chrome for better performance
-        driver.execute_cdp_cmd("Network.enable", {})
-        driver.execute_cdp_cmd("Network.setBlockedURLs", {
-            "urls": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.css", "*.woff", "*.ttf", "*.svg"]
-        })
-        
-        start = time.time()
-        driver.get(url)
-        
-        # Wait for content to load
-        WebDriverWait(driver, 20).until(
-            EC.presence_of_element_located((By.TAG_NAME, "body"))
-        )
-        
-        # Wait for tab content to appear (try multiple selectors)
-        tab_selectors = [
-            'pre',
-            '.js-tab-content',
-            '.tab-content',
-            '[data-content="tab"]',
-            '.chord-content',
-            '.tab-text',
-            '#tab-content',
-            '.js-tab',
-            '.tab-body',
-            '.content-body',
-            '.tab',
-            '.chords',
-            '.lyrics'
-        ]
-        
-        tab_found = False
-        for selector in tab_selectors:
-            try:
-                WebDriverWait(driver, 5).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, selector))
-                )
-                print(f"Found tab content with selector: {selector}")
-                tab_found = True
-                break
-            except:
-                continue
-        
-        # If no specific selector found, wait a bit more for dynamic content
-        if not tab_found:
-            print("No specific tab selector found, waiting for dynamic content...")
-            time.sleep(5)
-        
-        # Additional wait for any JavaScript content
-        time.sleep(3)
-        
-        html = driver.page_source
-        print(f"[Timing] Selenium fetch time: {time.time() - start:.2f}s")
-        
-        if not html or len(html.strip()) < 100:
-            raise Exception("Empty or too short HTML response")
-        
-        return html
+        acquire_start = time.perf_counter()
+        with driver_pool.lease() as driver:
+            observe_stage('driver_acquire', time.perf_counter() - acquire_start)
+            if _cancelled(cancel):
+                return ""
+            upstream.wait_turn(url)
+            with stage_timer('page_load'):
+                driver.get(upstream_url(url))
+            if _cancelled(cancel):
+                print("Render cancelled after page load")
+                return ""
+            
+            # Wait for tab content and for client-side rendering to settle, under one deadline
+            readiness = wait_until_ready(driver, cancel=cancel)
+            if _cancelled(cancel):
+                print("Render cancelled during readiness wait")
+                return ""
+            observe_stage('readiness', readiness['waited'])
+            if not readiness['content_found']:
+                print("No specific tab selector found before the readiness deadline")
+            
+            html = driver.page_source
+            
+            if not html or len(html.strip()) < 100:
+                raise Exception("Empty or too short HTML response")
+            
+            return html
         
     except Exception as e:
         print(f"[Error] Selenium page load failed: {e}")
         return ""
-    finally:
-        if driver:
-            try:
-                driver.quit()
-            except:
-                pass
 
 # Optionally, you could add a fallback to requests+BeautifulSoup for static pages:
 def get_html_requests(url):
-    import requests
-    start = time.time()
     try:
-        # Use a session with optimized headers for faster requests
-        session = requests.Session()
-        session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
-        resp = session.get(url, timeout=15)  # Increased timeout
-        resp.raise_for_status()
-        print(f"[Timing] requests fetch time: {time.time() - start:.2f}s")
+        with stage_timer('static_fetch'):
+            resp = upstream.get(url, timeout=15)
         return resp.text
     except Exception as e:
         print(f"[Error] requests fetch failed: {e}")
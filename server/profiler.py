@@ -0,0 +1,156 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# How often the sampler looks at every thread's stack while it runs
+PROFILER_INTERVAL = float(os.environ.get('PROFILER_INTERVAL', 0.01))
+
+# Shortest interval accepted, so a bad value can't turn the sampler into a busy loop
+PROFILER_MIN_INTERVAL = 0.001
+
+# The sampler stops by itself after this many seconds
+PROFILER_MAX_SECONDS = float(os.environ.get('PROFILER_MAX_SECONDS', 300))
+
+# Frames kept per sampled stack, innermost first
+PROFILER_MAX_DEPTH = 40
+
+# Distinct stacks (and leaf frames) counted; samples of new ones past this are only tallied as dropped
+PROFILER_MAX_STACKS = 5000
+
+# Innermost frames of threads that are blocked waiting for work, not running code
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socketserver.py', 'serve_forever'),
+    ('thread.py', '_worker'),  # concurrent.futures worker blocked on its work queue
+}
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}"
+
+
+class SamplingProfiler(object):
+    '''
+    A statistical profiler for a running worker.
+
+    While started, a background thread reads the stack of every other
+    thread with sys._current_frames() each `interval` seconds and counts
+    the stacks it sees, skipping threads that are blocked waiting for work.
+    It never instruments the code being profiled; the cost is one stack walk
+    per thread per sample. It stops by itself after `max_seconds`, and counts
+    at most `max_stacks` distinct stacks, so one left running on a live
+    worker stays bounded in time and memory.
+    '''
+
+    def __init__(self, interval: float = 0.01, max_seconds: float = 300, max_stacks: int = 5000):
+        self.interval = max(PROFILER_MIN_INTERVAL, interval)
+        self.max_seconds = max_seconds
+        self.max_stacks = max_stacks
+        self._stacks = Counter()
+        self._leaves = Counter()
+        self._samples = 0
+        self._dropped = 0
+        self._started_at = None
+        self._stopped_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = None) -> bool:
+        '''
+        Clears previous samples and starts sampling. Returns False if the
+        profiler was already running. Raises ValueError for an `interval`
+        that isn't positive; shorter ones than PROFILER_MIN_INTERVAL are raised to it.
+        '''
+        if interval is not None and not interval > 0:
+            raise ValueError('interval must be a positive number of seconds')
+        with self._lock:
+            if self.running():
+                return False
+            if interval is not None:
+                self.interval = max(PROFILER_MIN_INTERVAL, interval)
+            self._stacks.clear()
+            self._leaves.clear()
+            self._samples = 0
+            self._dropped = 0
+            self._started_at = time.time()
+            self._stopped_at = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._mark_stopped()
+
+    def _mark_stopped(self) -> None:
+        with self._lock:
+            if self._started_at is not None and self._stopped_at is None:
+                self._stopped_at = time.time()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.monotonic() >= deadline:
+                print(f"[Profiler] Stopped after {self.max_seconds:g}s")
+                break
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == me or _is_idle(frame):
+                    continue
+                labels = []
+                while frame is not None and len(labels) < PROFILER_MAX_DEPTH:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                if labels:
+                    stacks.append(labels)
+            del frames
+            with self._lock:
+                self._samples += 1
+                for labels in stacks:
+                    # Collapsed, outermost-first format understood by flamegraph tools
+                    stack = ';'.join(reversed(labels))
+                    if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                        self._dropped += 1
+                        continue
+                    self._stacks[stack] += 1
+                    if labels[0] in self._leaves or len(self._leaves) < self.max_stacks:
+                        self._leaves[labels[0]] += 1
+        self._mark_stopped()
+
+    def report(self, top: int = 20) -> dict:
+        with self._lock:
+            end = self._stopped_at or time.time()
+            return {
+                'running': self.running(),
+                'interval': self.interval,
+                'samples': self._samples,
+                'dropped_stacks': self._dropped,
+                'seconds': round(end - self._started_at, 3) if self._started_at else 0.0,
+                'top_frames': [{'frame': frame, 'samples': count} for frame, count in self._leaves.most_common(top)],
+                'top_stacks': [{'stack': stack, 'samples': count} for stack, count in self._stacks.most_common(top)],
+            }
+
+
+sampling_profiler = SamplingProfiler(interval=PROFILER_INTERVAL, max_seconds=PROFILER_MAX_SECONDS,
+                                     max_stacks=PROFILER_MAX_STACKS)
@@ -0,0 +1,41 @@
+import threading
+
+
+class ProgressHub(object):
+    '''
+    Fans progress events for a key out to every subscribed callback.
+
+    The fetch pipeline publishes under the key of its single-flight, so a
+    request that joined an in-flight fetch started by someone else still
+    sees its progress, and only that fetch's progress. Callbacks must be cheap and thread-safe; exceptions they raise
+    are swallowed so a broken listener can never fail a fetch.
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners = {}
+
+    def subscribe(self, key, callback) -> None:
+        with self._lock:
+            self._listeners.setdefault(key, []).append(callback)
+
+    def unsubscribe(self, key, callback) -> None:
+        with self._lock:
+            listeners = self._listeners.get(key)
+            if not listeners:
+                return
+            try:
+                listeners.remove(callback)
+            except ValueError:
+                pass
+            if not listeners:
+                del self._listeners[key]
+
+    def publish(self, key, event: dict) -> None:
+        with self._lock:
+            listeners = list(self._listeners.get(key, ()))
+        for callback in listeners:
+            try:
+                callback(event)
+            except Exception:
+                pass
@@ -0,0 +1,72 @@
+import os
+import time
+from .locator import TAB_CONTENT_SELECTORS
+
+# Overall budget for a rendered page to become ready, and how long the DOM
+# and network must stay quiet before we consider client-side rendering done
+RENDER_READY_TIMEOUT = float(os.environ.get('RENDER_READY_TIMEOUT', 15))
+RENDER_QUIET_MS = int(os.environ.get('RENDER_QUIET_MS', 300))
+
+# One selector list so the browser checks every candidate in a single query
+TAB_CONTENT_SELECTOR = ', '.join(TAB_CONTENT_SELECTORS)
+
+# Resolves once the document is complete and neither the DOM nor the set of
+# loaded resources has changed for `quietMs`, or with false at `timeoutMs`.
+QUIESCENCE_SCRIPT = '''
+var quietMs = arguments[0], timeoutMs = arguments[1], done = arguments[arguments.length - 1];
+var start = Date.now(), lastChange = start;
+var resources = performance.getEntriesByType('resource').length;
+var observer = new MutationObserver(function () { lastChange = Date.now(); });
+observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+(function check() {
+    var now = Date.now();
+    var count = performance.getEntriesByType('resource').length;
+    if (count !== resources) { resources = count; lastChange = now; }
+    if (document.readyState === 'complete' && now - lastChange >= quietMs) { observer.disconnect(); done(true); return; }
+    if (now - start >= timeoutMs) { observer.disconnect(); done(false); return; }
+    setTimeout(check, 50);
+})();
+'''
+
+
+def wait_until_ready(driver, timeout: float = RENDER_READY_TIMEOUT, quiet_ms: int = RENDER_QUIET_MS,
+                     cancel=None) -> dict:
+    '''
+    Waits until the page in `driver` shows tab content and has settled, all
+    within a single `timeout` deadline.
+
+    First waits for any of the tab content selectors to appear, then for the
+    DOM and network to go quiet so client-side rendering has finished.
+    Returns as soon as both hold instead of sleeping a fixed amount, or as
+    soon as the optional `cancel` event is set.
+    '''
+    # Imported here so that Selenium is only loaded once a render actually happens
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+
+    start = time.monotonic()
+    deadline = start + timeout
+
+    content_present = EC.presence_of_element_located((By.CSS_SELECTOR, TAB_CONTENT_SELECTOR))
+
+    def content_or_cancelled(d):
+        return (cancel is not None and cancel.is_set()) or content_present(d)
+
+    content_found = False
+    try:
+        content_found = WebDriverWait(driver, timeout, poll_frequency=0.1).until(content_or_cancelled) is not True
+    except TimeoutException:
+        pass
+
+    quiescent = False
+    remaining = deadline - time.monotonic()
+    if remaining > 0 and not (cancel is not None and cancel.is_set()):
+        quiescent = bool(driver.execute_async_script(QUIESCENCE_SCRIPT, quiet_ms, int(remaining * 1000)))
+
+    return {
+        'content_found': content_found,
+        'quiescent': quiescent,
+        'waited': time.monotonic() - start,
+    }
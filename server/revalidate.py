@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Revalidator(object):
+    '''
+    Refreshes expired cache entries in the background while they keep being served.
+
+    At most one refresh runs per key: asking again for a key whose refresh is
+    still queued or running does nothing, so a burst of requests for one
+    stale tab starts a single fetch. Failed refreshes are logged and leave the
+    stale entry in place for the next request to retry.
+    '''
+
+    def __init__(self, workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='revalidate')
+        self._active = set()
+        self._lock = threading.Lock()
+
+        self.started = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def submit(self, key, fn, *args) -> bool:
+        '''
+        Queues `fn(*args)` to refresh `key`. Returns False if a refresh of
+        `key` is already pending.
+        '''
+        with self._lock:
+            if key in self._active:
+                self.coalesced += 1
+                return False
+            self._active.add(key)
+            self.started += 1
+        self._executor.submit(self._run, key, fn, args)
+        return True
+
+    def _run(self, key, fn, args) -> None:
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"[Cache] Background refresh of {key} failed: {e}")
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._active.discard(key)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'started': self.started, 'coalesced': self.coalesced, 'failed': self.failed,
+                    'in_flight': len(self._active)}
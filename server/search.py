@@ -0,0 +1,292 @@
+import contextvars
+import html
+import os
+import re
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import requests
+from .cache import search_cache, fold_text, normalize_search_query, SEARCH_NEGATIVE_TTL
+from .js_store import extract_js_store_search_results
+from .metrics import stage_timer
+from .singleflight import SingleFlight
+from .soup import make_soup, SEARCH_LINK_STRAINER
+from .tab_index import tab_index
+from .tracing import span, annotate
+from .upstream import upstream, UG_TABS_HOST, UG_WWW_HOST
+
+# Upper bound on a whole search; the candidate endpoints are queried at the same time
+SEARCH_TIMEOUT = float(os.environ.get('SEARCH_TIMEOUT', 10))
+SEARCH_MAX_WORKERS = int(os.environ.get('SEARCH_MAX_WORKERS', 16))
+
+# Where the results of a search came from
+SOURCE_LOCAL = 'local'
+SOURCE_UG = 'ultimate-guitar'
+
+# Results returned by /search unless the client passes `limit`
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+# A result's rating counts as this many votes of RATING_PRIOR, so a 5.0 from
+# two voters doesn't outrank a 4.8 from a thousand
+RATING_PRIOR = 3.5
+RATING_PRIOR_VOTES = 20
+
+# Shared by every search so the number of concurrent upstream requests stays bounded per worker
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix='ug-search')
+search_flight = SingleFlight()
+
+TAB_URL_PATTERN = re.compile(r'https?://tabs\.ultimate-guitar\.com/tab/[^"\'\s<>\\]+')
+
+# /tab/<artist>/<song>-<type>-<id>
+TAB_SLUG_PATTERN = re.compile(r'/tab/([^/]+)/(.+)-([a-z]+)-(\d+)/?$')
+
+
+def search_urls(song_name: str, artist_name: str = '') -> list:
+    '''
+    The UG search endpoints tried for a query, most specific first.
+    '''
+    query = f"{artist_name} {song_name}" if artist_name else song_name
+    encoded_query = urllib.parse.quote(query)
+    return [
+        f"https://{UG_WWW_HOST}/search.php?search_type=title&value={encoded_query}",
+        f"https://{UG_WWW_HOST}/search.php?search_type=artist&value={encoded_query}",
+        f"https://{UG_WWW_HOST}/search.php?value={encoded_query}",
+        f"https://{UG_TABS_HOST}/search?q={encoded_query}",
+    ]
+
+
+def _text_or_none(value):
+    if value is None or value == '':
+        return None
+    return str(value).strip()
+
+
+def _number_or_none(value, kind):
+    try:
+        return kind(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _result_from_store(entry: dict):
+    url = entry.get('tab_url')
+    if not isinstance(url, str) or urllib.parse.urlparse(url).netloc != UG_TABS_HOST:
+        return None  # Artist pages, courses and other non-tab entries
+    return {
+        'song_name': _text_or_none(entry.get('song_name')),
+        'artist_name': _text_or_none(entry.get('artist_name')),
+        'type': _text_or_none(entry.get('type')),
+        'rating': _number_or_none(entry.get('rating'), float),
+        'votes': _number_or_none(entry.get('votes'), int) or 0,
+        'url': url,
+    }
+
+
+def _result_from_url(url: str) -> dict:
+    # Pages without a js-store only give us links; the slug still names the song
+    match = TAB_SLUG_PATTERN.search(urllib.parse.urlparse(url).path)
+    if match is None:
+        return {'song_name': None, 'artist_name': None, 'type': None, 'rating': None, 'votes': 0, 'url': url}
+    artist, song, tab_type, _ = match.groups()
+    return {
+        'song_name': song.replace('-', ' ').title(),
+        'artist_name': artist.replace('-', ' ').title(),
+        'type': tab_type.replace('-', ' ').title(),
+        'rating': None,
+        'votes': 0,
+        'url': url,
+    }
+
+
+def _linked_tab_urls(html_body: str) -> list:
+    urls = TAB_URL_PATTERN.findall(html.unescape(html_body))
+    if not urls:
+        for link in make_soup(html_body, only=SEARCH_LINK_STRAINER).find_all('a', href=True):
+            href = link['href']
+            if href.startswith('/tab/'):
+                urls.append(f"https://{UG_TABS_HOST}{href}")
+    return [url for url in urls if len(url) < 200]
+
+
+def parse_search_results(html_body: str) -> list:
+    '''
+    The tab results of a UG search page, in page order and without duplicate
+    urls. Reads the page's js-store when it has one, and falls back to the tab
+    links in the markup otherwise.
+    '''
+    entries = extract_js_store_search_results(html_body)
+    if entries:
+        results = [_result_from_store(entry) for entry in entries]
+    else:
+        results = [_result_from_url(url) for url in _linked_tab_urls(html_body)]
+
+    seen = set()
+    unique = []
+    for result in results:
+        if result is not None and result['url'] not in seen:
+            seen.add(result['url'])
+            unique.append(result)
+    return unique
+
+
+def _match(wanted: str, actual: str) -> int:
+    if not wanted or not actual:
+        return 0
+    if actual == wanted:
+        return 3
+    if actual.startswith(wanted):
+        return 2  # i.e. "amazing grace my chains are gone"
+    if wanted in actual or actual in wanted:
+        return 1
+    return 0
+
+
+def _quality(result: dict) -> float:
+    votes = result['votes'] or 0
+    rating = result['rating'] if result['rating'] is not None else RATING_PRIOR
+    return (rating * votes + RATING_PRIOR * RATING_PRIOR_VOTES) / (votes + RATING_PRIOR_VOTES)
+
+
+def rank_results(results: list, song_name: str, artist_name: str = '') -> list:
+    '''
+    Orders results by how well their song and artist match the query, then
+    by vote-weighted rating. Each result gets its `rank`, starting at 1.
+    '''
+    song = fold_text(song_name)
+    artist = fold_text(artist_name)
+
+    def key(indexed):
+        index, result = indexed
+        relevance = _match(song, fold_text(result['song_name'])) + _match(artist, fold_text(result['artist_name']))
+        return -relevance, -_quality(result), -(result['votes'] or 0), index
+
+    ranked = [dict(result) for _, result in sorted(enumerate(results), key=key)]
+    for rank, result in enumerate(ranked, 1):
+        result['rank'] = rank
+    return ranked
+
+
+def _search_endpoint(url: str) -> list:
+    with span('search_endpoint', url=url):
+        response = upstream.get(url, timeout=SEARCH_TIMEOUT)
+        results = parse_search_results(response.text)
+        annotate(results=len(results))
+        return results
+
+
+def fetch_search_results(song_name: str, artist_name: str = '') -> list:
+    '''
+    Queries every candidate search endpoint at once and returns the results of
+    the most specific one that has any. Stops as soon as that is known, i.e.
+    when the title search answers, without waiting for the other endpoints.
+    Returns [] when no endpoint found anything, and raises
+    requests.RequestException when none of them answered at all.
+    '''
+    futures = [search_executor.submit(contextvars.copy_context().run, _search_endpoint, url)
+               for url in search_urls(song_name, artist_name)]
+    deadline = time.monotonic() + SEARCH_TIMEOUT
+    outcomes = [None] * len(futures)  # Results per endpoint, once it has answered or failed
+    answered = 0
+    failure = None
+    try:
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                try:
+                    results = future.result()
+                    answered += 1
+                except requests.RequestException as e:
+                    print(f"[Search] Endpoint failed: {e}")
+                    failure = failure or e
+                    results = []
+                except Exception as e:
+                    print(f"[Error] Could not parse search results: {e}")
+                    answered += 1
+                    results = []
+                outcomes[futures.index(future)] = results
+
+            # The first endpoint in priority order with results wins once every endpoint before it came up empty
+            for results in outcomes:
+                if results is None:
+                    break
+                if results:
+                    return results
+        # Timed out: settle for the best endpoint that did answer
+        for results in outcomes:
+            if results:
+                return results
+    finally:
+        for future in futures:
+            future.cancel()  # Queued endpoints never start; running ones finish in the background
+
+    if answered:
+        return []
+    raise failure or requests.Timeout(f"No search endpoint answered within {SEARCH_TIMEOUT:g}s")
+
+
+def _fetch_and_cache_results(cache_key: str, song_name: str, artist_name: str) -> list:
+    with stage_timer('search'):
+        results = fetch_search_results(song_name, artist_name)
+    # Failed searches raise and are never cached; empty ones are, briefly
+    search_cache.set(cache_key, results, ttl=None if results else SEARCH_NEGATIVE_TTL)
+    return results
+
+
+def cached_search_results(song_name: str, artist_name: str = '') -> list:
+    '''
+    The unranked results of a search, from the search cache when an
+    equivalent query (see normalize_search_query) was answered recently.
+    Concurrent identical searches share one set of upstream requests.
+    '''
+    cache_key = normalize_search_query(song_name, artist_name)
+    with span('cache_lookup', key=cache_key):
+        cached = search_cache.get(cache_key)
+        annotate(hit=cached is not None)
+    if cached is not None:
+        return cached
+    return search_flight.do(cache_key, _fetch_and_cache_results, cache_key, song_name, artist_name)
+
+
+def _local_results(hits: list) -> list:
+    # The index stores what the parse saw; the tab type still comes from the url
+    results = []
+    for rank, hit in enumerate(hits, 1):
+        result = _result_from_url(hit['url'])
+        result.update(
+            song_name=hit['title'] or result['song_name'],
+            artist_name=hit['artist'] or result['artist_name'],
+            key=hit['key'],
+            tuning=hit['tuning'],
+            rank=rank,
+        )
+        if 'score' in hit:
+            result['score'] = hit['score']
+        if 'snippet' in hit:
+            result['snippet'] = hit['snippet']
+        results.append(result)
+    return results
+
+
+def search_tabs(song_name: str, artist_name: str = '', limit: int = SEARCH_DEFAULT_LIMIT, lyrics: bool = False):
+    '''
+    Searches for a song and returns (results, source): at most `limit` tab
+    results, best match first, and where they came from. Each result has
+    `song_name`, `artist_name`, `type`, `rating`, `votes`, `url` and `rank`.
+
+    Tabs this server has parsed before are answered from the local index when
+    they match confidently (SOURCE_LOCAL); everything else goes to UG
+    (SOURCE_UG). With `lyrics`, `song_name` is looked up in the lyrics of
+    indexed tabs instead, which UG cannot search.
+    '''
+    with stage_timer('index_lookup'):
+        hits = tab_index.search_lyrics(song_name, limit) if lyrics else tab_index.search(song_name, artist_name, limit)
+        annotate(hits=len(hits))
+    if hits or lyrics:
+        return _local_results(hits), SOURCE_LOCAL
+
+    results = cached_search_results(song_name, artist_name)
+    return rank_results(results, song_name, artist_name)[:limit], SOURCE_UG
@@ -0,0 +1,81 @@
+import os
+from bs4 import BeautifulSoup, SoupStrainer
+
+
+def _backend_installed(backend: str) -> bool:
+    try:
+        if backend == 'lxml':
+            import lxml  # noqa: F401
+        elif backend == 'html5lib':
+            import html5lib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def available_backends() -> list:
+    '''
+    The BeautifulSoup tree builders usable in this environment, fastest first.
+    '''
+    return [backend for backend in ('lxml', 'html.parser', 'html5lib') if _backend_installed(backend)]
+
+
+# lxml is several times faster than the pure-Python html.parser; use it when it is installed
+HTML_PARSER_BACKEND = os.environ.get('HTML_PARSER_BACKEND') or available_backends()[0]
+
+
+class TagPredicateStrainer(SoupStrainer):
+    '''
+    A SoupStrainer that only materializes top-level matches of
+    `predicate(name, attrs)` and everything nested inside them.
+    '''
+
+    def __init__(self, predicate):
+        # bs4 < 4.13 calls a name function with (name, attrs) while parsing
+        super().__init__(name=predicate)
+        self.predicate = predicate
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        # bs4 >= 4.13 asks this instead, and only passes the name to name functions
+        return bool(self.predicate(name, attrs or {}))
+
+
+def _classes(attrs) -> list:
+    # Depending on the builder, class is still a raw string at this point
+    value = attrs.get('class') or ()
+    return value.split() if isinstance(value, str) else value
+
+
+TAB_CONTENT_TAGS = {'pre', 'main', 'article'}
+TAB_CONTENT_CLASSES = {
+    'js-tab-content', 'tab-content', 'chord-content', 'tab-text', 'js-tab', 'tab-body',
+    'content-body', 'tab', 'chords', 'lyrics', 'content',
+}
+TAB_METADATA_CLASSES = {'t_autor', 't_dt', 't_dtde'}
+
+
+def _is_tab_page_element(name, attrs=None) -> bool:
+    if attrs is None:
+        return False
+    if name in TAB_CONTENT_TAGS:
+        return True
+    if attrs.get('id') == 'tab-content' or attrs.get('data-content') == 'tab' or attrs.get('itemprop') == 'name':
+        return True
+    classes = _classes(attrs)
+    return any(c in TAB_CONTENT_CLASSES or c in TAB_METADATA_CLASSES for c in classes)
+
+
+# The subtrees html_tab_to_json_dict queries: tab content containers and metadata spans
+TAB_PAGE_STRAINER = TagPredicateStrainer(_is_tab_page_element)
+
+# Search result pages: inline scripts holding results JSON, and result links
+SEARCH_PAGE_STRAINER = SoupStrainer(['script', 'a'])
+SEARCH_LINK_STRAINER = SoupStrainer('a', href=True)
+
+
+def make_soup(markup, only: SoupStrainer = None, backend: str = None) -> BeautifulSoup:
+    '''
+    Parses `markup` with the configured backend. When `only` is given, just
+    the subtrees it matches are built instead of the whole document.
+    '''
+    return BeautifulSoup(markup, backend or HTML_PARSER_BACKEND, parse_only=only)
@@ -0,0 +1,68 @@
+import json
+import os
+import queue
+import threading
+from flask import Response
+
+# Idle streams emit a heartbeat this often so proxies (i.e. Railway's) don't time them out
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', 10))
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+SSE_MIMETYPE = 'text/event-stream'
+
+_DONE = object()
+
+
+def _format_ndjson(record: dict) -> str:
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def _format_sse(record: dict) -> str:
+    return f"event: {record.get('event', 'message')}\ndata: {json.dumps(record, ensure_ascii=False)}\n\n"
+
+
+def wants_sse(request) -> bool:
+    '''
+    Whether the client asked for server-sent events rather than NDJSON.
+    '''
+    return request.args.get('format') == 'sse' or SSE_MIMETYPE in request.headers.get('Accept', '')
+
+
+def event_stream_response(run, sse: bool = False) -> Response:
+    '''
+    Returns a streaming response that emits every record `run` produces as
+    soon as it is produced.
+
+    `run` is called on a background thread with an `emit(record)` function
+    and does the actual work; records are written as newline-delimited JSON,
+    or as server-sent events when `sse` is set. If `run` raises, an `error`
+    record is emitted before the stream ends.
+    '''
+    records = queue.Queue()
+    fmt = _format_sse if sse else _format_ndjson
+
+    def worker():
+        try:
+            run(records.put)
+        except Exception as e:
+            records.put({'event': 'error', 'error': str(e)})
+        finally:
+            records.put(_DONE)
+
+    threading.Thread(target=worker, name='event-stream', daemon=True).start()
+
+    def generate():
+        while True:
+            try:
+                record = records.get(timeout=STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield fmt({'event': 'heartbeat'})
+                continue
+            if record is _DONE:
+                return
+            yield fmt(record)
+
+    response = Response(generate(), mimetype=SSE_MIMETYPE if sse else NDJSON_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Ask reverse proxies not to buffer the stream
+    return response
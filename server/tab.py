@@ -26,6 +26,10 @@ from typing import Any
 #          lyrics: "I found a love for me"
 #         },
 #         {
+#          type: "section",
+#          section: "Chorus"
+#         },
+#         {
 #          type: "blank"
 #         }
 #     ]
@@ -60,6 +64,7 @@ class UltimateTab(object):
     JSON_KEY_NOTE        = 'note'
     JSON_KEY_LYRIC       = 'lyric'
     JSON_KEY_BLANK       = 'blank'
+    JSON_KEY_SECTION     = 'section'
     JSON_KEY_TYPE        = 'type'
     JOSN_KEY_LEAD_SPACES = 'pre_spaces'
 
@@ -116,6 +121,15 @@ class UltimateTab(object):
         '''
         self._append_new_line(self.JSON_KEY_LYRIC, self.JSON_KEY_LYRIC, lyric_line)
 
+    def append_section_line(self, section_name: str) -> None:
+        '''
+        Appends a section marker (i.e. Verse 1, Chorus) to the tab.
+
+        Parameters:
+            - section_name: The name of the section as written in the tab, without brackets
+        '''
+        self._append_new_line(self.JSON_KEY_SECTION, self.JSON_KEY_SECTION, section_name)
+
     def append_blank_line(self) -> None:
         '''
         Appends a blank line to the tab.
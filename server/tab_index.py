@@ -0,0 +1,234 @@
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+from .cache import fold_text, normalize_tab_url
+from .metrics import registry, CallbackCounter
+from .upstream import supported_tab_hosts
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'tab_index.sqlite3')
+
+# Trigram similarity (0-1) a title, and the artist when one was searched for,
+# must reach for /search to answer from the index instead of UG
+SEARCH_LOCAL_MIN_SCORE = float(os.environ.get('SEARCH_LOCAL_MIN_SCORE', 0.75))
+
+# Rows fetched from FTS before they are scored; distinct query trigrams used to find them
+INDEX_CANDIDATES = 50
+INDEX_MAX_TRIGRAMS = 32
+
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    '''
+    Dice coefficient of the trigrams of two folded strings, so a typo or two
+    still scores high: similarity("amazng grace", "amazing grace") ~ 0.8.
+    '''
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    left, right = _trigrams(a), _trigrams(b)
+    return 2 * len(left & right) / (len(left) + len(right))
+
+
+def artist_similarity(wanted: str, artist: str) -> float:
+    '''
+    Like similarity(), but an artist named by some of their words
+    ("beethoven" for "ludwig van beethoven") counts as a full match.
+    '''
+    if wanted and set(wanted.split()) <= set(artist.split()):
+        return 1.0
+    return similarity(wanted, artist)
+
+
+def _supported(url: str) -> bool:
+    # Anything else would let an arbitrary page shadow UG's results in /search
+    return urlparse(url).netloc.lower() in supported_tab_hosts()
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+class TabIndex(object):
+    '''
+    A local full-text index of every tab this server has parsed.
+
+    Titles, artists and lyrics go into an SQLite FTS5 table with the trigram
+    tokenizer, which matches any substring of three or more characters.
+    Title searches fetch candidates that share trigrams with the query, then
+    score them by trigram similarity, so typos still find the tab. Writes are
+    queued to a single background thread and never slow down the request
+    that parsed the tab.
+    '''
+
+    def __init__(self, path: str = None, min_score: float = 0.75):
+        self.path = path
+        self.min_score = min_score
+        self._db = None
+        self._lock = threading.Lock()
+        self._writer = None
+
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+                db.execute('PRAGMA journal_mode=WAL')
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS tabs ('
+                    'id INTEGER PRIMARY KEY, url TEXT UNIQUE NOT NULL, title TEXT, artist TEXT, author TEXT, '
+                    'key TEXT, tuning TEXT, indexed_at REAL NOT NULL)'
+                )
+                # Folded title/artist so matching ignores accents; lyrics as parsed, for readable snippets
+                db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS tabs_fts USING fts5(title, artist, lyrics, tokenize='trigram')")
+                self._db = db
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tab-index')
+            except Exception as e:
+                print(f"[Index] Local search index disabled: {e}")
+                self._db = None
+
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def submit(self, url: str, tab_dict: dict) -> None:
+        '''
+        Queues a successful parse (as returned by html_tab_to_json_dict) for
+        indexing. Pages from hosts other than UG's tab host are never indexed.
+        '''
+        if self._db is not None and url and 'tab' in tab_dict and _supported(url):
+            self._writer.submit(self._add_logged, url, tab_dict['tab'])
+
+    def _add_logged(self, url: str, tab: dict) -> None:
+        try:
+            self.add(url, tab)
+        except Exception as e:
+            print(f"[Index] Could not index {url}: {e}")
+
+    def add(self, url: str, tab: dict) -> None:
+        '''
+        Indexes (or re-indexes) the parsed `tab` dict of `url`. Raises
+        ValueError for urls outside UG's tab host.
+        '''
+        if not _supported(url):
+            raise ValueError(f"Not a supported tab host: {url}")
+        url = normalize_tab_url(url)
+        lyrics = '\n'.join(line['lyric'] for line in tab.get('lines', []) if line.get('lyric'))
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.execute(
+                    'INSERT INTO tabs (url, title, artist, author, key, tuning, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(url) DO UPDATE SET title = excluded.title, artist = excluded.artist, '
+                    'author = excluded.author, key = excluded.key, tuning = excluded.tuning, indexed_at = excluded.indexed_at',
+                    (url, tab.get('title'), tab.get('artist_name'), tab.get('author'), tab.get('key'), tab.get('tuning'), time.time())
+                )
+                rowid = self._db.execute('SELECT id FROM tabs WHERE url = ?', (url,)).fetchone()[0]
+                self._db.execute('DELETE FROM tabs_fts WHERE rowid = ?', (rowid,))
+                self._db.execute(
+                    'INSERT INTO tabs_fts (rowid, title, artist, lyrics) VALUES (?, ?, ?, ?)',
+                    (rowid, fold_text(tab.get('title')), fold_text(tab.get('artist_name')), lyrics)
+                )
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
+            self.added += 1
+
+    def _rows(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            cursor = self._db.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def search(self, song_name: str, artist_name: str = '', limit: int = 10) -> list:
+        '''
+        Indexed tabs whose title (and artist, if given) confidently match the
+        query, best first, each with its `score`. [] means a local miss.
+        '''
+        if self._db is None:
+            return []
+        song = fold_text(song_name)
+        artist = fold_text(artist_name)
+        trigrams = sorted(gram for gram in _trigrams(song) if ' ' not in gram)
+        if not trigrams:
+            return []
+
+        match = 'title : (' + ' OR '.join(_fts_phrase(gram) for gram in trigrams[:INDEX_MAX_TRIGRAMS]) + ')'
+        try:
+            candidates = self._rows(
+                'SELECT tabs.url, tabs.title, tabs.artist, tabs.author, tabs.key, tabs.tuning, '
+                'tabs_fts.title AS folded_title, tabs_fts.artist AS folded_artist '
+                'FROM tabs_fts JOIN tabs ON tabs.id = tabs_fts.rowid '
+                'WHERE tabs_fts MATCH ? ORDER BY bm25(tabs_fts) LIMIT ?',
+                (match, INDEX_CANDIDATES)
+            )
+        except sqlite3.Error as e:
+            print(f"[Index] Search failed: {e}")
+            return []
+
+        hits = []
+        for row in candidates:
+            folded_title, folded_artist = row.pop('folded_title'), row.pop('folded_artist')
+            title_score = similarity(song, folded_title)
+            artist_score = artist_similarity(artist, folded_artist) if artist else 1.0
+            if title_score >= self.min_score and artist_score >= self.min_score:
+                row['score'] = round((title_score + artist_score) / 2 if artist else title_score, 4)
+                hits.append(row)
+        hits.sort(key=lambda row: -row['score'])
+
+        with self._lock:
+            if hits:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return hits[:limit]
+
+    def search_lyrics(self, text: str, limit: int = 10) -> list:
+        '''
+        Indexed tabs whose lyrics contain `text` (three characters or more),
+        best first, each with a `snippet` of the lyrics around the match.
+        '''
+        text = ' '.join(text.split())
+        if self._db is None or len(text) < 3:
+            return []
+        try:
+            return self._rows(
+                'SELECT tabs.url, tabs.title, tabs.artist, tabs.author, tabs.key, tabs.tuning, '
+                "snippet(tabs_fts, 2, '', '', '...', 64) AS snippet "
+                'FROM tabs_fts JOIN tabs ON tabs.id = tabs_fts.rowid '
+                'WHERE tabs_fts MATCH ? ORDER BY bm25(tabs_fts) LIMIT ?',
+                ('lyrics : ' + _fts_phrase(text), limit)
+            )
+        except sqlite3.Error as e:
+            print(f"[Index] Lyric search failed: {e}")
+            return []
+
+    def stats(self) -> dict:
+        if self._db is None:
+            return {'enabled': False}
+        with self._lock:
+            entries = self._db.execute('SELECT COUNT(*) FROM tabs').fetchone()[0]
+            return {'enabled': True, 'entries': entries, 'added': self.added, 'hits': self.hits, 'misses': self.misses}
+
+
+tab_index = TabIndex(
+    path=os.environ.get('TAB_INDEX_PATH', DEFAULT_INDEX_PATH) or None,
+    min_score=SEARCH_LOCAL_MIN_SCORE,
+)
+
+registry.register(CallbackCounter(
+    'tab_index_lookups_total',
+    'Searches answered from the local tab index (hit) or sent to UG (miss)',
+    ['result'],
+    lambda: {('hit',): tab_index.hits, ('miss',): tab_index.misses},
+))
@@ -1,25 +1,144 @@
+import os
 import sys
 import json
-import requests
+import functools
 from .parser import html_tab_to_json_dict, get_rendered_html, get_html_requests
+from .cache import tab_cache, normalize_tab_url
+from .tab_index import tab_index
+from .tab_store import tab_store, content_digest
+from .singleflight import SingleFlight
+from .revalidate import Revalidator
+from .progress import ProgressHub
+from .hedge import fetch_hedge
+from .fetchers import fetcher_stats, needs_render, STATIC, RENDER
+from .metrics import registry, stage_timer, render_retries, CallbackCounter
+from .tracing import span, annotate, traced
 
-def dict_from_ultimate_tab(url: str) -> json:
+# Concurrent requests for the same tab share one fetch+parse instead of each hitting UG
+tab_flight = SingleFlight()
+
+# Progress events of in-flight fetches, keyed like the single-flight so coalesced requests
+# see them too, and requests limited to another fetch path don't see events that aren't theirs
+tab_progress = ProgressHub()
+
+# Expired tabs served stale are refreshed by these background workers, one fetch per cache key at a time
+TAB_REVALIDATE_WORKERS = int(os.environ.get('TAB_REVALIDATE_WORKERS', 2))
+tab_revalidator = Revalidator(workers=TAB_REVALIDATE_WORKERS)
+
+def _cached(cache_key: str, on_stale, refresh):
+    '''
+    The cached value for `cache_key`, or None on a miss. With an `on_stale`
+    callback, an expired entry still within the tab cache's max-stale bound
+    is returned as well: `refresh` is queued to fetch a fresh copy in the
+    background and `on_stale` is called with the entry's age in seconds.
+    '''
+    with span('cache_lookup'):
+        if on_stale is None:
+            cached = tab_cache.get(cache_key)
+            annotate(hit=cached is not None)
+            return cached
+        entry = tab_cache.get_stale(cache_key)
+        annotate(hit=entry is not None, stale=entry is not None and entry[2])
+    if entry is None:
+        return None
+    value, age, stale = entry
+    if stale:
+        tab_revalidator.submit(cache_key, _checked_refresh, refresh)
+        on_stale(age)
+    return value
+
+def _checked_refresh(refresh) -> None:
+    # Failed fetches come back as an error dict or error block rather than
+    # raising; raise instead, so the revalidator counts and logs the failure
+    result = refresh()
+    error = next((block['error'] for block in (result if isinstance(result, list) else [result]) if 'error' in block), None)
+    if error is not None:
+        raise RuntimeError(error)
+
+def dict_from_ultimate_tab(url: str, fresh: bool = False, on_stale=None) -> json:
     '''
     Given a Ultimate Guitar tab url, will return a dictionary representing the
     song along with the song info. Uses requests first, then Selenium as fallback.
+    Successful results are served from the tab cache until they expire;
+    `fresh` skips the cache lookup and always fetches. With `on_stale`,
+    expired results are served while they are refreshed (see _cached).
     '''
-    # Try requests first (faster for static pages)
+    cache_key = 'dict:' + normalize_tab_url(url)
+    if fresh:
+        return _fetch_and_cache_dict(cache_key, url)
+
+    fetch = functools.partial(tab_flight.do, cache_key, _fetch_and_cache_dict, cache_key, url)
+    cached = _cached(cache_key, on_stale, fetch)
+    if cached is not None:
+        return cached
+
+    return fetch()
+
+
+@traced('fetch')
+def _fetch_and_cache_dict(cache_key: str, url: str) -> json:
+    tab_dict = _fetch_dict_from_ultimate_tab(url)
+    if 'error' not in tab_dict:
+        tab_cache.set(cache_key, tab_dict)
+    return tab_dict
+
+
+def _fetch_dict_from_ultimate_tab(url: str) -> json:
+    # Try requests first (faster for static pages), racing Selenium against it when it is slow
+    failures = []
+    if fetcher_stats.choose(url) == RENDER:
+        # Pages of this kind are known to need JavaScript; requests is only the fallback
+        tab_dict = _dict_from_render(url, failures, None)
+        if tab_dict is None:
+            tab_dict = _dict_from_static(url, failures)
+    else:
+        tab_dict = fetch_hedge.run(
+            lambda cancel: _dict_from_static(url, failures),
+            lambda cancel: _dict_from_render(url, failures, cancel),
+        )
+    if tab_dict is not None:
+        return tab_dict
+    # Prefer a parse error over the generic fetch error, it says more about the page
+    return next((f for f in failures if isinstance(f, dict)), None) or \
+        {'error': next((f for f in failures if isinstance(f, str)), 'Failed to fetch tab content from both requests and Selenium methods')}
+
+
+@traced('static')
+def _dict_from_static(url: str, failures: list) -> json:
     html = get_html_requests(url)
+    render_needed, reason = needs_render(html)
+    annotate(needs_render=render_needed, reason=reason)
+    if render_needed:
+        fetcher_stats.record(url, STATIC, False, reason)
+        return None
+    tab_dict, _ = _parsed_page(url, html)
+    if 'error' in tab_dict:
+        fetcher_stats.record(url, STATIC, False, 'parse_failed')
+        failures.append(tab_dict)
+        return None
+    fetcher_stats.record(url, STATIC, True, reason)
+    return tab_dict
+
+
+@traced('render')
+def _dict_from_render(url: str, failures: list, cancel) -> json:
+    try:
+        html = get_rendered_html(url, cancel)
+    except Exception as e:
+        failures.append(f'Selenium failed: {str(e)}')
+        fetcher_stats.record(url, RENDER, False, 'exception')
+        return None
+    if cancel is not None and cancel.is_set():
+        return None
     if not html or len(html.strip()) < 100:
-        # Fallback to Selenium
-        try:
-            html = get_rendered_html(url)
-            if not html or len(html.strip()) < 100:
-                return {'error': 'Failed to fetch tab content from both requests and Selenium methods'}
-        except Exception as e:
-            return {'error': f'Selenium failed: {str(e)}'}
-    
-    tab_dict = html_tab_to_json_dict(html)
+        fetcher_stats.record(url, RENDER, False, 'empty')
+        return None
+    tab_dict, _ = _parsed_page(url, html)
+    if 'error' in tab_dict:
+        fetcher_stats.record(url, RENDER, False, 'parse_failed')
+        failures.append(tab_dict)
+        return None
+    fetcher_stats.record(url, RENDER, True)
     return tab_dict
 
 
@@ -33,162 +152,265 @@ def json_from_ultimate_tab(url: str) -> json:
     return data
 
 
-def grouped_blocks_from_ultimate_tab(url: str, max_retries: int = 5) -> list:
+def grouped_blocks_from_ultimate_tab(url: str, max_retries: int = 5, progress=None, use_static: bool = True,
+                                     use_render: bool = True, fresh: bool = False, on_stale=None) -> list:
     '''
     Tries to fetch and parse the tab using requests first (faster for static pages).
     Only tries Selenium if requests fails to get a valid tab. Returns a list of blocks (lyrics/tabs) or a single error block if all fail.
+    Successful results are served from the tab cache until they expire.
+
+    If given, `progress` is called with an event dict at each pipeline step
+    (fetch_started, static_fetch_failed, render_attempt, parsed, ...).
+    `use_static` / `use_render` restrict the fetch to one of the two paths.
+    `fresh` skips the cache lookup and always fetches. With `on_stale`,
+    expired results are served while they are refreshed (see _cached).
     '''
-    errors = []
+    cache_key = 'blocks:' + normalize_tab_url(url)
+    if fresh:
+        flight_key = object()  # Nobody joins a fresh fetch, so nobody else sees its progress
+        fetch = _fetch_and_cache_grouped_blocks
+    else:
+        flight_key = (cache_key, use_static, use_render)
+        fetch = functools.partial(tab_flight.do, flight_key, _fetch_and_cache_grouped_blocks)
+        # Refreshes always run the whole pipeline, whichever path this caller was limited to
+        full_key = (cache_key, True, True)
+        refresh = functools.partial(tab_flight.do, full_key, _fetch_and_cache_grouped_blocks,
+                                    full_key, cache_key, url, max_retries, True, True)
+        cached = _cached(cache_key, on_stale, refresh)
+        if cached is not None:
+            if progress is not None:
+                progress({'event': 'cache_hit', 'url': url})
+            return cached
 
-    # Try requests first
-    html = get_html_requests(url)
-    if html and len(html.strip()) >= 100:
-        # Check if the HTML contains any tab-related content
-        tab_indicators = ['<pre', '.js-tab-content', '.tab-content', 'chord', 'tab', 'lyric']
-        has_tab_content = any(indicator in html for indicator in tab_indicators)
-        
-        if has_tab_content:
-            tab_dict = html_tab_to_json_dict(html)
-            lines = tab_dict.get('tab', {}).get('lines', [])
-            if lines:
-                # Create a combined structure that preserves alignment
-                combined_lines = []
-                i = 0
-                while i < len(lines):
-                    line = lines[i]
-                    
-                    # Check if this is a chord line followed by a lyric line
-                    if 'chords' in line and i + 1 < len(lines) and 'lyric' in lines[i + 1]:
-                        # We have a chord line followed by a lyric line
-                        chord_line = line
-                        lyric_line = lines[i + 1]
-                        
-                        # Build the chord text with proper spacing
-                        chord_text = ''
-                        for chord in chord_line['chords']:
-                            chord_text += ' ' * chord.get('pre_spaces', 0) + chord.get('note', '')
-                        
-                        # Create combined line
-                        combined_lines.append({
-                            'chords': chord_text,
-                            'lyric': lyric_line['lyric']
-                        })
-                        
-                        i += 2  # Skip both lines
-                    elif 'lyric' in line:
-                        # Line has only lyrics
-                        combined_lines.append({
-                            'lyric': line['lyric'],
-                            'chords': ''
-                        })
-                        i += 1
-                    elif 'chords' in line:
-                        # Line has only chords - preserve original spacing
-                        chord_text = ''
-                        for chord in line['chords']:
-                            chord_text += ' ' * chord.get('pre_spaces', 0) + chord.get('note', '')
-                        combined_lines.append({
-                            'lyric': '',
-                            'chords': chord_text
-                        })
-                        i += 1
-                    else:
-                        # Empty line - preserve it for paragraph spacing
-                        combined_lines.append({
-                            'lyric': '',
-                            'chords': ''
-                        })
-                        i += 1
-                
-                # Remove trailing empty lines but keep internal blank lines for spacing
-                while combined_lines and not combined_lines[-1]['lyric'].strip() and not combined_lines[-1]['chords'].strip():
-                    combined_lines.pop()
-                
-                return [{'combined': combined_lines}]
-            else:
-                errors.append("requests returned no tab lines")
+    args = (flight_key, cache_key, url, max_retries, use_static, use_render)
+    if progress is None:
+        return fetch(*args)
+
+    tab_progress.subscribe(flight_key, progress)
+    try:
+        return fetch(*args)
+    finally:
+        tab_progress.unsubscribe(flight_key, progress)
+
+
+@traced('fetch')
+def _fetch_and_cache_grouped_blocks(flight_key, cache_key: str, url: str, max_retries: int, use_static: bool,
+                                    use_render: bool) -> list:
+    def report(event: str, **fields) -> None:
+        tab_progress.publish(flight_key, dict(event=event, url=url, **fields))
+
+    blocks = _fetch_grouped_blocks_from_ultimate_tab(url, max_retries, report, use_static, use_render)
+    if not any('error' in block for block in blocks):
+        tab_cache.set(cache_key, blocks)
+    return blocks
+
+
+def _chord_text(chords: list) -> str:
+    # Build the chord text with proper spacing
+    chord_text = ''
+    for chord in chords:
+        chord_text += ' ' * chord.get('pre_spaces', 0) + chord.get('note', '')
+    return chord_text
+
+
+def _combined_lines(lines: list) -> list:
+    '''
+    Merges the parsed tab lines into a combined structure that preserves
+    alignment, pairing each chord line with the lyric line below it.
+    '''
+    combined_lines = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+
+        # Check if this is a chord line followed by a lyric line
+        if 'chords' in line and i + 1 < len(lines) and 'lyric' in lines[i + 1]:
+            combined_lines.append({
+                'chords': _chord_text(line['chords']),
+                'lyric': lines[i + 1]['lyric']
+            })
+            i += 2  # Skip both lines
+        elif 'lyric' in line:
+            # Line has only lyrics
+            combined_lines.append({
+                'lyric': line['lyric'],
+                'chords': ''
+            })
+            i += 1
+        elif 'chords' in line:
+            # Line has only chords - preserve original spacing
+            combined_lines.append({
+                'lyric': '',
+                'chords': _chord_text(line['chords'])
+            })
+            i += 1
+        elif 'section' in line:
+            # Section marker (i.e. Chorus) - kept as a structured line
+            combined_lines.append({
+                'lyric': '',
+                'chords': '',
+                'section': line['section']
+            })
+            i += 1
         else:
-            errors.append("requests returned HTML without tab content (likely dynamic content)")
+            # Empty line - preserve it for paragraph spacing
+            combined_lines.append({
+                'lyric': '',
+                'chords': ''
+            })
+            i += 1
+
+    # Remove trailing empty lines but keep internal blank lines for spacing
+    while combined_lines and not combined_lines[-1]['lyric'].strip() and not combined_lines[-1]['chords'].strip():
+        combined_lines.pop()
+
+    return combined_lines
+
+
+def _timed_combined_lines(lines: list) -> list:
+    with stage_timer('blocks'):
+        return _combined_lines(lines)
+
+
+def _parsed_page(url: str, html: str) -> tuple:
+    '''
+    Returns (tab_dict, combined lines) for a fetched page; combined is None
+    when the page has no tab lines. When the tab store already holds this
+    tab with the same tab region, its stored parse is reused and only its
+    freshness is updated. Otherwise the page is parsed, stored and indexed.
+    '''
+    digest = content_digest(html) if tab_store.enabled() else None
+    stored = tab_store.reuse(url, digest) if digest else None
+    annotate(stored_parse=stored is not None)
+    if stored is not None:
+        return stored['tab_dict'], stored['combined']
+
+    tab_dict = html_tab_to_json_dict(html, url)
+    lines = tab_dict.get('tab', {}).get('lines', [])
+    if 'error' in tab_dict or not lines:
+        return tab_dict, None
+    combined = _timed_combined_lines(lines)
+    tab_store.put(url, digest, tab_dict, combined)
+    tab_index.submit(url, tab_dict)
+    return tab_dict, combined
+
+
+def _no_progress(event: str, **fields) -> None:
+    pass
+
+
+@traced('static')
+def _blocks_from_static(url: str, errors: list, report) -> list:
+    '''
+    Fetches the page with requests and parses it. Returns the blocks, or None
+    after recording why in `errors` if the page needs a render.
+    '''
+    report('fetch_started')
+    html = get_html_requests(url)
+    # Cheap check of the raw markup, so pages that need a render aren't parsed first
+    render_needed, reason = needs_render(html)
+    annotate(needs_render=render_needed, reason=reason)
+    if not render_needed:
+        _, combined = _parsed_page(url, html)
+        if combined is not None:
+            fetcher_stats.record(url, STATIC, True, reason)
+            report('parsed', source='static')
+            return [{'combined': combined}]
+        reason = 'parse_failed'
+        errors.append("requests returned no tab lines")
+    elif not html:
+        errors.append("requests returned empty HTML")
+    elif len(html.strip()) < 100:
+        errors.append("requests returned too short HTML")
     else:
-        if not html:
-            errors.append("requests returned empty HTML")
-        elif len(html.strip()) < 100:
-            errors.append("requests returned too short HTML")
-        else:
-            errors.append("requests returned HTML without tab content (likely dynamic content)")
+        errors.append(f"requests returned HTML without tab content (likely dynamic content: {reason})")
+    fetcher_stats.record(url, STATIC, False, reason)
+    report('static_fetch_failed', reason=errors[-1])
+    return None
+
+
+@traced('render')
+def _blocks_from_render(url: str, max_retries: int, errors: list, report, cancel=None) -> list:
+    '''
+    Renders the page with Selenium, retrying up to `max_retries` times.
+    Returns the blocks, or None after recording every failure in `errors`.
+    Stops between attempts once the optional `cancel` event is set.
+    '''
+    blocks = _render_attempts(url, max_retries, errors, report, cancel)
+    if blocks is not None:
+        fetcher_stats.record(url, RENDER, True)
+    elif cancel is None or not cancel.is_set():
+        fetcher_stats.record(url, RENDER, False)
+    return blocks
+
 
-    # Only try Selenium if requests failed
+def _render_attempts(url: str, max_retries: int, errors: list, report, cancel) -> list:
     for attempt in range(max_retries):
-        try:
-            html = get_rendered_html(url)
-            if not html or len(html.strip()) < 100:
-                errors.append(f"Selenium returned empty/invalid HTML (attempt {attempt+1})")
+        if cancel is not None and cancel.is_set():
+            return None
+        if attempt:
+            render_retries.inc()
+        report('render_attempt', attempt=attempt + 1)
+        with span('render_attempt', attempt=attempt + 1):
+            try:
+                html = get_rendered_html(url, cancel)
+                if not html or len(html.strip()) < 100:
+                    errors.append(f"Selenium returned empty/invalid HTML (attempt {attempt+1})")
+                    continue
+                _, combined = _parsed_page(url, html)
+                if combined is not None:
+                    report('parsed', source='render', attempt=attempt + 1)
+                    return [{'combined': combined}]
+                else:
+                    errors.append(f"Selenium returned no tab lines (attempt {attempt+1})")
+            except Exception as e:
+                errors.append(f"Selenium failed (attempt {attempt+1}): {str(e)}")
                 continue
-            tab_dict = html_tab_to_json_dict(html)
-            lines = tab_dict.get('tab', {}).get('lines', [])
-            if lines:
-                # Create a combined structure that preserves alignment
-                combined_lines = []
-                i = 0
-                while i < len(lines):
-                    line = lines[i]
-                    
-                    # Check if this is a chord line followed by a lyric line
-                    if 'chords' in line and i + 1 < len(lines) and 'lyric' in lines[i + 1]:
-                        # We have a chord line followed by a lyric line
-                        chord_line = line
-                        lyric_line = lines[i + 1]
-                        
-                        # Build the chord text with proper spacing
-                        chord_text = ''
-                        for chord in chord_line['chords']:
-                            chord_text += ' ' * chord.get('pre_spaces', 0) + chord.get('note', '')
-                        
-                        # Create combined line
-                        combined_lines.append({
-                            'chords': chord_text,
-                            'lyric': lyric_line['lyric']
-                        })
-                        
-                        i += 2  # Skip both lines
-                    elif 'lyric' in line:
-                        # Line has only lyrics
-                        combined_lines.append({
-                            'lyric': line['lyric'],
-                            'chords': ''
-                        })
-                        i += 1
-                    elif 'chords' in line:
-                        # Line has only chords - preserve original spacing
-                        chord_text = ''
-                        for chord in line['chords']:
-                            chord_text += ' ' * chord.get('pre_spaces', 0) + chord.get('note', '')
-                        combined_lines.append({
-                            'lyric': '',
-                            'chords': chord_text
-                        })
-                        i += 1
-                    else:
-                        # Empty line
-                        combined_lines.append({
-                            'lyric': '',
-                            'chords': ''
-                        })
-                        i += 1
-                
-                # Remove trailing empty lines
-                while combined_lines and not combined_lines[-1]['lyric'].strip() and not combined_lines[-1]['chords'].strip():
-                    combined_lines.pop()
-                
-                return [{'combined': combined_lines}]
-            else:
-                errors.append(f"Selenium returned no tab lines (attempt {attempt+1})")
-        except Exception as e:
-            errors.append(f"Selenium failed (attempt {attempt+1}): {str(e)}")
-            continue
+    return None
+
+
+def _fetch_grouped_blocks_from_ultimate_tab(url: str, max_retries: int, report=_no_progress,
+                                            use_static: bool = True, use_render: bool = True) -> list:
+    errors = []
+
+    if use_static and use_render and fetcher_stats.choose(url) == RENDER:
+        # Pages of this kind are known to need JavaScript; requests is only the fallback
+        report('fetcher_selected', fetcher=RENDER)
+        blocks = _blocks_from_render(url, max_retries, errors, report)
+        if blocks is None:
+            blocks = _blocks_from_static(url, errors, report)
+        if blocks is not None:
+            return blocks
+    elif use_static and use_render:
+        # Try requests first; Selenium starts when it fails, or races it when it is slow
+        blocks = fetch_hedge.run(
+            lambda cancel: _blocks_from_static(url, errors, report),
+            lambda cancel: _blocks_from_render(url, max_retries, errors, report, cancel),
+            on_hedge=lambda after: report('hedge_started', after=round(after, 2)),
+        )
+        if blocks is not None:
+            return blocks
+    elif use_static:
+        blocks = _blocks_from_static(url, errors, report)
+        if blocks is not None:
+            return blocks
+        return [{'error': f"Failed to fetch and parse tab with requests. Errors: {'; '.join(errors)}"}]
+    else:
+        blocks = _blocks_from_render(url, max_retries, errors, report)
+        if blocks is not None:
+            return blocks
 
     # If all attempts failed, return detailed error
-    return [{'error': f"Failed to fetch and parse tab after requests and {max_retries} Selenium attempts. Errors: {'; '.join(errors)}"}]
+    attempted = f"requests and {max_retries}" if use_static else f"{max_retries}"
+    return [{'error': f"Failed to fetch and parse tab after {attempted} Selenium attempts. Errors: {'; '.join(errors)}"}]
+
+
+registry.register(CallbackCounter(
+    'tab_cache_revalidations_total',
+    'Background refreshes of stale tabs: started, skipped as already pending (coalesced), and failed',
+    ['result'],
+    lambda: {(result,): tab_revalidator.stats()[result] for result in ('started', 'coalesced', 'failed')},
+))
 
 
 if __name__ == '__main__':
@@ -207,3 +429,4 @@ if __name__ == '__main__':
     # For demo: print grouped blocks
     blocks = grouped_blocks_from_ultimate_tab(url)
     print(json.dumps(blocks, indent=2, ensure_ascii=False))
+
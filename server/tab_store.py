@@ -0,0 +1,294 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+from .cache import normalize_tab_url
+from .js_store import find_js_store, page_data
+from .locator import ElementIndex, COMPILED_SELECTORS
+from .metrics import registry, CallbackCounter
+from .soup import make_soup, TAB_PAGE_STRAINER
+from .upstream import supported_tab_hosts
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(PACKAGE_DIR), '.cache', 'tab_store.sqlite3')
+
+# Seconds between background compactions of the store file
+TAB_STORE_COMPACT_SECONDS = float(os.environ.get('TAB_STORE_COMPACT_SECONDS', 3600))
+
+# Largest number of tabs read by one bulk read
+STORE_READ_MAX_IDS = 200
+
+# Version of what the parser turns a page into. Bump it whenever a parser
+# change alters the output for the same page, so parses stored by older code
+# are never reused; edits that keep the output the same leave the store valid.
+PARSER_VERSION = 1
+
+# The numeric id UG ends every tab url with: .../amazing-grace-chords-1234567
+TAB_ID_PATTERN = re.compile(r'-(\d+)/?$')
+
+# Parts of a page without a js-store that change between fetches of the same tab
+VOLATILE_MARKUP = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+
+
+def _supported(url: str) -> bool:
+    # Tabs are keyed by UG's numeric id alone, so a page from any other host
+    # with the same trailing id would overwrite the real tab's record
+    return urlparse(url).netloc.lower() in supported_tab_hosts()
+
+
+def tab_id_for_url(url: str) -> str:
+    '''
+    UG's numeric id of the tab at `url`, or its normalized url when it has none.
+    '''
+    normalized = normalize_tab_url(url)
+    match = TAB_ID_PATTERN.search(normalized)
+    return match.group(1) if match else normalized
+
+
+def _rendered_region(html_body: str) -> str:
+    # The markup of the element the parser reads the tab from, found the same
+    # way the locator does; the whole page minus volatile markup if none matches
+    index = ElementIndex(make_soup(html_body, only=TAB_PAGE_STRAINER))
+    for _, compiled in COMPILED_SELECTORS:
+        element = index.lookup(compiled)
+        if element is not None:
+            return str(element)
+    element = index.best_scored()
+    return str(element) if element is not None else VOLATILE_MARKUP.sub('', html_body)
+
+
+def tab_region(html_body: str) -> str:
+    '''
+    The part of a fetched page that its parse depends on.
+
+    For js-store pages that is the tab's content and metadata, without the
+    rating, view counts and ads that change on every fetch. Official/pro
+    pages ship an empty js-store content and are parsed from the rendered
+    DOM, so their tab container's markup stands in for the content. Other
+    pages keep their markup minus scripts, styles and comments.
+    '''
+    store = find_js_store(html_body)
+    if store is not None:
+        data = page_data(store)
+        tab = data.get('tab') or {}
+        tab_view = data.get('tab_view') or {}
+        content = (tab_view.get('wiki_tab') or {}).get('content')
+        region = {
+            'tab': {key: tab.get(key) for key in ('song_name', 'artist_name', 'username', 'tonality_name')},
+            'meta': tab_view.get('meta'),
+            'difficulty': tab_view.get('ug_difficulty'),
+            'content': content,
+        }
+        if not content:
+            region['rendered'] = _rendered_region(html_body)
+        return json.dumps(region, sort_keys=True, ensure_ascii=False)
+    return VOLATILE_MARKUP.sub('', html_body)
+
+
+def content_digest(html_body: str) -> str:
+    '''
+    Hash of the page's tab region and of the parser version that would parse it.
+    '''
+    digest = hashlib.sha256(f"parser:{PARSER_VERSION}\n".encode())
+    digest.update(tab_region(html_body).encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+class TabStore(object):
+    '''
+    A durable SQLite store of parsed tabs, deduplicated by content hash.
+
+    `contents` holds each distinct parse (the tab dict and its combined
+    blocks, zlib-compressed JSON) once, keyed by the hash of the tab region
+    it was parsed from. `tabs` maps every tab id to its url, current content
+    hash, title and artist, and when it was first stored and last confirmed
+    fresh. A re-fetch whose tab region hashes the same reuses the stored
+    parse and only moves `refreshed_at`. A background thread periodically
+    drops contents no tab points at any more and returns their pages to the
+    filesystem.
+    '''
+
+    def __init__(self, path: str = None, compact_every: float = 3600):
+        self.path = path
+        self.compact_every = compact_every
+        self._db = None
+        self._lock = threading.Lock()
+
+        self.reused = 0
+        self.stored = 0
+        self.compactions = 0
+        self.compacted_contents = 0
+
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+                db.execute('PRAGMA auto_vacuum=INCREMENTAL')  # Only takes effect on a new file
+                db.execute('PRAGMA journal_mode=WAL')
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS contents ('
+                    'hash TEXT PRIMARY KEY, data BLOB NOT NULL, created_at REAL NOT NULL)'
+                )
+                db.execute(
+                    'CREATE TABLE IF NOT EXISTS tabs ('
+                    'id TEXT PRIMARY KEY, url TEXT NOT NULL, content_hash TEXT NOT NULL, title TEXT, artist TEXT, '
+                    'stored_at REAL NOT NULL, refreshed_at REAL NOT NULL)'
+                )
+                db.execute('CREATE INDEX IF NOT EXISTS tabs_content_hash ON tabs (content_hash)')
+                self._db = db
+            except Exception as e:
+                print(f"[Store] Tab store disabled: {e}")
+                self._db = None
+                return
+
+            if compact_every > 0:
+                threading.Thread(target=self._compact_periodically, name='tab-store-compact', daemon=True).start()
+
+    def enabled(self) -> bool:
+        return self._db is not None
+
+    def reuse(self, url: str, digest: str):
+        '''
+        If the tab at `url` is stored with content hash `digest`, marks it
+        fresh and returns {'tab_dict', 'combined'}; otherwise returns None.
+        '''
+        if self._db is None or not _supported(url):
+            return None
+        tab_id = tab_id_for_url(url)
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    'SELECT contents.data FROM tabs JOIN contents ON contents.hash = tabs.content_hash '
+                    'WHERE tabs.id = ? AND tabs.content_hash = ?', (tab_id, digest)
+                ).fetchone()
+                if row is None:
+                    return None
+                self._db.execute('UPDATE tabs SET refreshed_at = ? WHERE id = ?', (time.time(), tab_id))
+                self.reused += 1
+            except Exception as e:
+                print(f"[Store] Read failed: {e}")
+                return None
+        return json.loads(zlib.decompress(row[0]))
+
+    def put(self, url: str, digest: str, tab_dict: dict, combined: list) -> None:
+        '''
+        Stores the parse of the tab at `url` under content hash `digest`.
+        Urls outside UG's tab host are not stored.
+        '''
+        if self._db is None or not _supported(url):
+            return
+        tab_id = tab_id_for_url(url)
+        tab = tab_dict.get('tab', {})
+        data = zlib.compress(json.dumps({'tab_dict': tab_dict, 'combined': combined}, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute('BEGIN')
+                self._db.execute('INSERT OR IGNORE INTO contents (hash, data, created_at) VALUES (?, ?, ?)', (digest, data, now))
+                self._db.execute(
+                    'INSERT INTO tabs (id, url, content_hash, title, artist, stored_at, refreshed_at) VALUES (?, ?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT(id) DO UPDATE SET url = excluded.url, content_hash = excluded.content_hash, '
+                    'title = excluded.title, artist = excluded.artist, refreshed_at = excluded.refreshed_at',
+                    (tab_id, normalize_tab_url(url), digest, tab.get('title'), tab.get('artist_name'), now, now)
+                )
+                self._db.execute('COMMIT')
+                self.stored += 1
+            except Exception as e:
+                if self._db.in_transaction:
+                    self._db.execute('ROLLBACK')
+                print(f"[Store] Write failed: {e}")
+
+    def get_many(self, tab_ids: list) -> dict:
+        '''
+        Reads several stored tabs at once, i.e. a setlist. Returns a dict from
+        each id that is stored to its url, timestamps, tab dict and combined blocks.
+        '''
+        if self._db is None or not tab_ids:
+            return {}
+        ids = list(dict.fromkeys(str(tab_id) for tab_id in tab_ids))
+        placeholders = ', '.join('?' * len(ids))
+        with self._lock:
+            try:
+                rows = self._db.execute(
+                    'SELECT tabs.id, tabs.url, tabs.content_hash, tabs.stored_at, tabs.refreshed_at, contents.data '
+                    f'FROM tabs JOIN contents ON contents.hash = tabs.content_hash WHERE tabs.id IN ({placeholders})', ids
+                ).fetchall()
+            except Exception as e:
+                print(f"[Store] Read failed: {e}")
+                return {}
+
+        stored = {}
+        for tab_id, url, content_hash, stored_at, refreshed_at, data in rows:
+            record = json.loads(zlib.decompress(data))
+            stored[tab_id] = {
+                'id': tab_id,
+                'url': url,
+                'content_hash': content_hash,
+                'stored_at': stored_at,
+                'refreshed_at': refreshed_at,
+                'tab': record['tab_dict'].get('tab'),
+                'blocks': [{'combined': record['combined']}],
+            }
+        return stored
+
+    def compact(self) -> int:
+        '''
+        Drops contents no tab refers to any more (superseded parses) and
+        returns the freed pages to the filesystem. Returns how many were dropped.
+        '''
+        if self._db is None:
+            return 0
+        with self._lock:
+            removed = self._db.execute(
+                'DELETE FROM contents WHERE hash NOT IN (SELECT content_hash FROM tabs)'
+            ).rowcount
+            self._db.execute('PRAGMA incremental_vacuum')
+            self.compactions += 1
+            self.compacted_contents += removed
+            # On the shared connection, so it must not interleave with another thread's transaction
+            self._db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return removed
+
+    def _compact_periodically(self) -> None:
+        while True:
+            time.sleep(self.compact_every)
+            try:
+                removed = self.compact()
+                if removed:
+                    print(f"[Store] Compacted tab store: dropped {removed} superseded parses")
+            except Exception as e:
+                print(f"[Store] Compaction failed: {e}")
+
+    def stats(self) -> dict:
+        if self._db is None:
+            return {'enabled': False}
+        with self._lock:
+            tabs = self._db.execute('SELECT COUNT(*) FROM tabs').fetchone()[0]
+            contents = self._db.execute('SELECT COUNT(*) FROM contents').fetchone()[0]
+            return {
+                'enabled': True,
+                'tabs': tabs,
+                'contents': contents,
+                'reused': self.reused,
+                'stored': self.stored,
+                'compactions': self.compactions,
+                'compacted_contents': self.compacted_contents,
+            }
+
+
+tab_store = TabStore(
+    path=os.environ.get('TAB_STORE_PATH', DEFAULT_STORE_PATH) or None,
+    compact_every=TAB_STORE_COMPACT_SECONDS,
+)
+
+registry.register(CallbackCounter(
+    'tab_store_parses_total',
+    'Fetched tabs whose stored parse was reused (unchanged content) or that were parsed and stored',
+    ['result'],
+    lambda: {('reused',): tab_store.reused, ('stored',): tab_store.stored},
+))
@@ -0,0 +1,167 @@
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import time
+from contextlib import contextmanager
+
+# Entries of the profile summary attached to a traced response
+TRACE_PROFILE_LINES = 25
+
+# The innermost open span of the request being traced; None when not tracing
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+class Span(object):
+    '''
+    One timed step of a traced request, with the steps it ran nested inside.
+    '''
+
+    def __init__(self, name: str, trace, **fields):
+        self.name = name
+        self.trace = trace
+        self.fields = fields
+        self.children = []
+        self.start = time.perf_counter()
+        self.end = None
+
+    def set(self, **fields) -> None:
+        self.fields.update(fields)
+
+    def as_dict(self, origin: float) -> dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        span = {
+            'name': self.name,
+            'start_ms': round((self.start - origin) * 1000, 3),
+            'duration_ms': round((end - self.start) * 1000, 3),
+        }
+        if self.end is None:
+            span['unfinished'] = True  # i.e. the losing side of a hedged fetch
+        if self.fields:
+            span['fields'] = dict(self.fields)
+        if self.children:
+            span['children'] = [child.as_dict(origin) for child in list(self.children)]
+        return span
+
+
+class Trace(object):
+    '''
+    Collects a span tree, and optionally cProfile summaries of the parse
+    stage, for a single request.
+
+    Spans opened with `span()` while the trace is active attach to it. The
+    context is copied into threads the pipeline starts itself (i.e. the
+    hedged fetch), so their steps show up too.
+    '''
+
+    def __init__(self, name: str, profile: bool = False, **fields):
+        self.profile = profile
+        self.profiles = {}
+        self.root = Span(name, self, **fields)
+
+    @contextmanager
+    def active(self):
+        token = _current_span.set(self.root)
+        try:
+            yield self.root
+        finally:
+            self.root.end = time.perf_counter()
+            _current_span.reset(token)
+
+    def report(self) -> dict:
+        report = {'spans': self.root.as_dict(self.root.start)}
+        if self.profiles:
+            report['profile'] = dict(self.profiles)
+        return report
+
+
+def current_span():
+    '''
+    The innermost open span, or None if the current request isn't traced.
+    '''
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **fields):
+    '''
+    Times its body as a child of the current span. Does nothing, and yields
+    None, when the current request isn't traced.
+    '''
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace, **fields)
+    parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def annotate(**fields) -> None:
+    '''
+    Adds fields to the current span, if the request is being traced.
+    '''
+    current = _current_span.get()
+    if current is not None:
+        current.set(**fields)
+
+
+def traced(name: str):
+    '''
+    Decorator running every call of the function inside a span named `name`.
+    '''
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_span(name: str, seconds: float, **fields) -> None:
+    '''
+    Adds an already finished step of `seconds` that ended now to the current span.
+    '''
+    parent = _current_span.get()
+    if parent is None:
+        return
+    child = Span(name, parent.trace, **fields)
+    child.end = time.perf_counter()
+    child.start = child.end - seconds
+    parent.children.append(child)
+
+
+@contextmanager
+def profiled(stage: str):
+    '''
+    Runs its body under cProfile when the current trace asked for profiles,
+    and stores the top entries by cumulative time under `stage`.
+    '''
+    parent = _current_span.get()
+    if parent is None or not parent.trace.profile:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(TRACE_PROFILE_LINES)
+        parent.trace.profiles.setdefault(stage, []).append(out.getvalue())
@@ -0,0 +1,145 @@
+import os
+import requests
+from urllib.parse import urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes `br` responses when this is importable
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': ACCEPT_ENCODING,
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+
+UG_TABS_HOST = 'tabs.ultimate-guitar.com'
+UG_WWW_HOST = 'www.ultimate-guitar.com'
+
+# Where requests for the two UG hosts actually go, i.e. a local stand-in server for load tests
+UG_TABS_BASE = os.environ.get('UG_TABS_BASE', f'https://{UG_TABS_HOST}').rstrip('/')
+UG_WWW_BASE = os.environ.get('UG_WWW_BASE', f'https://{UG_WWW_HOST}').rstrip('/')
+
+_BASES = {UG_TABS_HOST: urlsplit(UG_TABS_BASE), UG_WWW_HOST: urlsplit(UG_WWW_BASE)}
+
+# Longest wait honoured from a 429/503 Retry-After header before retrying
+UPSTREAM_MAX_RETRY_AFTER = float(os.environ.get('UPSTREAM_MAX_RETRY_AFTER', 5))
+
+# Connect timeout of every upstream request, however long its read timeout
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 5))
+
+
+def upstream_url(url: str) -> str:
+    '''
+    Points a canonical Ultimate Guitar url at the configured base url for its host.
+    Other urls are returned unchanged.
+    '''
+    parts = urlsplit(url)
+    base = _BASES.get(parts.netloc.lower())
+    if base is None:
+        return url
+    return urlunsplit((base.scheme, base.netloc, base.path + parts.path, parts.query, parts.fragment))
+
+
+def supported_tab_hosts() -> set:
+    '''
+    Hosts accepted in tab urls: UG's tab host, plus the configured tab base's host.
+    '''
+    return {UG_TABS_HOST, _BASES[UG_TABS_HOST].netloc}
+
+
+class CappedRetry(Retry):
+    '''
+    A Retry that sleeps at most UPSTREAM_MAX_RETRY_AFTER seconds for a
+    Retry-After header, so a rate-limited UG can't park request threads for
+    minutes. urllib3 itself honours the header in full.
+
+    Read timeouts are never retried: the read already took the whole
+    timeout. Other read errors are, above all a kept-alive connection that
+    UG closed while it sat in the pool.
+    '''
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        if isinstance(error, ReadTimeoutError):
+            raise error.with_traceback(_stacktrace)
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, UPSTREAM_MAX_RETRY_AFTER)
+
+
+class UpstreamClient(object):
+    '''
+    The single HTTP client used for all traffic to Ultimate Guitar.
+
+    Wraps one `requests.Session` whose connection pool is shared by every
+    thread in the worker, so repeated calls reuse kept-alive TCP/TLS
+    connections instead of handshaking each time. Idempotent requests are
+    retried with exponential backoff on connection errors, dropped
+    connections and 429/5xx, but not after a read timeout, so one GET takes
+    about one `timeout` at most plus the capped Retry-After waits.
+    The session's headers are set once here and never mutated afterwards,
+    which keeps sharing it across threads safe.
+    '''
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16, retries: int = 2,
+                 backoff_factor: float = 0.3, timeout: float = 15):
+        self.timeout = timeout
+        self.throttle = None  # Called with the host before every request to it, i.e. a crawler's rate limiter
+
+        retry = CappedRetry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.RETRY_STATUSES,
+            allowed_methods=frozenset(['GET', 'HEAD']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        # pool_connections is the number of hosts kept, pool_maxsize the connections per host
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def wait_turn(self, url: str) -> None:
+        '''
+        Blocks until the throttle, if one is set, lets a request to the host
+        of `url` start. Selenium page loads call this too, since they bypass get().
+        '''
+        if self.throttle is not None:
+            self.throttle(urlsplit(url).netloc.lower())
+
+    def get(self, url: str, timeout: float = None, **kwargs) -> requests.Response:
+        '''
+        Performs a GET and raises for non-2xx responses. Canonical UG urls
+        are sent to the configured base urls.
+        '''
+        self.wait_turn(url)
+        read_timeout = self.timeout if timeout is None else timeout
+        resp = self.session.get(upstream_url(url), timeout=(min(UPSTREAM_CONNECT_TIMEOUT, read_timeout), read_timeout),
+                                **kwargs)
+        resp.raise_for_status()
+        return resp
+
+
+upstream = UpstreamClient(
+    pool_maxsize=int(os.environ.get('UPSTREAM_POOL_MAXSIZE', 16)),
+    retries=int(os.environ.get('UPSTREAM_RETRIES', 2)),
+    backoff_factor=float(os.environ.get('UPSTREAM_BACKOFF', 0.3)),
+)
@@ -1,15 +1,35 @@
 from server import app
-from flask import request, jsonify
+from flask import request, jsonify, url_for, Response
 from urllib.parse import urlparse
 from .tab_parser import dict_from_ultimate_tab, grouped_blocks_from_ultimate_tab
-import re
+from .cache import tab_cache, search_cache, normalize_tab_url
+from .fetchers import fetcher_stats
+from .metrics import registry, stage_timer, PROMETHEUS_CONTENT_TYPE
+from .tracing import Trace
+from .profiler import sampling_profiler
+from contextlib import nullcontext
+from .jobs import render_jobs
+from .boot import boot_report
+from .upstream import supported_tab_hosts
+from .tab_index import tab_index
+from .tab_store import tab_store, tab_id_for_url, STORE_READ_MAX_IDS
+from .search import search_tabs, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT
+from .batch import grouped_blocks_for_urls, submit_tab_batch, BATCH_MAX_URLS
+from .streaming import event_stream_response, wants_sse, NDJSON_MIMETYPE, SSE_MIMETYPE
+from concurrent.futures import as_completed
+import hmac
 import requests
-from bs4 import BeautifulSoup
-import urllib.parse
-import time
+import os
 
 
-SUPPORTED_UG_URI = 'tabs.ultimate-guitar.com'
+# Tab urls may also name the host of a configured UG_TABS_BASE, i.e. a local stand-in
+SUPPORTED_UG_HOSTS = supported_tab_hosts()
+
+# Whether /tab behaves as if ?async=1 was passed when the client doesn't say
+TAB_ASYNC_DEFAULT = os.environ.get('TAB_ASYNC_DEFAULT', '0')
+
+# Admin token for request traces and the sampling profiler; both are off while it is unset
+DEBUG_TOKEN = os.environ.get('DEBUG_TOKEN', '')
 
 @app.route('/')
 def index():
@@ -19,6 +39,45 @@ def index():
 def health():
     return 'API Server is running ✅'
 
+@app.route('/api/boot')
+def boot():
+    return jsonify(boot_report())
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify(dict(tab_cache.stats(), search=search_cache.stats(), index=tab_index.stats(), store=tab_store.stats()))
+
+@app.route('/metrics')
+def metrics():
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.route('/debug/profiler', methods=['GET'])
+def profiler_report():
+    if not _admin_authorized():
+        return jsonify({'error': 'A valid admin token is required'}), 403
+    return jsonify(sampling_profiler.report(top=request.args.get('top', 20, type=int)))
+
+@app.route('/debug/profiler/start', methods=['POST'])
+def profiler_start():
+    if not _admin_authorized():
+        return jsonify({'error': 'A valid admin token is required'}), 403
+    try:
+        started = sampling_profiler.start(interval=request.args.get('interval', type=float))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(dict(sampling_profiler.report(top=0), started=started))
+
+@app.route('/debug/profiler/stop', methods=['POST'])
+def profiler_stop():
+    if not _admin_authorized():
+        return jsonify({'error': 'A valid admin token is required'}), 403
+    sampling_profiler.stop()
+    return jsonify(sampling_profiler.report(top=request.args.get('top', 20, type=int)))
+
+@app.route('/fetchers/stats')
+def fetchers_stats():
+    return jsonify(fetcher_stats.snapshot())
+
 @app.route('/tab/v1')
 def tab_v1():
     try:
@@ -27,13 +86,17 @@ def tab_v1():
         # Ensure sanitized url
         parsed_url = urlparse(ultimate_url)
         location = parsed_url.netloc
-        if location != SUPPORTED_UG_URI:
+        if location not in SUPPORTED_UG_HOSTS:
             raise Exception('unsupported url scheme')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-    tab_dict = dict_from_ultimate_tab(ultimate_url)
-    return jsonify(tab_dict)
+    options = _debug_options()
+    trace = _debug_trace(options, 'tab/v1', url=ultimate_url)
+    stale = []
+    with _tracing(trace):
+        tab_dict = dict_from_ultimate_tab(ultimate_url, fresh='fresh' in options, on_stale=stale.append)
+    return _marked_stale(_serialized(_with_debug(tab_dict, trace)), stale)
 
 @app.route('/tab')
 def tab_v2():
@@ -43,13 +106,127 @@ def tab_v2():
         # Ensure sanitized url
         parsed_url = urlparse(ultimate_url)
         location = parsed_url.netloc
-        if location != SUPPORTED_UG_URI:
+        if location not in SUPPORTED_UG_HOSTS:
             raise Exception('unsupported url scheme')
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-    grouped_blocks = grouped_blocks_from_ultimate_tab(ultimate_url)
+    if _wants_stream():
+        def run(emit):
+            grouped_blocks = grouped_blocks_from_ultimate_tab(
+                ultimate_url, progress=emit,
+                on_stale=lambda age: emit({'event': 'cache_stale', 'url': ultimate_url, 'age': int(age)}))
+            emit(dict(event='result', url=ultimate_url, **_tab_payload(grouped_blocks)))
+        return event_stream_response(run, sse=wants_sse(request))
+
+    if _wants_async():
+        # Answer right away if the static fetch works, otherwise hand the render to a background job
+        stale = []
+        grouped_blocks = grouped_blocks_from_ultimate_tab(ultimate_url, use_render=False, on_stale=stale.append)
+        if any('error' in block for block in grouped_blocks):
+            job = render_jobs.submit(normalize_tab_url(ultimate_url), _render_tab_job, ultimate_url)
+            status_url = url_for('job_status', job_id=job['id'])
+            return jsonify(_job_json(job)), 202, {'Location': status_url}
+        return _marked_stale(_serialized(_tab_payload(grouped_blocks)), stale)
+
+    options = _debug_options()
+    trace = _debug_trace(options, 'tab', url=ultimate_url)
+    stale = []
+    with _tracing(trace):
+        grouped_blocks = grouped_blocks_from_ultimate_tab(ultimate_url, fresh='fresh' in options, on_stale=stale.append)
+    return _marked_stale(_serialized(_with_debug(_tab_payload(grouped_blocks), trace)), stale)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Poll a background render started by /tab?async=1
+    """
+    job = render_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(_job_json(job))
+
+def _wants_async() -> bool:
+    """
+    Whether slow renders should be returned as a 202 + job instead of blocking
+    """
+    return request.args.get('async', TAB_ASYNC_DEFAULT) in ('1', 'true')
+
+def _render_tab_job(ultimate_url):
+    grouped_blocks = grouped_blocks_from_ultimate_tab(ultimate_url, use_static=False)
+    errors = [block['error'] for block in grouped_blocks if 'error' in block]
+    if errors:
+        raise Exception('; '.join(errors))
+    return _tab_payload(grouped_blocks)
+
+def _job_json(job):
+    job_json = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'status_url': url_for('job_status', job_id=job['id']),
+    }
+    if job['status'] == 'done':
+        job_json['result'] = job['result']
+    elif job['status'] == 'failed':
+        job_json['error'] = job['error']
+    return job_json
+
+def _admin_authorized() -> bool:
+    """
+    Whether the request carries the admin token in the X-Debug-Token header.
+    Never read from the query string, which ends up in access logs
+    """
+    supplied = request.headers.get('X-Debug-Token', '')
+    return bool(DEBUG_TOKEN) and hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode())
+
+def _debug_options() -> set:
+    """
+    Options from an authorized X-Debug-Trace header: any of trace, profile
+    (cProfile the parse stage) and fresh (bypass the tab cache)
+    """
+    header = request.headers.get('X-Debug-Trace', '')
+    if not header or not _admin_authorized():
+        return set()
+    return {option.strip().lower() for option in header.split(',') if option.strip()} | {'trace'}
+
+def _debug_trace(options, name, **fields):
+    if not options:
+        return None
+    return Trace(name, profile='profile' in options, **fields)
+
+def _tracing(trace):
+    return trace.active() if trace is not None else nullcontext()
+
+def _with_debug(payload, trace):
+    if trace is None:
+        return payload
+    return dict(payload, debug=trace.report())
 
+def _serialized(payload):
+    with stage_timer('serialization'):
+        return jsonify(payload)
+
+def _marked_stale(response, stale):
+    """
+    Flags a response built from an expired cache entry, which is being
+    refreshed in the background: X-Cache-Status: stale, and Age in seconds
+    """
+    if stale:
+        response.headers['X-Cache-Status'] = 'stale'
+        response.headers['Age'] = str(int(stale[0]))
+    return response
+
+def _wants_stream() -> bool:
+    """
+    Whether the client asked for a streamed (NDJSON or SSE) response
+    """
+    accept = request.headers.get('Accept', '')
+    return request.args.get('stream') in ('1', 'true') or NDJSON_MIMETYPE in accept or SSE_MIMETYPE in accept
+
+def _tab_payload(grouped_blocks):
+    """
+    Builds the /tab response body: the blocks plus joined lyrics and chord text
+    """
     # Post-process for joined text output
     lyrics_lines = []
     tabs_lines = []
@@ -88,11 +265,11 @@ def tab_v2():
     lyrics_text = '\n'.join(lyrics_lines)
     tabs_text = '\n'.join(tabs_lines)
 
-    return jsonify({
+    return {
         'blocks': grouped_blocks,
         'lyrics_text': lyrics_text,
         'tabs_text': tabs_text
-    })
+    }
 
 @app.route('/tab/combined')
 def tab_combined():
@@ -103,8 +280,14 @@ def tab_combined():
         ultimate_url = request.args.get('url')
         if not ultimate_url:
             return jsonify({'error': 'URL parameter is required'}), 400
+        if urlparse(ultimate_url).netloc not in SUPPORTED_UG_HOSTS:
+            return jsonify({'error': 'unsupported url scheme'}), 400
 
-        grouped_blocks = grouped_blocks_from_ultimate_tab(ultimate_url)
+        options = _debug_options()
+        trace = _debug_trace(options, 'tab/combined', url=ultimate_url)
+        stale = []
+        with _tracing(trace):
+            grouped_blocks = grouped_blocks_from_ultimate_tab(ultimate_url, fresh='fresh' in options, on_stale=stale.append)
 
         # Process combined format for display
         combined_lines = []
@@ -112,7 +295,7 @@ def tab_combined():
             if 'combined' in block:
                 combined_lines.extend(block['combined'])
             elif 'error' in block:
-                return jsonify(block), 400
+                return jsonify(_with_debug(block, trace)), 400
 
         # Format for display: combine chords and lyrics on same line
         display_lines = []
@@ -120,7 +303,14 @@ def tab_combined():
             lyric = line.get('lyric', '').strip()
             chords = line.get('chords', '').strip()
             
-            if lyric or chords:
+            if 'section' in line:
+                display_lines.append({
+                    'section': line['section'],
+                    'chords': '',
+                    'lyric': '',
+                    'combined': f"[{line['section']}]"
+                })
+            elif lyric or chords:
                 # Create a combined line with chords above lyrics
                 display_line = {
                     'chords': chords,
@@ -129,226 +319,102 @@ def tab_combined():
                 }
                 display_lines.append(display_line)
 
-        return jsonify({
+        return _marked_stale(_serialized(_with_debug({
             'lines': display_lines,
             'message': 'Combined tab format with chords and lyrics aligned'
-        })
+        }, trace)), stale)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/tabs/batch', methods=['POST'])
+def tabs_batch():
+    """
+    Fetch many tabs in one call, concurrently.
+
+    Expects a JSON body of the form {"urls": ["https://tabs.ultimate-guitar.com/...", ...]}
+    and returns one result per url, in the same order.
+    """
+    payload = request.get_json(silent=True) or {}
+    urls = payload.get('urls')
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'error': 'A non-empty "urls" list is required'}), 400
+    if len(urls) > BATCH_MAX_URLS:
+        return jsonify({'error': f'At most {BATCH_MAX_URLS} urls can be fetched per batch'}), 400
+
+    for url in urls:
+        if not isinstance(url, str) or urlparse(url).netloc not in SUPPORTED_UG_HOSTS:
+            return jsonify({'error': f'unsupported url scheme: {url}'}), 400
+
+    if _wants_stream():
+        # Emit each tab's result the moment it is ready, in completion order
+        def run(emit):
+            for future in as_completed(submit_tab_batch(urls, progress=emit)):
+                emit(dict(event='result', **future.result()))
+        return event_stream_response(run, sse=wants_sse(request))
+
+    return jsonify({'results': grouped_blocks_for_urls(urls)})
+
+@app.route('/tabs/stored', methods=['POST'])
+def tabs_stored():
+    """
+    Read many already parsed tabs from the tab store in one call, i.e. a setlist,
+    without going to Ultimate Guitar.
+
+    Expects a JSON body of the form {"ids": ["1234567", ...]} and/or
+    {"urls": ["https://tabs.ultimate-guitar.com/...", ...]} and returns one
+    result per id or url, in the same order.
+    """
+    payload = request.get_json(silent=True) or {}
+    ids = payload.get('ids') or []
+    urls = payload.get('urls') or []
+    if not isinstance(ids, list) or not isinstance(urls, list) or not (ids or urls):
+        return jsonify({'error': 'A non-empty "ids" or "urls" list is required'}), 400
+    if len(ids) + len(urls) > STORE_READ_MAX_IDS:
+        return jsonify({'error': f'At most {STORE_READ_MAX_IDS} tabs can be read per request'}), 400
+    if not all(isinstance(item, (str, int)) for item in ids) or not all(isinstance(url, str) for url in urls):
+        return jsonify({'error': 'ids must be strings or numbers and urls must be strings'}), 400
+
+    wanted = [str(tab_id) for tab_id in ids] + [tab_id_for_url(url) for url in urls]
+    stored = tab_store.get_many(wanted)
+    return jsonify({'results': [stored.get(tab_id) or {'id': tab_id, 'error': 'Not in the tab store'} for tab_id in wanted]})
+
 @app.route('/search')
 def search_song():
     """
-    Search for a song by name and return the Ultimate Guitar URL
+    Search for a song by name and return the best matching Ultimate Guitar URL,
+    plus up to `limit` ranked results to choose another version from
     """
     try:
         song_name = request.args.get('song')
         artist_name = request.args.get('artist', '')
-        
+        limit = min(max(request.args.get('limit', SEARCH_DEFAULT_LIMIT, type=int), 1), SEARCH_MAX_LIMIT)
+        lyrics = request.args.get('lyrics', '0') in ('1', 'true')
+
         if not song_name:
             return jsonify({'error': 'Song name is required'}), 400
 
         # Search Ultimate Guitar dynamically
-        matching_url = search_ultimate_guitar(song_name, artist_name)
-        
-        if not matching_url:
+        try:
+            results, source = search_tabs(song_name, artist_name, limit, lyrics=lyrics)
+        except requests.RequestException as e:
+            print(f"[Error] Search failed for \"{song_name}\": {e}")
+            return jsonify({'error': f'Ultimate Guitar search failed: {e}'}), 502
+
+        if not results and lyrics:
+            return jsonify({'error': f'No fetched tab has lyrics matching "{song_name}".'}), 404
+        if not results:
             return jsonify({'error': f'No tabs found for "{song_name}". Try using the /tab endpoint with a direct Ultimate Guitar URL.'}), 404
 
-        # Return the URL directly without trying to parse it
+        # Return the URLs directly without trying to parse them
         return jsonify({
             'song_name': song_name,
             'artist_name': artist_name,
-            'url': matching_url,
+            'url': results[0]['url'],
+            'results': results,
+            'source': source,
             'message': 'URL found. Use this URL with your Flutter app to fetch the tab content.'
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
-def search_ultimate_guitar(song_name, artist_name=''):
-    """
-    Search Ultimate Guitar website for a song and return the best matching URL
-    """
-    try:
-        # Construct search query
-        search_query = song_name
-        if artist_name:
-            search_query = f"{artist_name} {song_name}"
-        
-        # URL encode the search query
-        encoded_query = urllib.parse.quote(search_query)
-        
-        # Search URL for Ultimate Guitar
-        search_url = f"https://www.ultimate-guitar.com/search.php?search_type=title&value={encoded_query}"
-        
-        # Make the request with headers to mimic a browser
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        
-        response = requests.get(search_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # Parse the HTML response
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        # Look for JSON data in the HTML that contains tab URLs
-        tab_urls = []
-        
-        # Pattern 1: Look for JSON data in script tags
-        script_tags = soup.find_all('script')
-        for script in script_tags:
-            script_content = script.get_text()
-            if '"tab_url"' in script_content:
-                # Extract tab URLs from JSON
-                import json
-                try:
-                    # Find JSON objects that contain tab_url
-                    json_matches = re.findall(r'\{[^}]*"tab_url"[^}]*\}', script_content)
-                    for json_str in json_matches:
-                        try:
-                            # Clean up the JSON string
-                            json_str = json_str.replace('&quot;', '"')
-                            data = json.loads(json_str)
-                            if 'tab_url' in data:
-                                tab_urls.append(data['tab_url'])
-                        except json.JSONDecodeError:
-                            continue
-                except Exception as e:
-                    print(f"JSON parsing error: {e}")
-                    continue
-        
-        # Pattern 2: Look for tab URLs in the entire HTML content
-        if not tab_urls:
-            html_content = response.text
-            import html
-            try:
-                decoded_content = html.unescape(html_content)
-            except:
-                decoded_content = html_content
-            # Use a robust regex to extract the first valid tab_url
-            match = re.search(r'"tab_url":"(https://tabs\.ultimate-guitar\.com/tab/[^"]+)"', decoded_content)
-            if match:
-                tab_urls.append(match.group(1))
-        
-        # Pattern 3: Look for specific tab URL patterns
-        if not tab_urls:
-            html_content = response.text
-            # Look for specific tab URL patterns
-            tab_url_pattern = r'tabs\.ultimate-guitar\.com/tab/[^"\s]*'
-            all_url_matches = re.findall(tab_url_pattern, html_content)
-            # Only add URLs that look like proper tab URLs
-            valid_urls = []
-            for url in all_url_matches:
-                if len(url) < 200 and '/tab/' in url:
-                    valid_urls.append(f"https://{url}")
-            tab_urls.extend(valid_urls)
-            print(f"Found {len(valid_urls)} potential URLs via pattern 3")
-        
-        # Pattern 3: Look for direct links as fallback
-        if not tab_urls:
-            tab_links = soup.find_all('a', href=re.compile(r'tabs\.ultimate-guitar\.com.*'))
-            for link in tab_links:
-                href = link.get('href', '')
-                if href.startswith('http'):
-                    tab_urls.append(href)
-        
-        # Filter and rank the results
-        valid_urls = []
-        for url in tab_urls:
-            # Ensure it's a valid tabs.ultimate-guitar.com URL
-            if 'tabs.ultimate-guitar.com' in url:
-                valid_urls.append(url)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_urls = []
-        for url in valid_urls:
-            if url not in seen:
-                seen.add(url)
-                unique_urls.append(url)
-        
-        # Return the first valid URL found
-        if unique_urls:
-            return unique_urls[0]
-        
-        # If no results found, try alternative search approach
-        print("No results found with primary search, trying alternative approach...")
-        return search_ultimate_guitar_alternative(song_name, artist_name)
-        
-    except requests.RequestException as e:
-        print(f"Request error during search: {e}")
-        return None
-    except Exception as e:
-        print(f"Error during search: {e}")
-        return None
-
-def search_ultimate_guitar_alternative(song_name, artist_name=''):
-    """
-    Alternative search method using different Ultimate Guitar search endpoints
-    """
-    try:
-        # Construct search query
-        search_query = song_name
-        if artist_name:
-            search_query = f"{artist_name} {song_name}"
-        
-        # URL encode the search query
-        encoded_query = urllib.parse.quote(search_query)
-        
-        # Try different search URLs
-        search_urls = [
-            f"https://www.ultimate-guitar.com/search.php?search_type=title&value={encoded_query}",
-            f"https://www.ultimate-guitar.com/search.php?search_type=artist&value={encoded_query}",
-            f"https://www.ultimate-guitar.com/search.php?value={encoded_query}",
-            f"https://tabs.ultimate-guitar.com/search?q={encoded_query}"
-        ]
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'Accept-Encoding': 'gzip, deflate',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        }
-        
-        for search_url in search_urls:
-            print(f"Trying alternative search URL: {search_url}")
-            
-            try:
-                response = requests.get(search_url, headers=headers, timeout=10)
-                response.raise_for_status()
-                
-                soup = BeautifulSoup(response.content, 'html.parser')
-                
-                # Look for any links that might be tabs
-                all_links = soup.find_all('a', href=True)
-                tab_urls = []
-                
-                for link in all_links:
-                    href = link.get('href', '')
-                    if 'tabs.ultimate-guitar.com' in href or ('/tab/' in href and href.startswith('/')):
-                        if href.startswith('/'):
-                            href = f"https://tabs.ultimate-guitar.com{href}"
-                        tab_urls.append(href)
-                
-                if tab_urls:
-                    print(f"Found {len(tab_urls)} URLs with alternative search")
-                    return tab_urls[0]
-                    
-            except Exception as e:
-                print(f"Alternative search failed for {search_url}: {e}")
-                continue
-        
-        return None
-        
-    except Exception as e:
-        print(f"Error during alternative search: {e}")
-        return None
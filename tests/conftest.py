@@ -0,0 +1,7 @@
+import os
+
+# The server package builds its caches, index and store when imported; keep them in memory only
+os.environ['TAB_CACHE_PATH'] = ''
+os.environ['TAB_INDEX_PATH'] = ''
+os.environ['TAB_STORE_PATH'] = ''
+os.environ['CHROME_PROVISION_AT_BOOT'] = '0'
@@ -0,0 +1,51 @@
+import json
+import time
+import pytest
+from server import app, batch, views
+
+BASE = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/song-chords-'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def blocks(url, progress=None):
+        number = int(url.rsplit('-', 1)[1])
+        time.sleep(0.05 * (3 - number))  # Later urls finish first
+        if number == 2:
+            return [{'error': 'Failed to fetch and parse tab'}]
+        if number == 3:
+            raise RuntimeError('boom')
+        return [{'combined': [{'lyric': f'song {number}', 'chords': ''}]}]
+
+    monkeypatch.setattr(batch, 'grouped_blocks_from_ultimate_tab', blocks)
+    return app.test_client()
+
+
+def test_results_come_back_in_input_order(client):
+    urls = [BASE + '0', BASE + '1', BASE + '2', BASE + '3']
+    started = time.monotonic()
+    response = client.post('/tabs/batch', json={'urls': urls})
+    elapsed = time.monotonic() - started
+    results = response.get_json()['results']
+    assert [result['url'] for result in results] == urls
+    assert results[0]['blocks'][0]['combined'][0]['lyric'] == 'song 0'
+    assert results[2] == {'url': urls[2], 'error': 'Failed to fetch and parse tab'}
+    assert results[3] == {'url': urls[3], 'error': 'boom'}
+    assert elapsed < 0.3  # Fetched concurrently, not one after another
+
+
+def test_stream_emits_results_as_they_finish(client):
+    urls = [BASE + '0', BASE + '1']
+    response = client.post('/tabs/batch?stream=1', json={'urls': urls})
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['url'] for record in records if record['event'] == 'result'] == [urls[1], urls[0]]
+
+
+def test_invalid_batches_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(views, 'BATCH_MAX_URLS', 2)
+    assert client.post('/tabs/batch', json={}).status_code == 400
+    assert client.post('/tabs/batch', json={'urls': []}).status_code == 400
+    response = client.post('/tabs/batch', json={'urls': [BASE + '0'] * 3})
+    assert response.status_code == 400 and 'At most 2' in response.get_json()['error']
+    response = client.post('/tabs/batch', json={'urls': ['https://evil.example.com/tab/x-chords-1']})
+    assert response.status_code == 400 and 'unsupported url' in response.get_json()['error']
@@ -0,0 +1,64 @@
+import time
+from server import cache
+from server.cache import TabCache, normalize_tab_url, normalize_search_query, fold_text
+
+
+def test_normalize_tab_url_drops_query_fragment_and_slashes():
+    assert normalize_tab_url('http://TABS.ultimate-guitar.com//tab/a/b-chords-1/?app=1#top') == \
+        'https://tabs.ultimate-guitar.com/tab/a/b-chords-1'
+
+
+def test_fold_text_and_search_key():
+    assert fold_text("Don't Stop Me Now!") == 'dont stop me now'
+    assert normalize_search_query('Amazing Grace', 'Chris Tomlin') == normalize_search_query('chris tomlin amazing-grace')
+    assert normalize_search_query('Café') == normalize_search_query('cafe')
+
+
+def test_lru_evicts_least_recently_used():
+    c = TabCache(max_entries=2)
+    c.set('a', 1)
+    c.set('b', 2)
+    assert c.get('a') == 1
+    c.set('c', 3)
+    assert c.get('b') is None
+    assert c.get('a') == 1 and c.get('c') == 3
+
+
+def test_expired_entry_is_a_miss_but_served_stale_within_bound():
+    c = TabCache(ttl=0.05, max_stale=10)
+    c.set('k', 'v')
+    time.sleep(0.06)
+    assert c.get('k') is None
+    value, age, stale = c.get_stale('k')
+    assert (value, stale) == ('v', True) and age >= 0.05
+    assert c.stats()['stale_hits'] == 1
+
+
+def test_entry_past_max_stale_is_dropped():
+    c = TabCache(ttl=0.02, max_stale=0.02)
+    c.set('k', 'v')
+    time.sleep(0.05)
+    assert c.get_stale('k') is None
+    assert c.stats()['memory_entries'] == 0
+
+
+def test_disk_tier_is_shared_and_picks_up_refreshes(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    first = TabCache(ttl=0.05, path=path, max_stale=10)
+    second = TabCache(ttl=0.05, path=path, max_stale=10)
+    first.set('k', [1])
+    assert second.get('k') == [1]
+    time.sleep(0.06)
+    second.set('k', [2], ttl=60)
+    # first's memory copy expired, so it checks the disk and finds second's refresh
+    assert first.get('k') == [2]
+
+
+def test_disk_tier_is_pruned_to_its_cap(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, 'DISK_PRUNE_EVERY', 10)
+    c = TabCache(path=str(tmp_path / 'cache.sqlite3'), max_disk_entries=5)
+    for i in range(10):
+        c.set(f'k{i}', i)
+    rows = c._db.execute('SELECT key FROM tab_cache ORDER BY stored_at').fetchall()
+    assert [key for key, in rows] == [f'k{i}' for i in range(5, 10)]
+    assert c.stats()['disk_pruned'] == 5
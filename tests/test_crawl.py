@@ -0,0 +1,58 @@
+import json
+import time
+from server.crawl import HostRateLimiter, parse_entry, classify, load_checkpoint, STATIC_OK, NEEDED_RENDER, CACHED, NEEDS_RENDER, \
+    RENDER_FAILED, PARSE_ERROR, FETCH_ERROR
+
+OK = [{'combined': []}]
+FAILED = [{'error': 'Failed to fetch and parse tab'}]
+
+
+def test_parse_entry():
+    url = 'https://tabs.ultimate-guitar.com/tab/a/b-chords-1'
+    assert parse_entry(url) == ('url', url)
+    assert parse_entry('Chris Tomlin - Amazing Grace') == ('query', 'Amazing Grace', 'Chris Tomlin')
+    assert parse_entry('it is well   # just a title') == ('query', 'it is well', '')
+    assert parse_entry('# a comment') is None
+    assert parse_entry('   ') is None
+
+
+def test_classify_successes():
+    assert classify(OK, [{'event': 'cache_hit'}]) == (CACHED, None)
+    assert classify(OK, [{'event': 'parsed', 'source': 'static'}]) == (STATIC_OK, None)
+    assert classify(OK, [{'event': 'static_fetch_failed', 'reason': 'x'},
+                         {'event': 'parsed', 'source': 'render'}]) == (NEEDED_RENDER, None)
+
+
+def test_classify_failures():
+    def failed(reason, *events):
+        return classify(FAILED, [{'event': 'static_fetch_failed', 'reason': reason}, *events])[0]
+
+    assert failed('requests returned no tab lines') == PARSE_ERROR
+    assert failed('requests returned empty HTML') == FETCH_ERROR
+    assert failed('requests returned too short HTML') == FETCH_ERROR
+    assert failed('likely dynamic content: js_store_without_tab', {'event': 'render_attempt'}) == RENDER_FAILED
+    assert failed('likely dynamic content: js_store_without_tab') == NEEDS_RENDER
+
+
+def test_load_checkpoint_keeps_only_lines_whose_last_run_succeeded(tmp_path):
+    path = tmp_path / 'urls.txt.checkpoint'
+    records = [
+        {'entry': 'a', 'results': [{'outcome': STATIC_OK}]},
+        {'entry': 'b', 'results': [{'outcome': STATIC_OK}, {'outcome': FETCH_ERROR}]},
+        {'entry': 'c', 'results': [{'outcome': CACHED}]},
+        {'entry': 'c', 'results': [{'outcome': RENDER_FAILED}]},
+        {'entry': 'd', 'results': [{'outcome': RENDER_FAILED}]},
+        {'entry': 'd', 'results': [{'outcome': NEEDED_RENDER}]},
+    ]
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records) + '{"entry": "e", "res')
+    assert load_checkpoint(str(path)) == {'a', 'd'}
+    assert load_checkpoint(str(tmp_path / 'missing')) == set()
+
+
+def test_rate_limiter_spaces_requests_per_host():
+    limiter = HostRateLimiter(rate=20)
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.wait('tabs.ultimate-guitar.com')
+    limiter.wait('www.ultimate-guitar.com')
+    assert 0.09 <= time.monotonic() - started < 0.5
@@ -0,0 +1,87 @@
+import threading
+import time
+import pytest
+from server import app, views
+from server.metrics import stage_timer
+from server.profiler import SamplingProfiler, PROFILER_MIN_INTERVAL
+
+URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def tab_dict(url, fresh=False, on_stale=None):
+        with stage_timer('parse'):
+            return {'tab': {'title': 'Amazing Grace', 'fresh': fresh}}
+
+    monkeypatch.setattr(views, 'DEBUG_TOKEN', 'secret')
+    monkeypatch.setattr(views, 'dict_from_ultimate_tab', tab_dict)
+    monkeypatch.setattr(views, 'sampling_profiler', SamplingProfiler(interval=0.005))
+    return app.test_client()
+
+
+def test_traces_need_the_token_in_the_header(client):
+    body = client.get('/tab/v1', query_string={'url': URL},
+                      headers={'X-Debug-Token': 'secret', 'X-Debug-Trace': 'trace,fresh'}).get_json()
+    assert body['tab']['fresh'] is True
+    assert [child['name'] for child in body['debug']['spans']['children']] == ['parse']
+
+    for query, headers in [({}, {'X-Debug-Token': 'wrong', 'X-Debug-Trace': 'trace'}),
+                           ({'token': 'secret'}, {'X-Debug-Trace': 'trace'}),
+                           ({}, {'X-Debug-Token': 'secret'})]:
+        body = client.get('/tab/v1', query_string=dict(query, url=URL), headers=headers).get_json()
+        assert 'debug' not in body and body['tab']['fresh'] is False
+
+
+def test_traces_are_off_without_a_configured_token(client, monkeypatch):
+    monkeypatch.setattr(views, 'DEBUG_TOKEN', '')
+    body = client.get('/tab/v1', query_string={'url': URL}, headers={'X-Debug-Token': '', 'X-Debug-Trace': 'trace'}).get_json()
+    assert 'debug' not in body
+
+
+def test_profiler_endpoints(client):
+    assert client.post('/debug/profiler/start').status_code == 403
+    assert client.post('/debug/profiler/start?token=secret').status_code == 403
+    auth = {'X-Debug-Token': 'secret'}
+    assert client.post('/debug/profiler/start?interval=0', headers=auth).status_code == 400
+    assert client.post('/debug/profiler/start?interval=-1', headers=auth).status_code == 400
+
+    started = client.post('/debug/profiler/start', headers=auth).get_json()
+    assert started['started'] is True and started['running'] is True
+    assert client.post('/debug/profiler/start', headers=auth).get_json()['started'] is False
+    time.sleep(0.05)
+    report = client.post('/debug/profiler/stop', headers=auth).get_json()
+    assert report['running'] is False and report['samples'] > 0
+    assert client.get('/debug/profiler', headers=auth).status_code == 200
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+def test_profiler_stops_by_itself():
+    profiler = SamplingProfiler(interval=0.005, max_seconds=0.05)
+    profiler.start()
+    time.sleep(0.2)
+    report = profiler.report()
+    assert report['running'] is False and report['seconds'] < 0.2
+
+
+def test_profiler_bounds_distinct_stacks_and_skips_idle_threads():
+    stop = threading.Event()
+    idle = threading.Thread(target=stop.wait, name='idle-waiter', daemon=True)
+    worker = threading.Thread(target=busy, args=(stop,), daemon=True)
+    idle.start()
+    worker.start()
+    profiler = SamplingProfiler(interval=0.002, max_stacks=1)
+    profiler.start(interval=0.0001)
+    assert profiler.interval == PROFILER_MIN_INTERVAL
+    time.sleep(0.1)
+    profiler.stop()
+    stop.set()
+    report = profiler.report()
+    assert len(report['top_stacks']) == 1 and report['dropped_stacks'] > 0
+    assert not any('threading.py:wait' in stack['stack'].rsplit(';', 1)[-1] for stack in report['top_stacks'])
+    with pytest.raises(ValueError):
+        profiler.start(interval=0)
@@ -0,0 +1,47 @@
+from server.driver_pool import DriverPool
+
+
+class FakeDriver(object):
+    def __init__(self):
+        self.quit_called = False
+
+    def execute_script(self, script):
+        return 1
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+def test_prewarm_fills_the_pool():
+    pool = DriverPool(FakeDriver, size=3)
+    pool.prewarm()
+    assert pool.stats()['idle'] == 3 and pool.launched == 3
+
+
+def test_prewarm_counts_leased_drivers():
+    pool = DriverPool(FakeDriver, size=2)
+    with pool.lease():
+        pool.prewarm()
+        assert pool.stats()['live'] == 2
+    pool.prewarm()
+    assert pool.launched == 2 and pool.stats()['idle'] == 2
+
+
+def test_lease_reuses_the_idle_driver():
+    pool = DriverPool(FakeDriver, size=1)
+    with pool.lease() as first:
+        pass
+    with pool.lease() as second:
+        pass
+    assert first is second and pool.launched == 1
+
+
+def test_driver_is_recycled_after_max_pages():
+    pool = DriverPool(FakeDriver, size=1, max_pages=2)
+    for _ in range(2):
+        with pool.lease() as driver:
+            pass
+    assert driver.quit_called and pool.recycled == 1 and pool.stats()['live'] == 0
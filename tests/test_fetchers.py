@@ -0,0 +1,79 @@
+import html
+import json
+import pytest
+from server.fetchers import needs_render, FetcherStats, STATIC, RENDER
+from server.locator import TAB_CONTENT_SELECTORS
+from server.parser import html_tab_to_json_dict
+
+HEAD = '<html><head><title>Amazing Grace Chords by Chris Tomlin @ Ultimate-Guitar.Com</title></head><body>'
+CHORDS = 'G C G\nAmazing grace how sweet the sound\nG D\nThat saved a wretch like me\n'
+URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'
+
+
+def page(body):
+    return f'{HEAD}<nav><a href="/tab/chris-tomlin">Chris Tomlin tabs</a></nav>{body}</body></html>'
+
+
+def element_for(selector, content):
+    if selector.startswith('.'):
+        return f'<div class="wrapper {selector[1:]}">{content}</div>'
+    if selector.startswith('#'):
+        return f'<div id="{selector[1:]}">{content}</div>'
+    if selector.startswith('['):
+        return f'<div {selector[1:-1]}>{content}</div>'
+    return f'<{selector}>{content}</{selector}>'
+
+
+@pytest.mark.parametrize('selector', TAB_CONTENT_SELECTORS)
+def test_every_locator_selector_counts_as_static_tab_markup(selector):
+    markup = page(element_for(selector, CHORDS))
+    assert needs_render(markup) == (False, 'tab_markup')
+    assert html_tab_to_json_dict(markup, URL)['tab']['lines']
+
+
+def test_js_store_with_chords_is_static():
+    store = {'store': {'page': {'data': {'tab_view': {'wiki_tab': {'content': '[ch]G[/ch] Amazing grace'}}}}}}
+    markup = page(f'<div class="js-store" data-content="{html.escape(json.dumps(store))}"></div>')
+    assert needs_render(markup) == (False, 'js_store')
+
+
+def test_client_rendered_shell_needs_render():
+    store = {'store': {'page': {'data': {'tab_view': {'wiki_tab': {'content': ''}}}}}}
+    markup = page(f'<div class="js-store" data-content="{html.escape(json.dumps(store))}"></div>'
+                  '<main><div class="loader">Loading tab player</div></main>')
+    assert needs_render(markup) == (True, 'js_store_without_tab')
+
+
+def test_empty_tab_container_needs_render():
+    assert needs_render(page('<div class="js-tab"><div class="loader">Loading tab player</div></div>')) == \
+        (True, 'no_tab_markup')
+
+
+def test_class_names_outside_a_start_tag_do_not_count():
+    markup = page('<div class="js-store" data-content="{}"></div><style>.js-tab-content { color: red }</style>'
+                  '<p>Use class="tab" for tabs</p><p>G C D</p>')
+    assert needs_render(markup) == (True, 'js_store_without_tab')
+
+
+def test_unknown_layouts_fall_through_to_a_parse():
+    assert needs_render(page('<section>' + CHORDS + '</section>')) == (False, 'unknown_markup')
+
+
+def test_short_pages_need_render():
+    assert needs_render('') == (True, 'empty')
+    assert needs_render('<html></html>') == (True, 'empty')
+
+
+def test_fetcher_stats_learn_render_first_and_reprobe():
+    stats = FetcherStats(min_samples=3, static_ratio=0.2, reprobe_every=2)
+    for _ in range(3):
+        assert stats.choose(URL) == STATIC
+        stats.record(URL, STATIC, False, 'js_store_without_tab')
+    assert stats.choose(URL) == RENDER
+    assert stats.choose(URL) == STATIC  # Every 2nd render-first request probes static again
+    assert stats.snapshot()['patterns']['tabs.ultimate-guitar.com/chords']['preferred'] == RENDER
+
+
+def test_render_types_always_prefer_render():
+    stats = FetcherStats(render_types=['official'])
+    assert stats.choose('https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-official-1') == RENDER
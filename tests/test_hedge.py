@@ -0,0 +1,72 @@
+import threading
+import time
+from server import hedge
+from server.hedge import Hedger
+
+
+def slow(result, seconds, calls=None, cancelled=None):
+    def attempt(cancel):
+        if calls is not None:
+            calls.append(time.monotonic())
+        if cancel.wait(seconds) and cancelled is not None:
+            cancelled.set()
+        return result
+    return attempt
+
+
+def test_fast_primary_never_starts_the_secondary():
+    hedger = Hedger(after=0.5, percentile=0)
+    calls = []
+    assert hedger.run(lambda cancel: 'static', slow('render', 0, calls)) == 'static'
+    assert calls == [] and hedger.stats()['hedged'] == 0
+
+
+def test_failed_primary_starts_the_secondary_at_once():
+    hedger = Hedger(after=5, percentile=0)
+
+    def fail(cancel):
+        raise RuntimeError('static fetch failed')
+
+    started = time.monotonic()
+    assert hedger.run(fail, lambda cancel: 'render') == 'render'
+    assert time.monotonic() - started < 1
+
+
+def test_slow_primary_is_raced_and_the_loser_cancelled():
+    hedger = Hedger(after=0.05, percentile=0)
+    cancelled = threading.Event()
+    hedges = []
+    result = hedger.run(slow('static', 2, cancelled=cancelled), lambda cancel: 'render', on_hedge=hedges.append)
+    assert result == 'render'
+    assert cancelled.wait(1)  # The primary saw the cancel event instead of running on
+    assert hedges == [0.05]
+    assert hedger.stats()['secondary_wins'] == 1
+
+
+def test_primary_can_still_win_after_the_hedge():
+    hedger = Hedger(after=0.05, percentile=0)
+    cancelled = threading.Event()
+    assert hedger.run(slow('static', 0.1), slow('render', 2, cancelled=cancelled)) == 'static'
+    assert cancelled.wait(1)
+    assert hedger.stats()['secondary_wins'] == 0
+
+
+def test_neither_attempt_succeeding_returns_none():
+    hedger = Hedger(after=0.05, percentile=0)
+    assert hedger.run(slow(None, 0.1), lambda cancel: None) is None
+
+
+def test_threshold_follows_primary_latency_above_the_floor(monkeypatch):
+    monkeypatch.setattr(hedge, 'HEDGE_MIN_SAMPLES', 5)
+    hedger = Hedger(after=3, percentile=50, floor=0.01)
+    assert hedger.threshold() == 3
+    for _ in range(5):
+        hedger.run(slow('static', 0.02), lambda cancel: None)
+    assert 0.01 <= hedger.threshold() < 0.5
+
+
+def test_hedging_disabled_runs_attempts_in_turn():
+    hedger = Hedger(after=0)
+    order = []
+    assert hedger.run(lambda cancel: order.append('primary'), lambda cancel: order.append('secondary') or 'render') == 'render'
+    assert order == ['primary', 'secondary']
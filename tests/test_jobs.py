@@ -0,0 +1,97 @@
+import threading
+import time
+import pytest
+from server import app, views
+from server.jobs import JobStore, PENDING, RUNNING, DONE, FAILED
+
+URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-official-1'
+
+
+def wait_finished(store, job_id):
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job is None or job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError('job did not finish')
+
+
+def test_job_runs_to_done_and_keeps_its_result():
+    store = JobStore(workers=1)
+    release = threading.Event()
+    job = store.submit('key', lambda: release.wait(2) and 'rendered')
+    assert job['status'] == PENDING
+    time.sleep(0.05)
+    assert store.get(job['id'])['status'] == RUNNING
+    release.set()
+    job = wait_finished(store, job['id'])
+    assert (job['status'], job['result']) == (DONE, 'rendered')
+
+
+def test_failed_job_keeps_the_error():
+    store = JobStore(workers=1)
+
+    def fail():
+        raise RuntimeError('Selenium failed')
+
+    job = wait_finished(store, store.submit('key', fail)['id'])
+    assert (job['status'], job['error']) == (FAILED, 'Selenium failed')
+
+
+def test_active_jobs_are_shared_per_key():
+    store = JobStore(workers=1)
+    release = threading.Event()
+    first = store.submit('key', release.wait, 2)
+    assert store.submit('key', release.wait, 2)['id'] == first['id']
+    release.set()
+    wait_finished(store, first['id'])
+    assert store.submit('key', lambda: None)['id'] != first['id']  # Finished, so a new job starts
+
+
+def test_finished_jobs_expire_after_the_ttl():
+    store = JobStore(workers=1, ttl=0.05)
+    job = wait_finished(store, store.submit('key', lambda: 'x')['id'])
+    assert job['status'] == DONE
+    time.sleep(0.06)
+    assert store.get(job['id']) is None
+
+
+def test_oldest_jobs_are_dropped_beyond_max_jobs():
+    store = JobStore(workers=1, max_jobs=2)
+    ids = [store.submit(key, lambda: None)['id'] for key in ('a', 'b', 'c')]
+    assert store.get(ids[0]) is None
+    assert store.get(ids[2]) is not None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(views, 'render_jobs', JobStore(workers=1))
+    calls = []
+
+    def blocks(url, use_static=True, use_render=True, **kwargs):
+        calls.append((use_static, use_render))
+        if not use_render:
+            return [{'error': 'requests returned HTML without tab content'}]
+        return [{'combined': [{'lyric': 'Amazing grace', 'chords': 'G'}]}]
+
+    monkeypatch.setattr(views, 'grouped_blocks_from_ultimate_tab', blocks)
+    return app.test_client(), calls
+
+
+def test_async_tab_returns_a_job_to_poll(client):
+    client, calls = client
+    response = client.get('/tab', query_string={'url': URL, 'async': '1'})
+    assert response.status_code == 202
+    status_url = response.headers['Location']
+    assert response.get_json()['status_url'] == status_url
+
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        body = client.get(status_url).get_json()
+        if body['status'] == DONE:
+            break
+        time.sleep(0.01)
+    assert body['result']['lyrics_text'] == 'Amazing grace'
+    assert calls == [(True, False), (False, True)]
+    assert client.get('/jobs/unknown').status_code == 404
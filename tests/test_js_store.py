@@ -0,0 +1,53 @@
+import html
+import json
+from server.js_store import find_js_store, page_data, extract_js_store_tab, extract_js_store_search_results
+from server.parser import html_tab_to_json_dict
+
+
+def js_store_page(data, before=''):
+    blob = html.escape(json.dumps({'store': {'page': {'data': data}}}))
+    return f'<html><body>{before}<div class="js-store" data-content="{blob}"></div></body></html>'
+
+
+TAB_DATA = {
+    'tab': {'song_name': 'Amazing Grace', 'artist_name': 'Chris Tomlin', 'username': 'ugfan', 'tonality_name': 'G'},
+    'tab_view': {
+        'wiki_tab': {'content': '[Verse]\r\n[ch]G[/ch]      [ch]C[/ch]\r\nAmazing grace how sweet\r\n[tab]e|---3---|[/tab]'},
+        'meta': {'capo': 2, 'tuning': {'name': 'Standard', 'value': 'E A D G B E'}, 'difficulty': 'novice'},
+    },
+}
+
+
+def test_find_js_store_decodes_only_the_store():
+    page = js_store_page({'x': 'don\'t <b>"quoted"</b>'}, before='<p>js-store mentioned in text</p>')
+    assert page_data(find_js_store(page)) == {'x': 'don\'t <b>"quoted"</b>'}
+    assert find_js_store('<div class="js-store" data-content="{broken"></div>') is None
+    assert find_js_store('<html>no store</html>') is None
+    assert page_data({'store': None}) == {}
+
+
+def test_extract_tab_reads_metadata_and_strips_markup():
+    info, text = extract_js_store_tab(js_store_page(TAB_DATA))
+    assert (info.title, info.artist, info.author) == ('Amazing Grace', 'Chris Tomlin', 'ugfan')
+    assert (info.key, info.capo, info.tuning, info.difficulty) == ('G', '2', 'E A D G B E', 'novice')
+    assert '[ch]' not in text and '[tab]' not in text
+    assert 'G      C' in text and 'e|---3---|' in text
+
+
+def test_missing_content_and_empty_meta_list():
+    assert extract_js_store_tab(js_store_page({'tab': {}, 'tab_view': {'wiki_tab': {'content': ''}}})) is None
+    data = {'tab': {'song_name': 'Song'}, 'tab_view': {'wiki_tab': {'content': 'G C'}, 'meta': []}}
+    info, _ = extract_js_store_tab(js_store_page(data))
+    assert info.artist == 'UNKNOWN' and info.capo is None
+
+
+def test_parser_uses_the_js_store_tab():
+    tab = html_tab_to_json_dict(js_store_page(TAB_DATA))['tab']
+    assert tab['title'] == 'Amazing Grace' and tab['capo'] == '2'
+    assert any(line.get('lyric') == 'Amazing grace how sweet' for line in tab['lines'])
+
+
+def test_search_results_skip_non_dict_entries():
+    assert extract_js_store_search_results(js_store_page({'results': [{'id': 1}, 'ad', None]})) == [{'id': 1}]
+    assert extract_js_store_search_results(js_store_page({})) == []
+    assert extract_js_store_search_results('<html></html>') is None
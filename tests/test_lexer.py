@@ -0,0 +1,42 @@
+from server.lexer import tokenize, classify_line, is_chord_line, Token, CHORD, LYRIC, SECTION, METADATA, BLANK
+from server.parser import html_tab_to_json_dict
+
+
+def test_chord_lines():
+    assert is_chord_line('G  C  D  Em')
+    assert is_chord_line('    Cadd9  G/B  Am7')
+    assert not is_chord_line('Amazing grace how sweet the sound')
+    assert not is_chord_line('   ')
+
+
+def test_section_labels():
+    assert classify_line('[Chorus]') == (Token(SECTION, 'Chorus'),)
+    assert classify_line('[ Verse 1 ]') == (Token(SECTION, 'Verse 1'),)
+    assert classify_line('Verse 2:') == (Token(SECTION, 'Verse 2'),)
+    assert classify_line('Intro: G D Em C') == (Token(SECTION, 'Intro'), Token(CHORD, 'G D Em C'))
+
+
+def test_lines_that_only_start_like_a_section_are_lyrics():
+    assert classify_line('Chorus of angels singing') == (Token(LYRIC, 'Chorus of angels singing'),)
+    assert classify_line('Bridge over troubled water') == (Token(LYRIC, 'Bridge over troubled water'),)
+
+
+def test_metadata_and_blank_lines():
+    assert classify_line('Capo 2') == (Token(METADATA, 'Capo 2'),)
+    assert classify_line('Tuning: E A D G B E') == (Token(METADATA, 'Tuning: E A D G B E'),)
+    assert classify_line('X') == (Token(METADATA, 'X'),)
+    assert classify_line('') == (Token(BLANK, ''),)
+
+
+def test_tokenize_strips_and_classifies_every_line():
+    text = '[Verse]\n  G      C\n  Amazing grace\n\nOutro: G D G\n'
+    assert [token.type for token in tokenize(text)] == [SECTION, CHORD, LYRIC, BLANK, SECTION, CHORD]
+    assert list(tokenize(text))[2].text == 'Amazing grace'
+
+
+def test_parsed_lines_keep_sections_chords_and_lyrics():
+    page = '<html><body><pre>[Chorus]\nG      C\nAmazing grace\nD\n</pre></body></html>'
+    lines = html_tab_to_json_dict(page)['tab']['lines']
+    assert lines[0] == {'section': 'Chorus'}
+    assert [chord['note'] for chord in lines[1]['chords']] == ['G', 'C']
+    assert lines[2]['lyric'] == 'Amazing grace'
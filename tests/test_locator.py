@@ -0,0 +1,49 @@
+from server.locator import TabContentLocator, url_pattern
+from server.soup import make_soup
+
+CHORDS_URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'
+OTHER_CHORDS_URL = 'https://tabs.ultimate-guitar.com/tab/hillsong/oceans-chords-2'
+TAB_URL = 'https://tabs.ultimate-guitar.com/tab/metallica/one-tabs-3'
+CHORDS = 'G C G\nAmazing grace\nG D\nhow sweet the sound\n'
+
+
+def test_url_pattern_is_host_and_tab_type():
+    assert url_pattern(CHORDS_URL) == 'tabs.ultimate-guitar.com/chords'
+    assert url_pattern(TAB_URL + '/') == 'tabs.ultimate-guitar.com/tabs'
+    assert url_pattern('https://tabs.ultimate-guitar.com/tab/x/no-type') == 'tabs.ultimate-guitar.com/other'
+
+
+def test_selectors_are_tried_in_priority_order():
+    soup = make_soup(f'<div class="lyrics">words</div><div class="js-tab-content">{CHORDS}</div>')
+    assert TabContentLocator().locate(soup)['class'] == ['js-tab-content']
+
+
+def test_winning_selector_is_learned_per_url_pattern():
+    locator = TabContentLocator()
+    locator.locate(make_soup(f'<div class="tab-text">{CHORDS}</div>'), CHORDS_URL)
+    assert locator.learned() == {'tabs.ultimate-guitar.com/chords': '.tab-text'}
+
+    # A later page of the pattern tries the learned selector first
+    soup = make_soup(f'<pre>header</pre><div class="tab-text">{CHORDS}</div>')
+    assert locator.locate(soup, OTHER_CHORDS_URL).name == 'div'
+    # Other patterns still go by priority
+    assert locator.locate(soup, TAB_URL).name == 'pre'
+
+
+def test_learned_selector_that_no_longer_matches_falls_back():
+    locator = TabContentLocator()
+    locator.locate(make_soup(f'<div class="tab-text">{CHORDS}</div>'), CHORDS_URL)
+    element = locator.locate(make_soup(f'<div class="chords">{CHORDS}</div>'), OTHER_CHORDS_URL)
+    assert element['class'] == ['chords']
+    assert locator.learned()['tabs.ultimate-guitar.com/chords'] == '.chords'
+
+
+def test_unmarked_pages_use_the_innermost_element_holding_the_chords():
+    soup = make_soup(f'<div id="page"><div><p>menu</p><div id="inner">{CHORDS}</div></div></div>')
+    locator = TabContentLocator()
+    assert locator.locate(soup, CHORDS_URL)['id'] == 'inner'
+    assert locator.learned() == {}  # Scored matches are not remembered as selectors
+
+
+def test_nothing_found():
+    assert TabContentLocator().locate(make_soup('<div><p>no tab here</p></div>')) is None
@@ -0,0 +1,56 @@
+import re
+from server import app
+from server.metrics import Registry, stage_timer, stage_seconds, CallbackCounter
+
+
+def test_counter_and_histogram_exposition():
+    registry = Registry()
+    counter = registry.counter('fetches_total', 'Fetches', ['outcome'])
+    counter.inc(outcome='ok')
+    counter.inc(2, outcome='failed')
+    histogram = registry.histogram('stage_seconds', 'Stages', ['stage'], buckets=(0.1, 1))
+    histogram.observe(0.05, stage='parse')
+    histogram.observe(0.5, stage='parse')
+    histogram.observe(5, stage='parse')
+
+    assert registry.render().splitlines() == [
+        '# HELP fetches_total Fetches',
+        '# TYPE fetches_total counter',
+        'fetches_total{outcome="failed"} 2',
+        'fetches_total{outcome="ok"} 1',
+        '# HELP stage_seconds Stages',
+        '# TYPE stage_seconds histogram',
+        'stage_seconds_bucket{stage="parse",le="0.1"} 1',
+        'stage_seconds_bucket{stage="parse",le="1.0"} 2',
+        'stage_seconds_bucket{stage="parse",le="+Inf"} 3',
+        'stage_seconds_sum{stage="parse"} 5.55',
+        'stage_seconds_count{stage="parse"} 3',
+    ]
+    assert histogram.totals() == {('parse',): (3, 5.55)}
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter('c', 'C', ['url']).inc(url='a "b"\\c\nd')
+    assert registry.render().splitlines()[-1] == 'c{url="a \\"b\\"\\\\c\\nd"} 1'
+
+
+def test_callback_counter_failures_skip_the_metric():
+    registry = Registry()
+    registry.register(CallbackCounter('broken_total', 'Broken', ['x'], lambda: 1 / 0))
+    registry.register(CallbackCounter('ok_total', 'Ok', ['x'], lambda: {('a',): 3}))
+    assert registry.render().splitlines()[-1] == 'ok_total{x="a"} 3'
+
+
+def test_metrics_endpoint_exports_stage_histograms():
+    before = stage_seconds.totals().get(('parse',), (0, 0.0))[0]
+    with stage_timer('parse'):
+        pass
+    response = app.test_client().get('/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    count = re.search(r'^tab_stage_seconds_count\{stage="parse"\} (\d+)$', body, re.MULTILINE)
+    assert int(count.group(1)) == before + 1
+    for name in ('tab_cache_lookups_total', 'tab_fetch_hedges_total', 'tab_index_lookups_total'):
+        assert f'# TYPE {name} counter' in body
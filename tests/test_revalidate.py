@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+from server import tab_parser
+from server.cache import TabCache
+from server.revalidate import Revalidator
+
+URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'
+
+
+def test_revalidator_runs_one_refresh_per_key():
+    revalidator = Revalidator(workers=2)
+    release = threading.Event()
+    calls = []
+
+    def refresh(key):
+        calls.append(key)
+        release.wait(2)
+
+    assert revalidator.submit('a', refresh, 'a')
+    assert not revalidator.submit('a', refresh, 'a')
+    assert revalidator.submit('b', refresh, 'b')
+    release.set()
+    deadline = time.time() + 2
+    while revalidator.in_flight() and time.time() < deadline:
+        time.sleep(0.01)
+    assert sorted(calls) == ['a', 'b']
+    assert revalidator.stats()['coalesced'] == 1
+    assert revalidator.submit('a', refresh, 'a')  # Done, so a later refresh may start
+
+
+def test_revalidator_survives_failed_refresh():
+    revalidator = Revalidator(workers=1)
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError('upstream down')
+
+    revalidator.submit('a', fail)
+    revalidator.submit('b', done.set)
+    assert done.wait(2)
+    assert revalidator.stats()['failed'] == 1
+
+
+def wait_idle(revalidator):
+    deadline = time.time() + 2
+    while revalidator.in_flight() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def stale_tab(monkeypatch):
+    cache = TabCache(ttl=0.01, max_stale=60)
+    revalidator = Revalidator(workers=1)
+    monkeypatch.setattr(tab_parser, 'tab_cache', cache)
+    monkeypatch.setattr(tab_parser, 'tab_revalidator', revalidator)
+    cache.set('dict:' + URL, {'tab': {'title': 'Amazing Grace'}})
+    cache.set('blocks:' + URL, [{'combined': []}])
+    time.sleep(0.02)
+    return cache, revalidator
+
+
+def test_failed_dict_refresh_is_counted_and_logged(stale_tab, monkeypatch, capsys):
+    cache, revalidator = stale_tab
+    monkeypatch.setattr(tab_parser, '_fetch_dict_from_ultimate_tab', lambda url: {'error': 'Selenium failed: boom'})
+    ages = []
+    assert tab_parser.dict_from_ultimate_tab(URL, on_stale=ages.append) == {'tab': {'title': 'Amazing Grace'}}
+    wait_idle(revalidator)
+    assert ages and revalidator.stats()['failed'] == 1
+    assert 'Selenium failed: boom' in capsys.readouterr().out
+    assert cache.get_stale('dict:' + URL)[2]  # The stale entry stays for the next request to retry
+
+
+def test_failed_blocks_refresh_is_counted(stale_tab, monkeypatch):
+    _, revalidator = stale_tab
+    monkeypatch.setattr(tab_parser, '_fetch_grouped_blocks_from_ultimate_tab',
+                        lambda *args: [{'error': 'Failed to fetch and parse tab'}])
+    tab_parser.grouped_blocks_from_ultimate_tab(URL, on_stale=lambda age: None)
+    wait_idle(revalidator)
+    assert revalidator.stats()['failed'] == 1
+
+
+def test_successful_refresh_replaces_the_entry(stale_tab, monkeypatch):
+    cache, revalidator = stale_tab
+    monkeypatch.setattr(tab_parser, '_fetch_dict_from_ultimate_tab', lambda url: {'tab': {'title': 'Amazing Grace 2'}})
+    tab_parser.dict_from_ultimate_tab(URL, on_stale=lambda age: None)
+    wait_idle(revalidator)
+    assert revalidator.stats()['failed'] == 0
+    assert cache.get('dict:' + URL) == {'tab': {'title': 'Amazing Grace 2'}}
@@ -0,0 +1,106 @@
+import html
+import json
+import time
+import pytest
+import requests
+from server import search
+from server.cache import TabCache
+from server.search import rank_results, parse_search_results, cached_search_results
+
+
+def result(song, artist, rating=None, votes=0, url=None):
+    return {'song_name': song, 'artist_name': artist, 'type': 'Chords', 'rating': rating, 'votes': votes,
+            'url': url or f"https://tabs.ultimate-guitar.com/tab/x/{song.lower().replace(' ', '-')}-chords-{votes}"}
+
+
+def test_exact_title_match_outranks_better_rated_partial_match():
+    ranked = rank_results([
+        result('Amazing Grace My Chains Are Gone', 'Chris Tomlin', rating=5.0, votes=900),
+        result('Amazing Grace', 'Chris Tomlin', rating=4.0, votes=10),
+    ], 'amazing grace', 'chris tomlin')
+    assert [r['song_name'] for r in ranked] == ['Amazing Grace', 'Amazing Grace My Chains Are Gone']
+    assert [r['rank'] for r in ranked] == [1, 2]
+
+
+def test_rating_is_weighted_by_votes():
+    ranked = rank_results([
+        result('Ode To Joy', 'Beethoven', rating=5.0, votes=2),
+        result('Ode To Joy', 'Beethoven', rating=4.8, votes=1000),
+    ], 'ode to joy')
+    assert ranked[0]['votes'] == 1000
+
+
+def test_matching_ignores_case_and_accents():
+    ranked = rank_results([result('Other Song', 'Someone'), result('Café Del Mar', 'Energy 52')], 'cafe del mar')
+    assert ranked[0]['song_name'] == 'Café Del Mar'
+
+
+def test_parse_js_store_results_skips_non_tabs_and_duplicates():
+    entries = [
+        {'song_name': 'Amazing Grace', 'artist_name': 'Chris Tomlin', 'type': 'Chords', 'rating': 4.8, 'votes': 120,
+         'tab_url': 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'},
+        {'song_name': 'Amazing Grace', 'artist_name': 'Chris Tomlin', 'type': 'Chords', 'rating': 4.8, 'votes': 120,
+         'tab_url': 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'},
+        {'artist_name': 'Chris Tomlin', 'tab_url': 'https://www.ultimate-guitar.com/artist/chris_tomlin_1'},
+    ]
+    store = {'store': {'page': {'data': {'results': entries}}}}
+    page = f'<div class="js-store" data-content="{html.escape(json.dumps(store))}"></div>'
+    results = parse_search_results(page)
+    assert len(results) == 1
+    assert results[0]['rating'] == 4.8 and results[0]['votes'] == 120
+
+
+def test_parse_link_only_results_names_songs_from_the_slug():
+    page = '<a href="/tab/chris-tomlin/amazing-grace-chords-1234">x</a>'
+    results = parse_search_results(page)
+    assert results[0]['song_name'] == 'Amazing Grace'
+    assert results[0]['artist_name'] == 'Chris Tomlin'
+    assert results[0]['url'] == 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1234'
+
+
+@pytest.fixture
+def upstream_searches(monkeypatch):
+    calls = []
+    answers = {}
+
+    def fetch(song_name, artist_name=''):
+        calls.append((song_name, artist_name))
+        answer = answers.get(song_name.lower(), [])
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(search, 'search_cache', TabCache(ttl=60))
+    monkeypatch.setattr(search, 'fetch_search_results', fetch)
+    return calls, answers
+
+
+def test_equivalent_queries_share_one_upstream_search(upstream_searches):
+    calls, answers = upstream_searches
+    answers['amazing grace'] = [result('Amazing Grace', 'Chris Tomlin')]
+    first = cached_search_results('Amazing Grace', 'Chris Tomlin')
+    assert cached_search_results('chris tomlin amazing-grace') == first
+    assert cached_search_results('AMAZING  GRÂCE', 'Chris Tomlin') == first
+    assert len(calls) == 1
+    assert search.search_cache.stats()['memory_hits'] == 2
+
+
+def test_empty_results_expire_after_the_negative_ttl(upstream_searches, monkeypatch):
+    calls, _ = upstream_searches
+    monkeypatch.setattr(search, 'SEARCH_NEGATIVE_TTL', 0.05)
+    assert cached_search_results('no such song') == []
+    assert cached_search_results('no such song') == []
+    assert len(calls) == 1
+    time.sleep(0.06)
+    assert cached_search_results('no such song') == []
+    assert len(calls) == 2
+
+
+def test_failed_searches_are_not_cached(upstream_searches):
+    calls, answers = upstream_searches
+    answers['it is well'] = requests.ConnectionError('down')
+    with pytest.raises(requests.ConnectionError):
+        cached_search_results('It Is Well')
+    answers['it is well'] = [result('It Is Well', 'Bethel Music')]
+    assert cached_search_results('It Is Well')[0]['song_name'] == 'It Is Well'
+    assert len(calls) == 2
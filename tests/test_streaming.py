@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+import pytest
+from server import app, streaming, tab_parser, views
+from server.cache import TabCache
+
+URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1'
+BLOCKS = [{'combined': [{'chords': 'G', 'lyric': 'Amazing grace'}]}]
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    '''
+    Replaces the fetch pipeline with one that waits for `release`, then
+    reports which path it ran.
+    '''
+    release = threading.Event()
+    runs = []
+
+    def fetch(url, max_retries, report, use_static=True, use_render=True):
+        path = 'static' if not use_render else 'render' if not use_static else 'both'
+        runs.append(path)
+        release.wait(2)
+        report('fetch_started', path=path)
+        return BLOCKS
+
+    monkeypatch.setattr(tab_parser, 'tab_cache', TabCache())
+    monkeypatch.setattr(tab_parser, '_fetch_grouped_blocks_from_ultimate_tab', fetch)
+    return runs, release
+
+
+def in_threads(*calls):
+    threads = [threading.Thread(target=call) for call in calls]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_coalesced_requests_share_progress(pipeline):
+    runs, release = pipeline
+    first, second = [], []
+    threads = in_threads(lambda: tab_parser.grouped_blocks_from_ultimate_tab(URL, progress=first.append),
+                         lambda: tab_parser.grouped_blocks_from_ultimate_tab(URL, progress=second.append))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert runs == ['both']
+    assert first == second == [{'event': 'fetch_started', 'url': URL, 'path': 'both'}]
+
+
+def test_fetches_limited_to_another_path_keep_their_progress_apart(pipeline):
+    runs, release = pipeline
+    full, static_only = [], []
+    threads = in_threads(
+        lambda: tab_parser.grouped_blocks_from_ultimate_tab(URL, progress=full.append),
+        lambda: tab_parser.grouped_blocks_from_ultimate_tab(URL, progress=static_only.append, use_render=False))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert sorted(runs) == ['both', 'static']
+    assert [event['path'] for event in full] == ['both']
+    assert [event['path'] for event in static_only] == ['static']
+
+
+def test_fresh_fetches_keep_their_progress_to_themselves(pipeline):
+    runs, release = pipeline
+    joined, fresh = [], []
+    threads = in_threads(lambda: tab_parser.grouped_blocks_from_ultimate_tab(URL, progress=joined.append),
+                         lambda: tab_parser.grouped_blocks_from_ultimate_tab(URL, progress=fresh.append, fresh=True))
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 2 and len(joined) == 1 and len(fresh) == 1
+
+
+@pytest.fixture
+def streamed_tab(monkeypatch):
+    def blocks(url, progress=None, on_stale=None, **kwargs):
+        progress({'event': 'fetch_started', 'url': url})
+        progress({'event': 'parsed', 'url': url, 'source': 'static'})
+        return BLOCKS
+
+    monkeypatch.setattr(views, 'grouped_blocks_from_ultimate_tab', blocks)
+    return app.test_client()
+
+
+def test_ndjson_stream_emits_one_record_per_line(streamed_tab):
+    response = streamed_tab.get('/tab', query_string={'url': URL, 'stream': '1'})
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [record['event'] for record in records] == ['fetch_started', 'parsed', 'result']
+    assert records[-1]['blocks'] == BLOCKS
+
+
+def test_sse_stream_names_each_event(streamed_tab):
+    response = streamed_tab.get('/tab', query_string={'url': URL}, headers={'Accept': 'text/event-stream'})
+    assert response.mimetype == 'text/event-stream'
+    messages = response.get_data(as_text=True).split('\n\n')
+    assert messages[-1] == ''
+    name, data = messages[0].split('\n')
+    assert name == 'event: fetch_started' and json.loads(data[len('data: '):])['url'] == URL
+    assert messages[2].startswith('event: result\n')
+
+
+def test_idle_streams_send_heartbeats_and_errors_end_the_stream(monkeypatch):
+    monkeypatch.setattr(streaming, 'STREAM_HEARTBEAT_SECONDS', 0.05)
+
+    def run(emit):
+        time.sleep(0.2)
+        raise RuntimeError('Selenium failed')
+
+    with app.test_request_context():
+        response = streaming.event_stream_response(run)
+        records = [json.loads(line) for line in response.response]
+    assert {'event': 'heartbeat'} in records
+    assert records[-1] == {'event': 'error', 'error': 'Selenium failed'}
@@ -0,0 +1,90 @@
+import pytest
+from server import search
+from server.tab_index import TabIndex, similarity, artist_similarity
+
+URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-my-chains-are-gone-chords-1'
+TAB = {
+    'title': 'Amazing Grace (My Chains Are Gone)',
+    'artist_name': 'Chris Tomlin',
+    'author': 'someone',
+    'key': 'G',
+    'lines': [
+        {'type': 'chords', 'chords': []},
+        {'type': 'lyric', 'lyric': 'Amazing grace how sweet the sound'},
+        {'type': 'lyric', 'lyric': 'My chains are gone, I have been set free'},
+    ],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TabIndex(path=str(tmp_path / 'index.sqlite3'), min_score=0.6)
+
+
+def flush(index):
+    # Writes go through one background thread in order; wait for the queued ones
+    index._writer.submit(lambda: None).result(timeout=2)
+
+
+def test_similarity_tolerates_typos():
+    assert similarity('amazng grace', 'amazing grace') > 0.7
+    assert similarity('amazing grace', 'it is well') < 0.2
+    assert artist_similarity('beethoven', 'ludwig van beethoven') == 1.0
+
+
+def test_submitted_tabs_are_found_despite_typos(index):
+    index.submit(URL + '/?app=1', {'tab': TAB})
+    flush(index)
+    hits = index.search('Amazng Grace (My Chains Are Gone)', 'chris tomlim')
+    assert [hit['url'] for hit in hits] == [URL]
+    assert hits[0]['title'] == TAB['title'] and hits[0]['key'] == 'G'
+    assert 0.6 <= hits[0]['score'] < 1
+
+
+def test_search_returns_only_public_fields(index):
+    index.add(URL, TAB)
+    for hits in (index.search('amazing grace my chains are gone'), index.search('amazing grace my chains are gone', 'tomlin')):
+        assert set(hits[0]) == {'url', 'title', 'artist', 'author', 'key', 'tuning', 'score'}
+
+
+def test_unrelated_queries_miss(index):
+    index.add(URL, TAB)
+    assert index.search('it is well with my soul') == []
+    assert index.search('amazing grace my chains are gone', 'hillsong') == []
+    assert index.stats()['misses'] == 2
+
+
+def test_reindexing_a_url_replaces_it(index):
+    index.add(URL, TAB)
+    index.add(URL, dict(TAB, key='A'))
+    hits = index.search('amazing grace my chains are gone')
+    assert len(hits) == 1 and hits[0]['key'] == 'A'
+
+
+def test_lyrics_search_returns_snippets(index):
+    index.add(URL, TAB)
+    hits = index.search_lyrics('chains are   gone')
+    assert hits[0]['url'] == URL
+    assert 'chains are gone' in hits[0]['snippet']
+    assert index.search_lyrics('ab') == []
+
+
+def test_other_hosts_are_never_indexed(index):
+    other = 'https://evil.example.com/tab/chris-tomlin/amazing-grace-my-chains-are-gone-chords-1'
+    index.submit(other, {'tab': TAB})
+    with pytest.raises(ValueError):
+        index.add(other, TAB)
+    flush(index)
+    index.add(URL, TAB)
+    assert index.stats()['entries'] == 1
+
+
+def test_search_endpoint_answers_lyrics_from_the_index(index, monkeypatch):
+    from server import app
+    monkeypatch.setattr(search, 'tab_index', index)
+    index.add(URL, TAB)
+    response = app.test_client().get('/search?song=how+sweet+the+sound&lyrics=1')
+    body = response.get_json()
+    assert response.status_code == 200 and body['source'] == 'local'
+    assert body['url'] == URL and 'how sweet the sound' in body['results'][0]['snippet']
+    assert app.test_client().get('/search?song=nothing+like+this&lyrics=1').status_code == 404
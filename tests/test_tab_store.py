@@ -0,0 +1,88 @@
+import html
+import json
+import os
+from server.tab_store import TabStore, tab_id_for_url, content_digest
+
+UG_URL = 'https://tabs.ultimate-guitar.com/tab/chris-tomlin/amazing-grace-chords-1234567'
+OTHER_URL = 'https://evil.example.com/tab/x/amazing-grace-chords-1234567'
+SHELL_PATH = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'corpus', 'official_shell.html')
+TAB_DICT = {'tab': {'title': 'Amazing Grace', 'artist_name': 'Chris Tomlin', 'lines': []}}
+COMBINED = [{'lyric': 'Amazing grace', 'chords': 'G'}]
+
+
+def js_store_page(content, rating):
+    data = {'tab': {'song_name': 'Amazing Grace', 'artist_name': 'Chris Tomlin', 'rating': rating},
+            'tab_view': {'wiki_tab': {'content': content}, 'meta': {}}}
+    blob = html.escape(json.dumps({'store': {'page': {'data': data}}}))
+    return f'<div class="js-store" data-content="{blob}"></div>'
+
+
+def test_tab_id_is_ugs_numeric_id():
+    assert tab_id_for_url(UG_URL + '/?app=1') == '1234567'
+    assert tab_id_for_url('https://tabs.ultimate-guitar.com/tab/x/no-id') == 'https://tabs.ultimate-guitar.com/tab/x/no-id'
+
+
+def test_digest_ignores_volatile_fields_but_not_content():
+    page = js_store_page('[ch]G[/ch] Amazing grace', rating=4.8)
+    assert content_digest(page) == content_digest(js_store_page('[ch]G[/ch] Amazing grace', rating=4.9))
+    assert content_digest(page) != content_digest(js_store_page('[ch]C[/ch] Amazing grace', rating=4.8))
+
+
+def rendered(shell, body):
+    end = shell.rfind('</main>')
+    return shell[:end] + f'<pre class="js-tab-content">{body}</pre>' + shell[end:]
+
+
+def test_digest_of_client_rendered_pages_covers_the_rendered_tab():
+    with open(SHELL_PATH, encoding='utf-8') as f:
+        shell = f.read()
+    first = rendered(shell, '[G]Amazing grace how sweet the sound')
+    second = rendered(shell, '[C]Amazing grace how sweet the sound')
+    assert content_digest(first) != content_digest(second)
+    assert content_digest(first) != content_digest(shell)
+    assert content_digest(first) == content_digest(rendered(shell, '[G]Amazing grace how sweet the sound'))
+
+
+def test_a_new_render_is_not_served_the_placeholder_parse(tmp_path):
+    with open(SHELL_PATH, encoding='utf-8') as f:
+        shell = f.read()
+    store = TabStore(path=str(tmp_path / 'store.sqlite3'), compact_every=0)
+    store.put(UG_URL, content_digest(shell), TAB_DICT, [{'lyric': 'Loading tab player'}])
+    assert store.reuse(UG_URL, content_digest(rendered(shell, '[G]Amazing grace'))) is None
+
+
+def test_put_reuse_and_get_many(tmp_path):
+    store = TabStore(path=str(tmp_path / 'store.sqlite3'), compact_every=0)
+    store.put(UG_URL, 'hash-1', TAB_DICT, COMBINED)
+    assert store.reuse(UG_URL, 'hash-1') == {'tab_dict': TAB_DICT, 'combined': COMBINED}
+    assert store.reuse(UG_URL, 'hash-2') is None
+
+    stored = store.get_many(['1234567', '999'])
+    assert list(stored) == ['1234567']
+    assert stored['1234567']['url'] == UG_URL
+    assert stored['1234567']['blocks'] == [{'combined': COMBINED}]
+
+
+def test_other_hosts_never_overwrite_a_ug_tab(tmp_path):
+    store = TabStore(path=str(tmp_path / 'store.sqlite3'), compact_every=0)
+    store.put(UG_URL, 'hash-1', TAB_DICT, COMBINED)
+    store.put(OTHER_URL, 'hash-evil', {'tab': {'title': 'Evil'}}, [{'lyric': 'evil'}])
+    assert store.get_many(['1234567'])['1234567']['url'] == UG_URL
+    assert store.reuse(OTHER_URL, 'hash-1') is None
+    assert store.stats()['stored'] == 1
+
+
+def test_compact_drops_superseded_contents(tmp_path):
+    store = TabStore(path=str(tmp_path / 'store.sqlite3'), compact_every=0)
+    store.put(UG_URL, 'hash-1', TAB_DICT, COMBINED)
+    store.put(UG_URL, 'hash-2', TAB_DICT, COMBINED)
+    assert store.compact() == 1
+    assert store.stats()['contents'] == 1
+
+
+def test_read_errors_degrade_to_a_miss(tmp_path):
+    store = TabStore(path=str(tmp_path / 'store.sqlite3'), compact_every=0)
+    store.put(UG_URL, 'hash-1', TAB_DICT, COMBINED)
+    store._db.execute('DROP TABLE contents')
+    assert store.get_many(['1234567']) == {}
+    assert store.reuse(UG_URL, 'hash-1') is None
@@ -0,0 +1,89 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from server import upstream as upstream_module
+from server.upstream import UpstreamClient, upstream_url
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.hits.append(self.path)
+        action = self.server.script.pop(0) if self.server.script else 'ok'
+        if action == 'drop':
+            self.close_connection = True
+            self.connection.close()  # Like a kept-alive connection the server closed
+            return
+        if action == 'slow':
+            time.sleep(0.5)
+        if action == 'busy':
+            self.send_response(503)
+            self.send_header('Retry-After', '120')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = b'hello'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.hits = []
+    httpd.script = []
+    threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server, path='/page'):
+    return f'http://127.0.0.1:{server.server_address[1]}{path}'
+
+
+def test_dropped_connections_are_retried(server):
+    server.script = ['drop']
+    client = UpstreamClient(retries=2, backoff_factor=0)
+    assert client.get(url(server)).text == 'hello'
+    assert len(server.hits) == 2
+
+
+def test_read_timeouts_are_not_retried(server):
+    server.script = ['slow']
+    client = UpstreamClient(retries=2, backoff_factor=0)
+    with pytest.raises(requests.Timeout):
+        client.get(url(server), timeout=0.2)
+    time.sleep(0.4)
+    assert len(server.hits) == 1
+
+
+def test_retry_after_waits_are_capped(server, monkeypatch):
+    monkeypatch.setattr(upstream_module, 'UPSTREAM_MAX_RETRY_AFTER', 0.1)
+    server.script = ['busy']
+    client = UpstreamClient(retries=2, backoff_factor=0)
+    started = time.monotonic()
+    assert client.get(url(server)).text == 'hello'
+    assert time.monotonic() - started < 2
+    assert len(server.hits) == 2
+
+
+def test_throttle_sees_every_request(server):
+    hosts = []
+    client = UpstreamClient()
+    client.throttle = hosts.append
+    client.get(url(server))
+    client.get(url(server, '/other'))
+    assert hosts == [f'127.0.0.1:{server.server_address[1]}'] * 2
+
+
+def test_other_urls_are_not_rewritten():
+    assert upstream_url('https://example.com/tab/x') == 'https://example.com/tab/x'